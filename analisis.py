@@ -0,0 +1,154 @@
+import os
+from array import array
+
+import numpy as np
+import pandas as pd
+
+import estadisticas
+import historial_columnar
+import textos_preguntas
+
+# Análisis del historial de intentos con pandas. El historial se carga una vez
+# en un DataFrame (una fila por intento) directamente desde las columnas de
+# historial_columnar, y todas las agregaciones son groupbys vectorizados.
+# Sólo cubre los intentos que siguen en el historial: los que la retención ya
+# ha resumido cuentan en los totales de estadisticas.py pero no aquí.
+
+_cache = {"version": None, "intentos": None}
+
+def cargar_intentos(stats=None):
+    """
+    Devuelve el historial de intentos como DataFrame, ordenado por fecha.
+
+    Sin stats se usan las estadísticas guardadas y el resultado se reutiliza
+    mientras no cambien (ver estadisticas.version_stats).
+
+    Args:
+        stats: Estadísticas sobre las que calcularlo (por defecto, las guardadas)
+
+    Returns:
+        DataFrame con las columnas pregunta, categoria, fecha, correcta, tiempo,
+        sesion_id y archivo (pregunta, categoria, sesion_id y archivo son categóricas).
+    """
+    if stats is None:
+        version = estadisticas.version_stats()
+        if _cache["version"] == version:
+            return _cache["intentos"]
+        intentos = _construir(estadisticas.load_stats())
+        _cache["version"], _cache["intentos"] = version, intentos
+        return intentos
+    return _construir(stats)
+
+def _construir(stats):
+    preguntas = list(stats)
+    nombres_categoria = {}
+    categoria_de = np.empty(len(preguntas), dtype=np.int32)
+    # Se juntan primero las columnas de todas las preguntas en arrays de Python
+    # (copias en bloque) y se pasan a NumPy una sola vez
+    pregunta = array('i')
+    columnas = {nombre: array(tipo) for nombre, tipo in historial_columnar.COLUMNAS.items()}
+    correctas = bytearray()
+    for i, q in enumerate(preguntas):
+        data = stats[q]
+        categoria_de[i] = nombres_categoria.setdefault(data.get("categoria", "General"), len(nombres_categoria))
+        h = data.get("historial") or []
+        if not isinstance(h, historial_columnar.Historial):
+            h = historial_columnar.Historial.desde_lista(h)
+        if not len(h):
+            continue
+        pregunta += array('i', [i]) * len(h)
+        for nombre, columna in columnas.items():
+            columna += getattr(h, nombre)
+        correctas += h.correctas
+    col = {nombre: np.frombuffer(columna, dtype=columna.typecode).astype(np.int64) for nombre, columna in columnas.items()}
+    col["pregunta"] = np.frombuffer(pregunta, dtype=np.int32)
+    col["correcta"] = np.frombuffer(correctas, dtype=np.uint8)
+
+    segundos = col["segundos"]
+    # Índice 0 de las tablas internadas = None, que en pandas es el código -1 (NaN)
+    sesiones = historial_columnar.SESIONES.valores[1:]
+    archivos = historial_columnar.ARCHIVOS.valores[1:]
+    intentos = pd.DataFrame({
+        "pregunta": pd.Categorical.from_codes(col["pregunta"], categories=[textos_preguntas.texto(q) for q in preguntas]),
+        "categoria": pd.Categorical.from_codes(categoria_de[col["pregunta"]], categories=list(nombres_categoria)),
+        "fecha": pd.to_datetime(segundos, unit="s").where(segundos != 0),  # 0 = sin fecha (NaT)
+        "correcta": col["correcta"].astype(bool),
+        "tiempo": col["centesimas"] / 100,
+        "sesion_id": pd.Categorical.from_codes(col["sesiones"] - 1, categories=sesiones),
+        "archivo": pd.Categorical.from_codes(col["archivos"] - 1, categories=archivos),
+    })
+    return intentos.sort_values("fecha", kind="stable", ignore_index=True)
+
+def por_categoria(intentos):
+    """Intentos, fallos, tasa de fallos (%), preguntas distintas y tiempos (media, p50, p90) por cuestionario."""
+    grupos = intentos.groupby("categoria", observed=True)
+    tabla = grupos.agg(
+        intentos=("correcta", "size"),
+        aciertos=("correcta", "sum"),
+        preguntas=("pregunta", "nunique"),
+        tiempo_medio=("tiempo", "mean"),
+    )
+    tabla["fallos"] = tabla["intentos"] - tabla["aciertos"]
+    tabla["tasa_fallos"] = tabla["fallos"] / tabla["intentos"] * 100
+    tabla[["p50", "p90"]] = grupos["tiempo"].quantile([0.5, 0.9]).unstack()
+    return tabla.drop(columns="aciertos")
+
+def por_sesion(intentos):
+    """Inicio, correctas, total, tasa de acierto (%) y tiempo medio de cada sesión, en orden."""
+    tabla = intentos.dropna(subset=["sesion_id"]).groupby("sesion_id", observed=True).agg(
+        inicio=("fecha", "min"),
+        correctas=("correcta", "sum"),
+        total=("correcta", "size"),
+        tiempo_medio=("tiempo", "mean"),
+    )
+    tabla["tasa"] = (tabla["correctas"] / tabla["total"] * 100).round(1)
+    # Las categorías van en orden de aparición; las sesiones se ordenan por su id
+    tabla.index = tabla.index.astype(str)
+    return tabla.sort_index()
+
+def por_dia(intentos):
+    """Intentos, correctas, tasa de acierto (%) y tiempo medio de cada día con actividad."""
+    con_fecha = intentos.dropna(subset=["fecha"])
+    tabla = con_fecha.groupby(con_fecha["fecha"].dt.normalize().rename("dia")).agg(
+        intentos=("correcta", "size"),
+        correctas=("correcta", "sum"),
+        tiempo_medio=("tiempo", "mean"),
+    )
+    tabla["tasa"] = tabla["correctas"] / tabla["intentos"] * 100
+    return tabla
+
+def por_hora(intentos):
+    """Rendimiento según la hora del día (0-23): intentos, tasa de acierto (%) y tiempo medio."""
+    con_fecha = intentos.dropna(subset=["fecha"])
+    tabla = con_fecha.groupby(con_fecha["fecha"].dt.hour.rename("hora")).agg(
+        intentos=("correcta", "size"),
+        tasa=("correcta", "mean"),
+        tiempo_medio=("tiempo", "mean"),
+    )
+    tabla["tasa"] *= 100
+    return tabla
+
+def tasa_movil(intentos, ventana=50):
+    """
+    Tasa de acierto (%) de los últimos `ventana` intentos, intento a intento.
+
+    Returns:
+        Serie indexada por la fecha de cada intento.
+    """
+    serie = intentos["correcta"].rolling(ventana, min_periods=1).mean() * 100
+    serie.index = intentos["fecha"]
+    return serie.rename("tasa")
+
+def exportar(intentos, ruta):
+    """
+    Guarda los intentos en CSV o Parquet, según la extensión de ruta.
+
+    Parquet necesita pyarrow o fastparquet; si no están, pandas lanza ImportError.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".csv":
+        intentos.to_csv(ruta, index=False)
+    elif extension in (".parquet", ".pq"):
+        intentos.to_parquet(ruta, index=False)
+    else:
+        raise ValueError(f"Formato de exportación no soportado: {extension or ruta}")
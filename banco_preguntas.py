@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import time
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pdf_parser
+from pdf_parser import cargar_banco
+
+CUESTIONARIOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cuestionarios')
+INDICE_VERSION = 1
+
+# Estratos (bloque-tema, p. ej. "B3-T1") a partir del nombre del cuestionario
+PATRON_ESTRATO = re.compile(r"(B\d+)-(T\d+)", re.IGNORECASE)
+
+def _ingerir_archivo(ruta):
+    # Se ejecuta en un proceso hijo: nunca lanza, el error viaja en el resultado
+    inicio = time.perf_counter()
+    resultado = {
+        "archivo": ruta,
+        "categoria": os.path.splitext(os.path.basename(ruta))[0],
+        "preguntas": [],
+        "error": None,
+    }
+    try:
+        resultado["preguntas"] = cargar_banco(ruta)
+    except Exception as e:
+        resultado["error"] = f"{type(e).__name__}: {e}"
+    resultado["segundos"] = round(time.perf_counter() - inicio, 4)
+    return resultado
+
+def ingerir_directorio(directorio=CUESTIONARIOS_DIR, max_workers=None):
+    """
+    Carga todos los PDF de un directorio en un único banco de preguntas.
+
+    Cada PDF se parsea en un proceso distinto (o sale directamente de la caché
+    de pdf_parser si ya se había leído antes).
+
+    Args:
+        directorio: Carpeta con los PDF de preguntas
+        max_workers: Número de procesos (None = uno por CPU, 1 = sin procesos)
+
+    Returns:
+        Tupla (banco, informe). banco es un dict {categoria: [preguntas]} y
+        informe una lista con el archivo, la categoría, el número de
+        preguntas, los segundos empleados y el error (o None) de cada PDF.
+    """
+    rutas = sorted(glob.glob(os.path.join(directorio, '*.pdf')))
+    orden = {ruta: i for i, ruta in enumerate(rutas)}
+    resultados = sorted(_ingerir_rutas(rutas, max_workers), key=lambda res: orden[res["archivo"]])
+
+    banco = {}
+    informe = []
+    for res in resultados:
+        if not res["error"]:
+            banco.setdefault(res["categoria"], []).extend(res["preguntas"])
+        informe.append({
+            "archivo": res["archivo"],
+            "categoria": res["categoria"],
+            "preguntas": len(res["preguntas"]),
+            "segundos": res["segundos"],
+            "error": res["error"],
+        })
+    return banco, informe
+
+def _ingerir_rutas(rutas, max_workers=None, cancelar=None):
+    # Genera el resultado de cada ruta según van terminando; si se activa
+    # cancelar deja de generar y no se empiezan los PDF que falten. Los
+    # procesos se crean con "spawn" y no con fork, que copiaría a medias el
+    # estado de los hilos que ya tenga el proceso (el escritor de estadísticas,
+    # la precarga...)
+    if max_workers == 1 or len(rutas) <= 1:
+        for ruta in rutas:
+            if cancelar is not None and cancelar.is_set():
+                return
+            yield _ingerir_archivo(ruta)
+        return
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    pendientes = set()
+    try:
+        pendientes = {executor.submit(_ingerir_archivo, ruta) for ruta in rutas}
+        while pendientes:
+            hechos, pendientes = wait(pendientes, timeout=0.1, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                yield futuro.result()
+            if cancelar is not None and cancelar.is_set():
+                return
+    finally:
+        executor.shutdown(wait=not pendientes, cancel_futures=True)
+
+# ---- Índice de preguntas por estrato y examen mixto ----
+# El índice guarda el banco de cada PDF de cuestionarios/ junto con su tamaño y
+# fecha de modificación, en un solo archivo al lado de la caché de pdf_parser.
+# Sólo se vuelven a ingerir los PDF nuevos o modificados; con el índice al día,
+# componer un examen no lee ningún PDF y sólo cuesta lo que el sorteo.
+
+_indice = {"directorio": None, "archivos": None, "estratos": None}
+
+def estrato(categoria):
+    """Devuelve el estrato "B<n>-T<m>" de un cuestionario ("B3-T1-2" -> "B3-T1"), o la categoría tal cual."""
+    m = PATRON_ESTRATO.match(categoria)
+    return f"{m.group(1)}-{m.group(2)}".upper() if m else categoria
+
+def _ruta_indice():
+    return os.path.join(pdf_parser.CACHE_DIR, "indice_preguntas.json")
+
+def bancos_por_archivo(directorio=CUESTIONARIOS_DIR, max_workers=None, progreso=None, cancelar=None):
+    """
+    Devuelve el banco de cada PDF de un directorio.
+
+    La primera vez se ingieren los PDF (en paralelo, como ingerir_directorio);
+    después sólo se comprueba con os.stat que ninguno ha cambiado y se vuelven
+    a ingerir los nuevos o modificados.
+
+    Args:
+        directorio: Carpeta con los PDF de preguntas
+        max_workers: Número de procesos (None = uno por CPU, 1 = sin procesos)
+        progreso: Función opcional progreso(ingeridos, total) a la que se llama
+            tras cada PDF que hay que ingerir
+        cancelar: threading.Event opcional; si se activa se guarda lo ingerido
+            hasta entonces y se lanza pdf_parser.CargaCancelada
+
+    Returns:
+        Dict {ruta: {"size", "mtime_ns", "categoria", "preguntas"}}. No hay que
+        modificarlo.
+    """
+    directorio = os.path.abspath(directorio)
+    if _indice["directorio"] != directorio:
+        datos = pdf_parser._leer_json(_ruta_indice())
+        archivos = {}
+        if datos and datos.get("version") == INDICE_VERSION and datos.get("directorio") == directorio:
+            archivos = datos["archivos"]
+        _indice.update(directorio=directorio, archivos=archivos, estratos=None)
+    archivos = _indice["archivos"]
+
+    actuales = {}
+    for ruta in sorted(glob.glob(os.path.join(directorio, '*.pdf'))):
+        st = os.stat(ruta)
+        actuales[ruta] = (st.st_size, st.st_mtime_ns)
+    cambiados = [ruta for ruta, huella in actuales.items()
+                 if ruta not in archivos or (archivos[ruta]["size"], archivos[ruta]["mtime_ns"]) != huella]
+    borrados = [ruta for ruta in archivos if ruta not in actuales]
+    if not cambiados and not borrados:
+        return archivos
+
+    for ruta in borrados:
+        del archivos[ruta]
+    if progreso:
+        progreso(0, len(cambiados))
+    for ingeridos, res in enumerate(_ingerir_rutas(cambiados, max_workers, cancelar), 1):
+        if progreso:
+            progreso(ingeridos, len(cambiados))
+        ruta = res["archivo"]
+        if res["error"]:
+            archivos.pop(ruta, None)  # Se reintentará la próxima vez
+            continue
+        size, mtime_ns = actuales[ruta]
+        archivos[ruta] = {"size": size, "mtime_ns": mtime_ns, "categoria": res["categoria"], "preguntas": res["preguntas"]}
+    try:
+        pdf_parser._escribir_json_atomico(
+            _ruta_indice(), {"version": INDICE_VERSION, "directorio": directorio, "archivos": archivos})
+    except OSError:
+        pass
+    _indice["estratos"] = None
+    if cancelar is not None and cancelar.is_set():
+        raise pdf_parser.CargaCancelada()
+    return archivos
+
+def indice_estratos(directorio=CUESTIONARIOS_DIR, max_workers=None, progreso=None, cancelar=None):
+    """
+    Devuelve el índice de preguntas de un directorio agrupado por estrato
+    (ver bancos_por_archivo, también para progreso y cancelar).
+
+    Returns:
+        Dict {estrato: [preguntas]}, con categoria y origen_archivo en cada
+        pregunta. No hay que modificarlo: componer_examen devuelve copias.
+    """
+    archivos = bancos_por_archivo(directorio, max_workers, progreso, cancelar)
+    if _indice["estratos"] is None:
+        estratos = {}
+        for ruta, archivo in sorted(archivos.items()):
+            categoria = archivo["categoria"]
+            estratos.setdefault(estrato(categoria), []).extend(
+                pdf_parser._con_origen(pregunta, categoria, ruta) for pregunta in archivo["preguntas"])
+        _indice["estratos"] = estratos
+    return _indice["estratos"]
+
+def reparto(total, estratos):
+    """
+    Reparte total preguntas entre los estratos en proporción a las que tiene
+    cada uno (método del resto mayor).
+
+    Args:
+        total: Número de preguntas del examen
+        estratos: Dict {estrato: preguntas disponibles}
+
+    Returns:
+        Dict {estrato: n}, sin estratos a cero.
+    """
+    disponibles = sum(estratos.values())
+    if not disponibles:
+        return {}
+    total = min(total, disponibles)
+    cuotas = {e: total * n / disponibles for e, n in estratos.items()}
+    tamanos = {e: int(c) for e, c in cuotas.items()}
+    sobrantes = total - sum(tamanos.values())
+    for e in sorted(cuotas, key=lambda e: cuotas[e] - tamanos[e], reverse=True)[:sobrantes]:
+        tamanos[e] += 1
+    return {e: n for e, n in tamanos.items() if n}
+
+def parsear_tamanos(texto):
+    """
+    Convierte "B3-T1=5, B4=10" (o una lista de "ESTRATO=N") en {estrato: n}.
+
+    Raises:
+        ValueError: Si algún elemento no tiene la forma ESTRATO=N.
+    """
+    partes = re.split(r"[,\s]+", texto.strip()) if isinstance(texto, str) else texto
+    tamanos = {}
+    for parte in filter(None, partes):
+        clave, _, n = parte.partition("=")
+        if not clave or not n.isdigit():
+            raise ValueError(f"Estrato mal escrito: {parte} (se espera ESTRATO=N)")
+        tamanos[clave.upper()] = int(n)
+    return tamanos
+
+class _Concatenadas(Sequence):
+    # Vista de solo lectura de varias listas seguidas, para sortear entre todas
+    # las preguntas de un bloque sin copiarlas a una lista nueva
+    def __init__(self, listas):
+        self.listas = listas
+        self.inicios = list(itertools.accumulate((len(l) for l in listas), initial=0))
+
+    def __len__(self):
+        return self.inicios[-1]
+
+    def __getitem__(self, i):
+        j = bisect.bisect_right(self.inicios, i) - 1
+        return self.listas[j][i - self.inicios[j]]
+
+def componer_examen(tamanos, directorio=CUESTIONARIOS_DIR, max_workers=None, progreso=None, cancelar=None):
+    """
+    Compone un examen con preguntas de varios cuestionarios, por estratos.
+
+    Args:
+        tamanos: Dict {estrato: n}. El estrato puede ser un tema ("B3-T1") o un
+            bloque entero ("B3"); en ese caso las preguntas salen de los temas
+            del bloque que no tengan tamaño propio. Si un estrato tiene menos
+            de n preguntas se cogen todas.
+        directorio: Carpeta con los PDF de preguntas
+        max_workers: Procesos para la primera ingestión (ver ingerir_directorio)
+        progreso, cancelar: Para seguir o cancelar la ingestión (ver
+            bancos_por_archivo)
+
+    Returns:
+        Lista de preguntas barajadas, en el mismo formato que leer_pdf.
+
+    Raises:
+        ValueError: Si algún estrato no existe en el directorio.
+        pdf_parser.CargaCancelada: Si se cancela la ingestión.
+    """
+    estratos = indice_estratos(directorio, max_workers, progreso, cancelar)
+    tamanos = {clave.upper(): n for clave, n in tamanos.items()}
+    preguntas = []
+    for clave, n in tamanos.items():
+        if clave in estratos:
+            poblacion = estratos[clave]
+        else:
+            temas = [e for e in estratos if e.startswith(clave + "-") and e not in tamanos]
+            if not temas and not any(e.startswith(clave + "-") for e in estratos):
+                raise ValueError(f"No hay preguntas del estrato {clave}")
+            poblacion = _Concatenadas([estratos[e] for e in temas])
+        preguntas.extend(dict(p) for p in random.sample(poblacion, min(n, len(poblacion))))
+    random.shuffle(preguntas)
+    return preguntas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga todos los PDF de preguntas de un directorio.")
+    parser.add_argument("directorio", nargs="?", default=CUESTIONARIOS_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="número de procesos (por defecto, uno por CPU)")
+    parser.add_argument("--json", action="store_true", help="muestra el informe en JSON")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    banco, informe = ingerir_directorio(args.directorio, args.workers)
+    total = time.perf_counter() - inicio
+    errores = [fila for fila in informe if fila["error"]]
+
+    if args.json:
+        print(json.dumps({"archivos": informe, "categorias": len(banco), "segundos": round(total, 4)},
+                         ensure_ascii=False, indent=2))
+    else:
+        for fila in informe:
+            estado = f"ERROR {fila['error']}" if fila["error"] else f"{fila['preguntas']} preguntas"
+            print(f"{fila['categoria']:<12} {fila['segundos']:>8.3f}s  {estado}")
+        print(f"{len(banco)} cuestionarios, {sum(len(p) for p in banco.values())} preguntas en {total:.3f}s")
+    return 1 if errores else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
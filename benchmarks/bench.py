@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del parser de PDF y del motor de estadísticas.
+
+Genera un stats.json sintético del tamaño indicado en un directorio temporal
+(nunca toca el stats.json real), mide las operaciones más usadas y escribe los
+resultados en JSON para poder comparar ejecuciones:
+
+    python benchmarks/bench.py --preguntas 5000 --intentos 20 --sesiones 300 --salida base.json
+    python benchmarks/bench.py --preguntas 5000 --intentos 20 --sesiones 300 --comparar base.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import estadisticas
+import pdf_parser
+
+def generar_stats(n_preguntas, n_intentos, n_sesiones, semilla=0):
+    """
+    Genera estadísticas sintéticas con el mismo formato que stats.json.
+
+    Args:
+        n_preguntas: Número de preguntas distintas
+        n_intentos: Intentos medios por pregunta
+        n_sesiones: Número de sesiones entre las que se reparten los intentos
+        semilla: Semilla del generador aleatorio
+    """
+    rng = random.Random(semilla)
+    categorias = [f"B{b}-T{t}-{v}" for b in range(2, 5) for t in range(1, 6) for v in (1, 2)]
+    inicio = datetime(2024, 1, 1, 9, 0, 0)
+    sesiones = [inicio + timedelta(hours=6 * i) for i in range(max(1, n_sesiones))]
+
+    stats = {}
+    for i in range(n_preguntas):
+        categoria = rng.choice(categorias)
+        archivo = f"cuestionarios/{categoria}.pdf"
+        dificultad = rng.random()
+        entry = {
+            "intentos": 0,
+            "fallos": 0,
+            "categoria": categoria,
+            "tiempos": [],
+            "historial": [],
+            "origen_archivo": archivo
+        }
+        for _ in range(max(1, int(rng.expovariate(1 / n_intentos)))):
+            sesion = rng.choice(sesiones)
+            correcta = rng.random() > dificultad
+            tiempo = round(rng.uniform(2, 60), 2)
+            entry["intentos"] += 1
+            entry["fallos"] += 0 if correcta else 1
+            entry["tiempos"].append(tiempo)
+            entry["historial"].append({
+                "fecha": (sesion + timedelta(seconds=rng.randint(0, 1800))).strftime("%Y-%m-%d %H:%M:%S"),
+                "correcta": correcta,
+                "tiempo": tiempo,
+                "sesion_id": sesion.strftime("%Y%m%d%H%M%S"),
+                "archivo": archivo
+            })
+        stats[f"Pregunta sintética {i}: ¿cuál de las siguientes opciones es correcta? " + "x" * rng.randint(20, 200)] = entry
+    return stats
+
+def medir(funcion, repeticiones, preparar=None):
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return {
+        "n": repeticiones,
+        "min": min(tiempos),
+        "mediana": statistics.median(tiempos),
+        "media": statistics.fmean(tiempos),
+    }
+
+def usar_directorio(directorio):
+    estadisticas.STATS_FILE = os.path.join(directorio, "stats.json")
+    estadisticas.JOURNAL_FILE = os.path.join(directorio, "stats.journal")
+    estadisticas.DB_FILE = os.path.join(directorio, "stats.db")
+    pdf_parser.CACHE_DIR = os.path.join(directorio, "cache_preguntas")
+
+def bench_estadisticas(args, resultados):
+    stats = generar_stats(args.preguntas, args.intentos, args.sesiones, args.semilla)
+    with open(estadisticas.STATS_FILE, "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False)
+    del stats
+    textos = [estadisticas.texto_pregunta(q) for q in estadisticas.load_stats()]
+    estadisticas.compactar_stats()  # Snapshot con índices, como lo deja la aplicación
+    if args.backend == "sqlite":
+        estadisticas.recargar_stats()
+        estadisticas.BACKEND = "sqlite"
+        estadisticas.load_stats()  # La primera conexión importa stats.json en stats.db
+
+    rep = args.repeticiones
+    resultados["load_stats"] = medir(estadisticas.load_stats, rep, preparar=estadisticas.recargar_stats)
+    estadisticas.load_stats()
+
+    rng = random.Random(args.semilla)
+    sesion_id = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    def responder():
+        estadisticas.update_stats(rng.choice(textos), rng.random() > 0.3, tiempo=rng.uniform(2, 60),
+                                  sesion_id=sesion_id, archivo="cuestionarios/B3-T1-1.pdf")
+
+    resultados["update_stats"] = medir(responder, args.respuestas)
+    resultados["update_stats+flush"] = medir(lambda: (responder(), estadisticas.flush_stats()), rep)
+    estadisticas.flush_stats()
+
+    resultados["get_most_failed"] = medir(estadisticas.get_most_failed, rep)
+    resultados["get_stats_by_category"] = medir(estadisticas.get_stats_by_category, rep)
+    resultados["get_trend_data"] = medir(estadisticas.get_trend_data, rep)
+    resultados["get_trend_data(todas)"] = medir(lambda: estadisticas.get_trend_data(0), rep)
+    resultados["get_tiempos_respuesta"] = medir(estadisticas.get_tiempos_respuesta, rep)
+
+    def preparar_ventana():
+        # Lo que calcula mostrar_estadisticas_globales antes de dibujar
+        estadisticas.get_resumen()
+        estadisticas.get_preguntas_dificiles()
+        estadisticas.get_stats_by_category()
+        estadisticas.get_trend_data()
+
+    resultados["datos_ventana_estadisticas"] = medir(preparar_ventana, rep)
+
+    # Gráfico de tiempos de la ventana, pintado con Agg (sin Tk): figura nueva
+    # en cada refresco frente a set_data sobre la misma figura
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from gui import ventana_estadisticas
+    tiempos = estadisticas.get_tiempos_respuesta()["categorias"]
+    cats = sorted(tiempos)
+
+    def datos_tiempos():
+        # Como tras responder: cambian los valores pero no las categorías
+        factor = rng.uniform(0.5, 1.5)
+        return (cats, tuple([tiempos[c][p] * factor for c in cats] for p in ("p50", "p90", "p99")),
+                [tiempos[c]["media"] * factor for c in cats])
+
+    def figura_nueva():
+        grafico = ventana_estadisticas.GraficoPercentiles("Tiempos")
+        grafico.set_data(*datos_tiempos())
+        FigureCanvasAgg(grafico.fig).draw()
+
+    grafico = ventana_estadisticas.GraficoPercentiles("Tiempos")
+    lienzo = FigureCanvasAgg(grafico.fig)
+    grafico.set_data(*datos_tiempos())
+    resultados["grafico(figura_nueva)"] = medir(figura_nueva, rep)
+    resultados["grafico(set_data)"] = medir(lambda: (grafico.set_data(*datos_tiempos()), lienzo.draw()), rep)
+
+    import analisis
+    resultados["analisis.cargar_intentos"] = medir(lambda: analisis.cargar_intentos(estadisticas.load_stats()), rep)
+    intentos = analisis.cargar_intentos()
+    resultados["analisis.agregados"] = medir(lambda: (analisis.por_categoria(intentos), analisis.por_sesion(intentos),
+                                                      analisis.por_dia(intentos), analisis.por_hora(intentos),
+                                                      analisis.tasa_movil(intentos)), rep)
+
+    import planificador
+    banco = [{"pregunta": texto} for texto in textos]
+    resultados["planificador.construir"] = medir(lambda: planificador.Planificador(banco), rep)
+    plan = planificador.Planificador(banco, repetir=True, rng=rng)
+
+    def sortear_y_responder():
+        plan.registrar(plan.siguiente(), rng.random() > 0.3, rng.uniform(2, 60))
+
+    resultados["planificador.siguiente+registrar"] = medir(sortear_y_responder, args.respuestas)
+
+def bench_pdf(args, resultados):
+    pdfs = sorted(glob.glob(os.path.join(RAIZ, "cuestionarios", "*.pdf")))
+    if not pdfs:
+        return
+
+    def leer_todos():
+        for pdf in pdfs:
+            pdf_parser.leer_pdf(pdf)
+
+    def vaciar_caches():
+        pdf_parser._bancos.clear()
+        for ruta in glob.glob(os.path.join(pdf_parser.CACHE_DIR, "**", "*.json"), recursive=True):
+            os.remove(ruta)
+
+    resultados["leer_pdf(sin_cache)"] = medir(leer_todos, args.repeticiones, preparar=vaciar_caches)
+    resultados["leer_pdf(cache_disco)"] = medir(leer_todos, args.repeticiones, preparar=pdf_parser._bancos.clear)
+    resultados["leer_pdf(memoria)"] = medir(leer_todos, args.repeticiones)
+
+def comparar(resultados, base, umbral):
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if not anterior or not anterior["mediana"]:
+            continue
+        ratio = actual["mediana"] / anterior["mediana"]
+        marca = "  REGRESIÓN" if ratio > umbral else ""
+        print(f"{nombre:<30} {anterior['mediana'] * 1000:>10.3f}ms -> {actual['mediana'] * 1000:>10.3f}ms  x{ratio:.2f}{marca}",
+              file=sys.stderr)
+        if ratio > umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del parser y de las estadísticas.")
+    parser.add_argument("--preguntas", type=int, default=2000)
+    parser.add_argument("--intentos", type=int, default=10, help="intentos medios por pregunta")
+    parser.add_argument("--sesiones", type=int, default=200)
+    parser.add_argument("--respuestas", type=int, default=200, help="llamadas a update_stats a medir")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--sin-pdf", action="store_true", help="no medir leer_pdf")
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto, la salida estándar)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con la que comparar")
+    parser.add_argument("--umbral", type=float, default=1.5, help="ratio a partir del cual se considera regresión")
+    args = parser.parse_args(argv)
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        usar_directorio(directorio)
+        estadisticas.BACKEND = "json"
+        estadisticas.recargar_stats()
+        bench_estadisticas(args, resultados)
+        if not args.sin_pdf:
+            bench_pdf(args, resultados)
+        estadisticas.recargar_stats()
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("salida", "comparar", "umbral")},
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)["resultados"]
+        if comparar(resultados, base, args.umbral):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import bisect
+import heapq
+import math
+import os
+import re
+import unicodedata
+
+import banco_preguntas
+import estadisticas
+import pdf_parser
+import textos_preguntas
+
+# Índice invertido de las preguntas de cuestionarios/ para buscarlas por texto.
+# Cada palabra (en minúsculas, sin tildes ni diéresis y sin las palabras vacías
+# más comunes) apunta a las preguntas en las que aparece y cuántas veces. Se
+# guarda en .cache_preguntas/ junto a la caché de pdf_parser y sólo se vuelven a
+# indexar los PDF nuevos o modificados. Las búsquedas se puntúan con BM25 y la
+# última palabra de la consulta cuenta como prefijo, para ir buscando mientras
+# se escribe.
+#
+# buscar sólo consulta el índice en memoria, así que es barata y se puede
+# llamar en cada pulsación; actualizar_indice (que puede tener que leer PDF) se
+# llama aparte, desde la interfaz en segundo plano (ver precarga.ejecutar).
+
+INDICE_VERSION = 1
+# Parámetros de BM25
+K1 = 1.2
+B = 0.75
+# Palabras que como mucho se prueban al completar la última palabra de la consulta
+PREFIJOS_MAX = 50
+
+_PALABRA = re.compile(r"\w+")
+PALABRAS_VACIAS = frozenset("""
+    a al algo ante con cual cuales de del desde donde e el ella ellas ellos en entre era es esa ese eso esta
+    estas este esto estos fue ha hay la las le les lo los mas me mi mis muy ni nos o para pero por que se
+    sea ser si sin sobre son su sus tambien te tiene u un una uno unos y ya
+""".split())
+
+# Índice en memoria:
+#   archivos: {ruta: [size, mtime_ns, [ids]]} de los PDF ya indexados
+#   docs: {id: {"texto", "categoria", "archivos": [rutas], "longitud"}}
+#   postings: {palabra: {id: apariciones}}
+#   vocabulario: lista ordenada de palabras (para los prefijos), o None si hay que rehacerla
+_indice = {"directorio": None, "archivos": {}, "docs": {}, "postings": {}, "longitud_total": 0, "vocabulario": None}
+
+def plegar(texto):
+    """Pasa el texto a minúsculas y le quita tildes y diéresis ("Planificación" -> "planificacion")."""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+def tokens(texto):
+    """Palabras indexables del texto, plegadas y sin palabras vacías."""
+    return [p for p in _PALABRA.findall(plegar(texto)) if p not in PALABRAS_VACIAS]
+
+def _ruta_indice():
+    return os.path.join(pdf_parser.CACHE_DIR, "indice_busqueda.json")
+
+def _anadir_doc(q, texto, categoria, ruta):
+    docs, postings = _indice["docs"], _indice["postings"]
+    doc = docs.get(q)
+    if doc is not None:
+        if ruta not in doc["archivos"]:
+            doc["archivos"].append(ruta)
+        return
+    palabras = tokens(texto)
+    docs[q] = {"texto": texto, "categoria": categoria, "archivos": [ruta], "longitud": len(palabras)}
+    _indice["longitud_total"] += len(palabras)
+    for palabra in palabras:
+        lista = postings.get(palabra)
+        if lista is None:
+            lista = postings[palabra] = {}
+            if _indice["vocabulario"] is not None:
+                bisect.insort(_indice["vocabulario"], palabra)
+        lista[q] = lista.get(q, 0) + 1
+
+def _quitar_doc(q, ruta):
+    docs, postings = _indice["docs"], _indice["postings"]
+    doc = docs.get(q)
+    if doc is None:
+        return
+    if ruta in doc["archivos"]:
+        doc["archivos"].remove(ruta)
+    if doc["archivos"]:
+        return  # Sigue en otro PDF
+    del docs[q]
+    _indice["longitud_total"] -= doc["longitud"]
+    for palabra in set(tokens(doc["texto"])):
+        lista = postings.get(palabra)
+        if lista is None:
+            continue
+        lista.pop(q, None)
+        if not lista:
+            del postings[palabra]
+            _indice["vocabulario"] = None
+
+def actualizar_indice(directorio=banco_preguntas.CUESTIONARIOS_DIR, max_workers=None, progreso=None, cancelar=None):
+    """
+    Deja el índice al día con los PDF del directorio.
+
+    La primera vez se lee el índice guardado (o se construye ingiriendo los PDF
+    con banco_preguntas); después sólo se reindexan los PDF nuevos, modificados
+    o borrados, y se guarda si ha cambiado algo.
+
+    Args:
+        directorio: Carpeta de los PDF
+        max_workers: Procesos para ingerir los PDF (ver banco_preguntas.bancos_por_archivo)
+        progreso, cancelar: Para seguir o cancelar la ingestión (ver
+            banco_preguntas.bancos_por_archivo)
+
+    Returns:
+        Número de PDF que se han (re)indexado o quitado.
+    """
+    directorio = os.path.abspath(directorio)
+    if _indice["directorio"] != directorio:
+        datos = pdf_parser._leer_json(_ruta_indice())
+        if not (datos and datos.get("version") == INDICE_VERSION and datos.get("directorio") == directorio):
+            datos = {"archivos": {}, "docs": {}, "postings": {}, "longitud_total": 0}
+        _indice.update(directorio=directorio, archivos=datos["archivos"], docs=datos["docs"],
+                       postings=datos["postings"], longitud_total=datos["longitud_total"], vocabulario=None)
+    archivos = _indice["archivos"]
+
+    bancos = banco_preguntas.bancos_por_archivo(directorio, max_workers, progreso, cancelar)
+    cambiados = [ruta for ruta, banco in bancos.items()
+                 if archivos.get(ruta, [None, None])[:2] != [banco["size"], banco["mtime_ns"]]]
+    borrados = [ruta for ruta in archivos if ruta not in bancos]
+    for ruta in cambiados + borrados:
+        for q in archivos.pop(ruta, [None, None, []])[2]:
+            _quitar_doc(q, ruta)
+    for ruta in cambiados:
+        banco = bancos[ruta]
+        ids = []
+        for pregunta in banco["preguntas"]:
+            q = textos_preguntas.internar(pregunta["pregunta"])
+            _anadir_doc(q, textos_preguntas.texto(q), banco["categoria"], ruta)
+            ids.append(q)
+        archivos[ruta] = [banco["size"], banco["mtime_ns"], ids]
+
+    if cambiados or borrados:
+        try:
+            pdf_parser._escribir_json_atomico(_ruta_indice(), {
+                "version": INDICE_VERSION,
+                "directorio": directorio,
+                "archivos": archivos,
+                "docs": _indice["docs"],
+                "postings": _indice["postings"],
+                "longitud_total": _indice["longitud_total"],
+            })
+        except OSError:
+            pass
+    return len(cambiados) + len(borrados)
+
+def _palabras_consulta(consulta):
+    # Palabras de la consulta; la última (si la consulta no acaba en espacio)
+    # se completa con las palabras del índice que empiezan por ella
+    palabras = tokens(consulta)
+    if not palabras:
+        return []
+    grupos = [[p] for p in palabras]
+    if consulta[-1:].isalnum():
+        if _indice["vocabulario"] is None:
+            _indice["vocabulario"] = sorted(_indice["postings"])
+        vocabulario = _indice["vocabulario"]
+        prefijo = palabras[-1]
+        i = bisect.bisect_left(vocabulario, prefijo)
+        completadas = []
+        while i < len(vocabulario) and vocabulario[i].startswith(prefijo) and len(completadas) < PREFIJOS_MAX:
+            completadas.append(vocabulario[i])
+            i += 1
+        grupos[-1] = completadas or [prefijo]
+    return grupos
+
+def buscar(consulta, limite=50):
+    """
+    Busca preguntas por texto en el índice en memoria (hay que haber llamado
+    antes a actualizar_indice; si no, no hay resultados).
+
+    Todas las palabras de la consulta tienen que aparecer en la pregunta (la
+    última puede ser sólo el principio de una palabra). Se ordenan por BM25.
+
+    Args:
+        consulta: Texto a buscar; da igual mayúsculas o tildes
+        limite: Número máximo de resultados
+
+    Returns:
+        Lista de dicts con id, texto, categoria, archivos, puntuacion y, si la
+        pregunta se ha contestado alguna vez, intentos, fallos, tasa (%) y
+        tiempo_medio (si no, intentos a 0 y el resto a None).
+    """
+    grupos = _palabras_consulta(consulta)
+    if not grupos:
+        return []
+    docs, postings = _indice["docs"], _indice["postings"]
+    n_docs = len(docs)
+    longitud_media = _indice["longitud_total"] / n_docs if n_docs else 0
+
+    # Se empieza por el grupo con menos preguntas para cortar antes la intersección
+    listas = []
+    for grupo in grupos:
+        candidatos = {}
+        for palabra in grupo:
+            for q, apariciones in postings.get(palabra, {}).items():
+                candidatos[q] = candidatos.get(q, 0) + apariciones
+        if not candidatos:
+            return []
+        listas.append((grupo, candidatos))
+    listas.sort(key=lambda par: len(par[1]))
+    comunes = set(listas[0][1])
+    for _, candidatos in listas[1:]:
+        comunes.intersection_update(candidatos)
+
+    puntuaciones = {}
+    for grupo, candidatos in listas:
+        idf = math.log(1 + (n_docs - len(candidatos) + 0.5) / (len(candidatos) + 0.5))
+        for q in comunes:
+            tf = candidatos[q]
+            norma = K1 * (1 - B + B * docs[q]["longitud"] / longitud_media) if longitud_media else K1
+            puntuaciones[q] = puntuaciones.get(q, 0) + idf * tf * (K1 + 1) / (tf + norma)
+
+    mejores = heapq.nlargest(limite, puntuaciones.items(), key=lambda par: (par[1], par[0]))
+    for q, _ in mejores:
+        textos_preguntas.TEXTOS.setdefault(q, docs[q]["texto"])  # Índice leído de disco
+    stats = estadisticas.get_stats_preguntas([q for q, _ in mejores])
+    resultados = []
+    for q, puntuacion in mejores:
+        doc = docs[q]
+        datos = stats.get(q) or {"intentos": 0, "fallos": None, "tasa": None, "tiempo_medio": None}
+        resultados.append(dict(datos, id=q, texto=doc["texto"], categoria=doc["categoria"],
+                               archivos=list(doc["archivos"]), puntuacion=puntuacion))
+    return resultados
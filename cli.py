@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Modo terminal: exámenes e informes de estadísticas sin Tk ni matplotlib.
+
+    python cli.py examen cuestionarios/B3-T1-1.pdf -n 20 [--adaptativo]
+    python cli.py mixto B3-T1=5 B4=10
+    python cli.py mixto -n 100
+    python cli.py fallos --top 10
+    python cli.py categorias --json
+    python cli.py tendencia --sesiones 30 --salida tendencia.json
+    python cli.py analisis horas --json
+    python cli.py exportar intentos.csv
+    python cli.py buscar "planificación de riesgos" --top 20
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from datetime import datetime
+
+import estadisticas
+from examen import calcular_nota
+from pdf_parser import leer_pdf
+
+def hacer_examen(filename, n=10, entrada=input, salida=print, adaptativo=False):
+    """
+    Hace un examen en la terminal y guarda cada respuesta en las estadísticas.
+
+    Args:
+        filename: PDF de preguntas
+        n: Número de preguntas
+        entrada: Función con la que se lee cada respuesta (por defecto, input)
+        salida: Función con la que se muestra el texto (por defecto, print)
+        adaptativo: Si es True, las preguntas se eligen con planificador.py
+            (más probabilidad para las más falladas, olvidadas o lentas)
+
+    Returns:
+        Dict con correctas, falladas, saltadas, totales y nota, o None si el
+        PDF no tiene preguntas válidas.
+    """
+    if adaptativo:
+        import planificador
+        from pdf_parser import cargar_banco
+        try:
+            banco = cargar_banco(filename)
+        except Exception as e:
+            salida(f"Error: {e}")
+            return None
+        if not banco:
+            salida("No se encontraron preguntas válidas en el archivo.")
+            return None
+        return examinar([], entrada, salida, planificador.Planificador(banco, n))
+    preguntas = leer_pdf(filename, n)
+    if not preguntas:
+        salida("No se encontraron preguntas válidas en el archivo.")
+        return None
+    return examinar(preguntas, entrada, salida)
+
+def hacer_examen_mixto(tamanos=None, n=None, entrada=input, salida=print):
+    """
+    Hace en la terminal un examen con preguntas de varios cuestionarios
+    (ver banco_preguntas.componer_examen).
+
+    Args:
+        tamanos: Dict {estrato: número de preguntas}, p. ej. {"B3-T1": 5, "B4": 10}
+        n: Si no se da tamanos, número de preguntas repartidas entre todos los
+            estratos en proporción a su tamaño
+        entrada, salida: Como en hacer_examen
+
+    Returns:
+        Lo mismo que hacer_examen.
+    """
+    import banco_preguntas
+    if not tamanos:
+        estratos = banco_preguntas.indice_estratos()
+        tamanos = banco_preguntas.reparto(n or 10, {e: len(p) for e, p in estratos.items()})
+    try:
+        preguntas = banco_preguntas.componer_examen(tamanos)
+    except ValueError as e:
+        salida(str(e))
+        return None
+    if not preguntas:
+        salida("No se encontraron preguntas válidas en los cuestionarios.")
+        return None
+    return examinar(preguntas, entrada, salida)
+
+def examinar(preguntas, entrada=input, salida=print, planificador=None):
+    """
+    Pregunta en la terminal las preguntas dadas; ver hacer_examen.
+
+    Con planificador, las preguntas se van sorteando (y añadiendo a la lista)
+    una a una, como en gui.ventana_examen.iniciar_examen.
+    """
+    resultados = {"totales": 0, "correctas": 0, "falladas": 0, "saltadas": 0}
+    sesion_id = datetime.now().strftime("%Y%m%d%H%M%S")
+    salida("Responde A, B, C o D; S para saltar, Q para terminar.")
+
+    for index in itertools.count():
+        if planificador is not None and index == len(preguntas):
+            siguiente = planificador.siguiente()
+            if siguiente is not None:
+                preguntas.append(siguiente)
+        if index >= len(preguntas):
+            break
+        pregunta = preguntas[index]
+        salida(f"\nPregunta {index + 1}: {pregunta['pregunta']}")
+        for key in ("A", "B", "C", "D"):
+            salida(f"  {key}: {pregunta[key]}")
+
+        inicio = time.time()
+        while True:
+            try:
+                respuesta = entrada("> ").strip().upper()
+            except EOFError:
+                respuesta = "Q"
+            if respuesta in ("A", "B", "C", "D", "S", "Q"):
+                break
+        tiempo_respuesta = time.time() - inicio
+
+        if respuesta == "Q":
+            break
+        if respuesta == "S":
+            resultados["saltadas"] += 1
+            salida("Pregunta saltada.")
+            continue
+
+        correcta = respuesta == pregunta["respuesta_correcta"]
+        if planificador is not None:
+            planificador.registrar(pregunta, correcta, tiempo_respuesta)
+        resultados["totales"] += 1
+        resultados["correctas" if correcta else "falladas"] += 1
+        salida("¡Respuesta correcta!" if correcta else f"Respuesta incorrecta. Correcta: {pregunta['respuesta_correcta']}")
+        estadisticas.update_stats(
+            pregunta["pregunta"],
+            correcta,
+            categoria=pregunta["categoria"],
+            tiempo=tiempo_respuesta,
+            sesion_id=sesion_id,
+            archivo=pregunta.get("origen_archivo")
+        )
+
+    try:
+        estadisticas.flush_stats()
+    except estadisticas.ErrorEscritura as e:
+        salida(f"Aviso: {e}; se siguen reintentando mientras el programa esté abierto.")
+    resultados["nota"] = calcular_nota(resultados["totales"], resultados["correctas"], resultados["falladas"])
+    salida(
+        f"\nCorrectas: {resultados['correctas']}\n"
+        f"Falladas: {resultados['falladas']}\n"
+        f"En blanco: {resultados['saltadas']}\n"
+        f"Totales: {resultados['totales']}\n"
+        f"Nota: {resultados['nota']:.2f}"
+    )
+    return resultados
+
+# ---- Informes ----
+# Cada informe devuelve (datos para JSON, líneas de texto)
+
+def informe_fallos(top_n=5):
+    filas = [
+        {"pregunta": q, "fallos": fallos, "intentos": intentos, "cuestionario": cat, "tiempo_medio": round(tiempo, 2)}
+        for q, fallos, intentos, cat, tiempo in estadisticas.get_most_failed(top_n)
+    ]
+    lineas = [f"{'fallos':>6} {'intentos':>8} {'t. medio':>9}  {'cuestionario':<12} pregunta"]
+    lineas += [
+        f"{f['fallos']:>6} {f['intentos']:>8} {f['tiempo_medio']:>8.1f}s  {f['cuestionario']:<12} {f['pregunta'][:80]}"
+        for f in filas
+    ]
+    return filas, lineas
+
+def informe_categorias():
+    datos = estadisticas.get_stats_by_category()
+    lineas = [f"{'cuestionario':<12} {'preguntas':>9} {'intentos':>8} {'fallos':>6} {'% fallos':>8}"]
+    for cat, data in datos.items():
+        tasa = data["fallos"] / data["intentos"] * 100 if data["intentos"] else 0
+        lineas.append(f"{cat:<12} {data['preguntas']:>9} {data['intentos']:>8} {data['fallos']:>6} {tasa:>7.1f}%")
+    return datos, lineas
+
+def informe_busqueda(consulta, top_n=20):
+    import buscador
+    buscador.actualizar_indice()
+    datos = buscador.buscar(consulta, top_n)
+    lineas = [f"{'relev.':>6} {'intentos':>8} {'% fallos':>8}  {'cuestionario':<12} pregunta"]
+    for r in datos:
+        tasa = f"{r['tasa']:.1f}%" if r["intentos"] else "-"
+        lineas.append(f"{r['puntuacion']:>6.2f} {r['intentos']:>8} {tasa:>8}  {r['categoria']:<12} {r['texto'][:80]}")
+    return datos, lineas
+
+def informe_tendencia(last_n_sessions=10):
+    datos = estadisticas.get_trend_data(last_n_sessions)
+    lineas = [f"{'inicio':<19} {'correctas':>9} {'total':>5} {'% acierto':>9}"]
+    lineas += [f"{s['timestamp']:<19} {s['correctas']:>9} {s['total']:>5} {s['tasa']:>8.1f}%" for s in datos]
+    return datos, lineas
+
+# Agrupaciones del comando "analisis" y la función de analisis.py que la calcula
+AGRUPACIONES = {
+    "categorias": "por_categoria",
+    "sesiones": "por_sesion",
+    "dias": "por_dia",
+    "horas": "por_hora",
+    "movil": "tasa_movil",
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exámenes y estadísticas de GPDS desde la terminal.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_examen = sub.add_parser("examen", help="hace un examen en la terminal")
+    p_examen.add_argument("pdf")
+    p_examen.add_argument("-n", type=int, default=10, help="número de preguntas")
+    p_examen.add_argument("--adaptativo", action="store_true",
+                          help="elige antes las preguntas más falladas, olvidadas o lentas")
+    p_mixto = sub.add_parser("mixto", help="examen con preguntas de varios cuestionarios")
+    p_mixto.add_argument("estratos", nargs="*", metavar="ESTRATO=N",
+                         help="preguntas por tema (B3-T1=5) o bloque (B4=10)")
+    p_mixto.add_argument("-n", type=int, default=10,
+                         help="sin estratos, número de preguntas repartidas entre todos")
+
+    informes = argparse.ArgumentParser(add_help=False)
+    informes.add_argument("--json", action="store_true", help="muestra el informe en JSON")
+    informes.add_argument("--salida", help="escribe el informe en este archivo en lugar de mostrarlo")
+
+    p_fallos = sub.add_parser("fallos", parents=[informes], help="preguntas más falladas")
+    p_fallos.add_argument("--top", type=int, default=5)
+    sub.add_parser("categorias", parents=[informes], help="estadísticas por cuestionario")
+    p_tendencia = sub.add_parser("tendencia", parents=[informes], help="acierto de las últimas sesiones")
+    p_tendencia.add_argument("--sesiones", type=int, default=10, help="número de sesiones (0 = todas)")
+    p_analisis = sub.add_parser("analisis", parents=[informes], help="agregados del historial con pandas")
+    p_analisis.add_argument("agrupacion", choices=tuple(AGRUPACIONES))
+    p_buscar = sub.add_parser("buscar", parents=[informes], help="busca preguntas de los cuestionarios por texto")
+    p_buscar.add_argument("consulta")
+    p_buscar.add_argument("--top", type=int, default=20)
+    p_exportar = sub.add_parser("exportar", help="exporta el historial de intentos a CSV o Parquet")
+    p_exportar.add_argument("ruta", help="archivo .csv o .parquet")
+    args = parser.parse_args(argv)
+
+    if args.comando == "examen":
+        return 0 if hacer_examen(args.pdf, args.n, adaptativo=args.adaptativo) is not None else 1
+    if args.comando == "mixto":
+        import banco_preguntas
+        try:
+            tamanos = banco_preguntas.parsear_tamanos(args.estratos)
+        except ValueError as e:
+            parser.error(str(e))
+        return 0 if hacer_examen_mixto(tamanos, args.n) is not None else 1
+    if args.comando in ("analisis", "exportar"):
+        import analisis  # pandas sólo se carga para estos comandos
+        intentos = analisis.cargar_intentos()
+        if args.comando == "exportar":
+            analisis.exportar(intentos, args.ruta)
+            print(f"{len(intentos)} intentos exportados a {args.ruta}")
+            return 0
+        tabla = getattr(analisis, AGRUPACIONES[args.agrupacion])(intentos)
+        texto = (tabla.reset_index().to_json(orient="records", date_format="iso", force_ascii=False, indent=2)
+                 if args.json else tabla.to_string())
+        _escribir(texto, args.salida)
+        return 0
+
+    if args.comando == "fallos":
+        datos, lineas = informe_fallos(args.top)
+    elif args.comando == "categorias":
+        datos, lineas = informe_categorias()
+    elif args.comando == "buscar":
+        datos, lineas = informe_busqueda(args.consulta, args.top)
+    else:
+        datos, lineas = informe_tendencia(args.sesiones)
+
+    texto = json.dumps(datos, ensure_ascii=False, indent=2) if args.json else "\n".join(lineas)
+    _escribir(texto, args.salida)
+    return 0
+
+def _escribir(texto, salida=None):
+    if salida:
+        with open(salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+if __name__ == "__main__":
+    sys.exit(main())
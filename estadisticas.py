@@ -1,31 +1,1086 @@
 import json
 import os
-from tkinter import messagebox, Toplevel, Button, Frame, LabelFrame, Label
-from tkinter import ttk
-import matplotlib.pyplot as plt 
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from datetime import datetime
-import numpy as np 
-import tkinter as tk
+import struct
+import uuid
+import bisect
+import heapq
+import queue
+import threading
+import time
+import atexit
+import glob
+import estadisticas_sqlite
+import estimador_tiempos
+import historial_columnar
+import textos_preguntas
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
 
 STATS_FILE = os.path.join(os.path.dirname(__file__), 'stats.json')
+# Cada respuesta se añade como una línea a este journal; cada cierto número de
+# líneas se compacta todo en STATS_FILE (el snapshot) y se empieza uno nuevo.
+JOURNAL_FILE = os.path.join(os.path.dirname(__file__), 'stats.journal')
+COMPACTAR_CADA = 500
+# Retención del historial: al compactar se conservan los intentos de las últimas
+# RETENER_SESIONES sesiones y/o de los últimos RETENER_DIAS días (None = sin
+# límite). Los anteriores se resumen en contadores y sumas por pregunta y por sesión.
+RETENER_DIAS = None
+RETENER_SESIONES = None
+# "json" (stats.json + journal) o "sqlite" (stats.db)
+BACKEND = os.environ.get("GPDS_STATS_BACKEND", "json")
+DB_FILE = os.path.join(os.path.dirname(__file__), 'stats.db')
+# Filas que se insertan de cada vez en la lista de preguntas difíciles
+FILAS_POR_BLOQUE = 500
+# Clave reservada del snapshot con el id del último journal ya incluido en él
+_META = "__meta__"
 
-def load_stats():
+# Las preguntas se guardan por id (ver textos_preguntas); su texto va una sola
+# vez, en el historial binario junto con su estimador de tiempos, y stats.json
+# sólo lleva los contadores. "formato" en _META indica cómo es el snapshot:
+#   1: el texto como clave (se migra al leerlo, ver _por_id, y se escribe ya por
+#      id en la siguiente compactación); es el que no tiene ni "formato" ni
+#      "textos"
+#   2: por id, con los textos en la tabla "textos" de _META y los estimadores
+#      en cada pregunta
+#   3: por id, con textos y estimadores en el historial binario
+FORMATO_SNAPSHOT = 3
+
+def _formato(meta):
+    return meta.get("formato", 2 if "textos" in meta else 1)
+
+_stats = None           # Estadísticas en memoria: snapshot + journal
+_journal_id = None      # Id del journal al que se están añadiendo respuestas
+_journal_pendientes = 0 # Respuestas en el journal que aún no están en el snapshot
+_journal_offset = 0     # Bytes del journal ya aplicados en memoria (propios o de otras instancias)
+_version_snapshot = None # (inodo, mtime, tamaño) de STATS_FILE al leerlo o escribirlo por última vez
+_historiales_leidos = set() # Archivos de historial que este proceso ha leído bien o ha escrito
+_conn = None            # Conexión a DB_FILE cuando BACKEND == "sqlite"
+
+# Las respuestas se escriben a disco en un hilo aparte, por lotes, para que la
+# interfaz no espere nunca a la E/S. _lock protege el estado en memoria y sólo
+# se toma para leerlo o cambiarlo, nunca mientras se espera a disco: la E/S se
+# hace con _lock_archivo y el bloqueo entre procesos (ver _bloqueo_archivo), que
+# se toman siempre antes que _lock.
+LOTE_MAX = 200
+# Si un lote no se puede escribir se reintenta, esperando entre intentos desde
+# REINTENTO_INICIAL segundos hasta como mucho REINTENTO_MAX (el doble cada vez)
+REINTENTO_INICIAL = 0.5
+REINTENTO_MAX = 30
+_lock = threading.RLock()
+_lock_archivo = threading.RLock()  # Un solo hilo del proceso lee o escribe a la vez snapshot y journal
+_cola = queue.Queue()
+_hilo_escritor = None
+_reintentar = threading.Event()  # Despierta al hilo escritor para reintentar ya un lote fallido
+_conn_escritor = None   # Conexión propia del hilo escritor (sqlite)
+_no_journalizados = []  # Respuestas ya aplicadas en memoria pero aún no escritas en el journal (en orden)
+_escritura = {"lotes": 0, "registros": 0, "errores": 0, "ultima_latencia": 0.0, "max_latencia": 0.0,
+              "ultima_espera_bloqueo": 0.0, "max_espera_bloqueo": 0.0, "espera_bloqueo_total": 0.0,
+              "fusionados": 0, "recargas": 0, "ultimo_error": None}
+
+class ErrorEscritura(Exception):
+    """Hay respuestas en cola que no se han podido escribir en disco (se siguen reintentando)."""
+
+# Varias instancias del programa pueden compartir stats.json y el journal. Toda
+# lectura o escritura en disco se hace con un bloqueo exclusivo (fcntl.flock)
+# sobre STATS_FILE.lock, y antes de escribir se incorpora lo que las demás
+# hayan escrito desde la última vez (ver _sincronizar).
+_bloqueos = 0           # Profundidad del bloqueo de archivo en este proceso (es reentrante)
+
+# Índice por sesión {sesion_id: {"correctas", "total", "fecha", "timestamp"}}
+# y lista ordenada de sesiones, mantenidos por update_stats
+_sesiones = {}
+_sesiones_orden = []
+
+# Agregados globales y por cuestionario, también mantenidos por update_stats.
+# Se guardan en el snapshot junto al índice de sesiones.
+_agregados = {}
+
+# Resumen {sesion_id: {"correctas", "total", "fecha", "timestamp", "tiempo_total",
+# "tiempo_cuadrados"}} de los intentos ya quitados del historial por la retención
+_sesiones_archivadas = {}
+
+# Rankings de preguntas para sacar el top-k sin ordenar todo: para cada
+# criterio, un montículo de (clave, id), con la clave en negativo para que la
+# peor pregunta quede arriba, y la clave actual de cada id. Al actualizar una
+# pregunta se añade su entrada nueva y la anterior se descarta cuando sale
+# por arriba (o al reconstruir el montículo, si crece demasiado)
+CRITERIOS_RANKING = ("fallos", "tasa", "tiempo")
+_rankings = {criterio: [] for criterio in CRITERIOS_RANKING}
+_claves_ranking = {}
+
+# Cambia cada vez que cambian los datos en memoria (respuesta nueva, recarga,
+# retención...); sirve para saber si un cálculo hecho antes sigue valiendo
+_version = 0
+
+# Compactación en curso: copia (hecha con _congelar) de lo que hay en memoria
+# al empezarla, que se escribe en disco sin _lock. Sus entradas son las mismas
+# que las de _stats y no se cambian: una respuesta a una de esas preguntas se
+# aplica sobre una copia de la entrada (ver _aplicar_registro)
+_congelado = None
+
+def _leer_snapshot():
     if not os.path.exists(STATS_FILE):
-        return {}
-    with open(STATS_FILE, 'r', encoding='utf-8') as f:
+        return {}, {}
+    try:
+        with open(STATS_FILE, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+    except json.JSONDecodeError as e:
+        # No se trata como vacío (se acabaría sobreescribiendo): se aparta para
+        # poder recuperarlo a mano
+        corrupto = f"{STATS_FILE}.corrupto-{datetime.now():%Y%m%d%H%M%S}"
+        os.replace(STATS_FILE, corrupto)
+        print(f"Error leyendo {STATS_FILE} ({e}); se ha movido a {corrupto}")
+        return {}, {}
+    meta = stats.pop(_META, None) or {}
+
+    # El historial de intentos va aparte, en binario y por columnas
+    historiales = {}
+    if meta.get("historial"):
+        ruta_historial = os.path.join(os.path.dirname(STATS_FILE), meta["historial"])
         try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+            historiales = historial_columnar.cargar(ruta_historial)
+            _historiales_leidos.add(meta["historial"])
+        except (OSError, ValueError, struct.error) as e:
+            # Como con el snapshot: se aparta (si falla, no se sigue cargando)
+            # para que la siguiente compactación no lo borre
+            if os.path.exists(ruta_historial):
+                corrupto = f"{ruta_historial}.corrupto-{datetime.now():%Y%m%d%H%M%S}"
+                os.replace(ruta_historial, corrupto)
+                print(f"Error leyendo el historial de estadísticas ({e}); se ha movido a {corrupto}")
+            else:
+                print(f"Error leyendo el historial de estadísticas: {e}")
+    textos = meta.get("textos") or {}
+    for q, data in stats.items():
+        leido = historiales.get(q)
+        if leido:
+            data["historial"] = leido["historial"]
+            if "estimador_tiempo" in leido:
+                data["estimador_tiempo"] = leido["estimador_tiempo"]
+            if "texto" in leido:
+                textos[q] = leido["texto"]
+        historial_columnar.compactar_entrada(data)
+        if "estimador_tiempo" not in data:
+            data["estimador_tiempo"] = _estimador_inicial(data)
+    if _formato(meta) >= 2:
+        textos_preguntas.TEXTOS.update(textos)
+    else:
+        stats = _por_id(stats)
+    return stats, meta
+
+def _por_id(stats):
+    """
+    Devuelve stats con cada pregunta bajo su id, fusionando las entradas cuyo
+    texto normalizado coincide (extracciones del mismo PDF que sólo difieren
+    en espacios). Acepta claves que ya son ids conocidos o textos.
+    """
+    nuevo = {}
+    for clave, data in stats.items():
+        q = clave if clave in textos_preguntas.TEXTOS else textos_preguntas.internar(clave)
+        historial_columnar.compactar_entrada(data)
+        if "estimador_tiempo" not in data:
+            data["estimador_tiempo"] = _estimador_inicial(data)
+        if q in nuevo:
+            _fusionar_entradas(nuevo[q], data)
+        else:
+            nuevo[q] = data
+    return nuevo
+
+def _fusionar_entradas(destino, origen):
+    # Suma origen a destino: contadores, tiempos, resumen archivado e historial (por fecha)
+    destino["intentos"] += origen["intentos"]
+    destino["fallos"] += origen["fallos"]
+    destino["tiempo_total"] = (destino.get("tiempo_total", sum(destino["tiempos"]))
+                               + origen.get("tiempo_total", sum(origen["tiempos"])))
+    if not destino.get("origen_archivo") and origen.get("origen_archivo"):
+        destino["origen_archivo"] = origen["origen_archivo"]
+        destino["categoria"] = origen.get("categoria", "General")
+    if origen.get("archivado"):
+        archivado = dict(destino.get("archivado") or _archivo_vacio())
+        for clave in archivado:
+            archivado[clave] += origen["archivado"][clave]
+        destino["archivado"] = archivado
+    intentos = sorted(list(destino["historial"]) + list(origen["historial"]), key=lambda h: h["fecha"])
+    destino["historial"] = historial_columnar.Historial.desde_lista(intentos)
+    historial_columnar.compactar_entrada(destino)
+    estimador_tiempos.combinar(destino["estimador_tiempo"], origen["estimador_tiempo"])
+
+def _leer_journal(desde=0):
+    """
+    Lee el journal de respuestas.
+
+    Args:
+        desde: Posición (en bytes) a partir de la que leer respuestas. La
+            cabecera con el id del journal se lee siempre.
+
+    Returns:
+        Tupla (journal_id, registros, fin), donde fin es la posición tras la
+        última línea completa. Las líneas que no se pueden leer (por ejemplo,
+        una que quedó cortada por un cierre a mitad de escritura) se ignoran.
+    """
+    if not os.path.exists(JOURNAL_FILE):
+        return None, [], 0
+    journal_id = None
+    registros = []
+    fin = 0
+    with open(JOURNAL_FILE, 'rb') as f:
+        while True:
+            linea = f.readline()
+            if not linea.endswith(b"\n"):
+                break  # Fin del archivo o línea a medio escribir (se leerá cuando esté completa)
+            fin += len(linea)
+            try:
+                dato = json.loads(linea)
+            except ValueError:
+                dato = None
+            if isinstance(dato, dict) and "journal_id" in dato:
+                journal_id = dato["journal_id"]
+            elif dato is not None and fin > desde:
+                registros.append(dato)
+            if fin < desde:
+                f.seek(desde)
+                fin = desde
+    return journal_id, registros, fin
+
+def _nuevo_journal():
+    global _journal_id, _journal_pendientes, _journal_offset
+    journal_id = uuid.uuid4().hex
+    cabecera = (json.dumps({"journal_id": journal_id}) + "\n").encode('utf-8')
+    tmp = JOURNAL_FILE + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(cabecera)
+    os.replace(tmp, JOURNAL_FILE)
+    _journal_id = journal_id
+    _journal_pendientes = 0
+    _journal_offset = len(cabecera)
+
+def _anadir_al_journal(registros):
+    global _journal_pendientes, _journal_offset
+    if _journal_id is None:
+        _nuevo_journal()
+    lineas = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros).encode('utf-8')
+    with open(JOURNAL_FILE, 'a+b') as f:
+        # Si una escritura anterior quedó cortada, empezamos en una línea nueva
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                lineas = b"\n" + lineas
+        f.write(lineas)
+        _journal_offset = f.tell()
+    _journal_pendientes += len(registros)
+
+def _aplicar_registro(stats, registro):
+    """Aplica una respuesta (tal y como se guarda en el journal) a las estadísticas y sus índices."""
+    global _version
+    _version += 1
+    key = textos_preguntas.internar(registro["pregunta"])
+    archivo = registro.get("archivo")
+    categoria = registro.get("categoria", "General")
+    nueva = key not in stats
+
+    if nueva:
+        stats[key] = historial_columnar.compactar_entrada({
+            "intentos": 0, 
+            "fallos": 0,
+            "categoria": categoria,
+            "origen_archivo": archivo,
+            "tiempo_total": 0,
+            "estimador_tiempo": estimador_tiempos.nuevo()
+        })
+        _agregar_pregunta(stats[key], 1)
+    
+    entry = stats[key]
+    if _congelado is not None and _congelado["stats"].get(key) is entry:
+        # Una compactación la está escribiendo: se cambia una copia
+        entry = stats[key] = _copiar_entrada(entry)
+
+    # Actualizar la categoría si se proporciona un archivo nuevo
+    if archivo and not entry.get("origen_archivo"):
+        _agregar_pregunta(entry, -1)
+        entry["origen_archivo"] = archivo
+        entry["categoria"] = categoria
+        _agregar_pregunta(entry, 1)
+
+    # Actualizar intentos y fallos
+    entry["intentos"] += 1
+    if not registro["correcta"]:
+        entry["fallos"] += 1
+    
+    # Guarda el intento en el historial (y con él, el tiempo de respuesta)
+    entry["historial"].append(registro["fecha"], registro["correcta"], registro["tiempo"], registro.get("sesion_id"), archivo)
+    entry["tiempo_total"] = entry.get("tiempo_total", 0) + registro["tiempo"]
+    estimador_tiempos.anadir(entry["estimador_tiempo"], registro["tiempo"])
+
+    _agregar_intento(entry["categoria"], registro["correcta"], registro["tiempo"])
+    _indexar_sesion(registro.get("sesion_id"), registro["correcta"], registro["fecha"])
+    _actualizar_ranking(key, entry)
+
+def _copiar_entrada(data):
+    copia = dict(data, historial=data["historial"].copiar(),
+                 estimador_tiempo=estimador_tiempos.copiar(data["estimador_tiempo"]))
+    return historial_columnar.compactar_entrada(copia)
+
+def _agregados_vacios():
+    return {"preguntas": 0, "intentos": 0, "fallos": 0, "tiempo_total": 0, "n_tiempos": 0,
+            "tiempo": estimador_tiempos.nuevo()}
+
+def _estimador_inicial(data):
+    # Estimador de tiempos de una entrada que aún no lo tiene (snapshots
+    # anteriores o save_stats externo): los tiempos del historial más los
+    # resumidos por la retención, de los que sólo quedan las sumas
+    est = estimador_tiempos.nuevo()
+    for tiempo in data.get("tiempos", []):
+        estimador_tiempos.anadir(est, tiempo)
+    archivado = data.get("archivado")
+    if archivado:
+        estimador_tiempos.combinar(est, estimador_tiempos.desde_sumas(
+            archivado["intentos"], archivado["tiempo_total"], archivado["tiempo_cuadrados"]))
+    return est
+
+def _agregar_pregunta(entry, signo):
+    # Suma (signo=1) o resta (signo=-1) una pregunta completa de los agregados
+    cat = _agregados["categorias"].setdefault(entry.get("categoria", "General"), _agregados_vacios())
+    tiempo_total = entry.get("tiempo_total", sum(entry.get("tiempos", [])))
+    n_tiempos = n_tiempos_pregunta(entry)
+    for destino in (_agregados, cat):
+        destino["preguntas"] += signo
+        destino["intentos"] += signo * entry["intentos"]
+        destino["fallos"] += signo * entry["fallos"]
+        destino["tiempo_total"] += signo * tiempo_total
+        destino["n_tiempos"] += signo * n_tiempos
+        estimador_tiempos.combinar(destino["tiempo"], entry["estimador_tiempo"], signo)
+
+def _agregar_intento(categoria, correcta, tiempo):
+    cat = _agregados["categorias"].setdefault(categoria, _agregados_vacios())
+    for destino in (_agregados, cat):
+        destino["intentos"] += 1
+        if not correcta:
+            destino["fallos"] += 1
+        destino["tiempo_total"] += tiempo
+        destino["n_tiempos"] += 1
+        estimador_tiempos.anadir(destino["tiempo"], tiempo)
+
+def _indexar_sesion(sesion_id, correcta, fecha):
+    if sesion_id is None:
+        return
+    fila = _sesiones.get(sesion_id)
+    if fila is None:
+        fila = _sesiones[sesion_id] = {"correctas": 0, "total": 0, "fecha": fecha[:10], "timestamp": fecha}
+        bisect.insort(_sesiones_orden, sesion_id)
+    elif fecha < fila["timestamp"]:
+        fila["fecha"] = fecha[:10]
+        fila["timestamp"] = fecha
+    fila["total"] += 1
+    if correcta:
+        fila["correctas"] += 1
+
+def _claves_de(data):
+    intentos = data["intentos"]
+    tasa = data["fallos"] / intentos if intentos else 0
+    return {
+        "fallos": (-data["fallos"], -tasa, -intentos),
+        "tasa": (-tasa, -intentos),
+        "tiempo": (-tiempo_medio_pregunta(data), -intentos),
+    }
+
+def _actualizar_ranking(q, data):
+    nuevas = _claves_de(data)
+    if _claves_ranking.get(q) == nuevas:
+        return
+    _claves_ranking[q] = nuevas
+    for criterio, clave in nuevas.items():
+        heapq.heappush(_rankings[criterio], (clave, q))
+    # Las entradas anticuadas no pueden ser más del doble de las vigentes
+    if len(_rankings[CRITERIOS_RANKING[0]]) > 2 * len(_claves_ranking) + 100:
+        _reconstruir_rankings()
+
+def _calcular_rankings(stats):
+    # Claves y montículos de todas las preguntas, sin tocar los de memoria (para
+    # poder calcularlos fuera de _lock al leer de disco)
+    claves = {q: _claves_de(data) for q, data in stats.items()}
+    # Una lista ordenada ya es un montículo
+    return claves, {criterio: sorted((c[criterio], q) for q, c in claves.items()) for criterio in CRITERIOS_RANKING}
+
+def _instalar_rankings(claves, rankings):
+    _claves_ranking.clear()
+    _claves_ranking.update(claves)
+    _rankings.update(rankings)
+
+def _construir_rankings(stats):
+    _instalar_rankings(*_calcular_rankings(stats))
+
+def _reconstruir_rankings():
+    # Una lista ordenada ya es un montículo
+    for criterio in CRITERIOS_RANKING:
+        _rankings[criterio] = sorted((claves[criterio], q) for q, claves in _claves_ranking.items())
+
+def _vigente(entrada, criterio):
+    clave, q = entrada
+    claves = _claves_ranking.get(q)
+    return claves is not None and claves[criterio] == clave
+
+def _peores(criterio, top_n):
+    """
+    Entradas (clave, id) vigentes del ranking de un criterio, de peor a mejor.
+    Las top_n primeras se sacan del montículo en O(top_n log n) y se vuelven a
+    meter; las anticuadas que salen por el camino se descartan.
+    """
+    monticulo = _rankings[criterio]
+    if top_n is None:
+        _rankings[criterio] = sorted(set(e for e in monticulo if _vigente(e, criterio)))
+        return list(_rankings[criterio])
+    peores = []
+    while monticulo and len(peores) < top_n:
+        entrada = heapq.heappop(monticulo)
+        # Una pregunta puede volver a una clave que ya tuvo: la entrada repetida sale justo detrás
+        if _vigente(entrada, criterio) and (not peores or peores[-1] != entrada):
+            peores.append(entrada)
+    for entrada in peores:
+        heapq.heappush(monticulo, entrada)
+    return peores
+
+def _reiniciar_indices(sesiones=None, agregados=None):
+    global _agregados, _version
+    _version += 1
+    _sesiones.clear()
+    _sesiones.update(sesiones or {})
+    _sesiones_orden[:] = sorted(_sesiones)
+    _agregados = agregados or dict(_agregados_vacios(), categorias={})
+
+def _reconstruir_indices(stats):
+    # Recalcula todos los índices desde cero (snapshots antiguos o save_stats
+    # externo), partiendo de las sesiones ya resumidas por la retención
+    _reiniciar_indices({
+        sesion_id: {k: resumen[k] for k in ("correctas", "total", "fecha", "timestamp")}
+        for sesion_id, resumen in _sesiones_archivadas.items()
+    })
+    for data in stats.values():
+        data.setdefault("tiempo_total", sum(data.get("tiempos", [])))
+        if "estimador_tiempo" not in data:
+            data["estimador_tiempo"] = _estimador_inicial(data)
+        _agregar_pregunta(data, 1)
+        for h in data.get("historial", []):
+            _indexar_sesion(h.get("sesion_id"), h.get("correcta"), h.get("fecha", ""))
+
+@contextmanager
+def _bloqueo_archivo(esperar=True):
+    """
+    Bloqueo exclusivo entre procesos sobre STATS_FILE.lock (y _lock_archivo
+    entre los hilos de este proceso).
+
+    No se toma nunca con _lock tomado: mientras se espera a otra instancia, la
+    interfaz tiene que poder seguir respondiendo. Es reentrante dentro del
+    proceso y apunta en _escritura cuánto se ha esperado por él.
+
+    Args:
+        esperar: Si es False y el bloqueo lo tiene otro hilo u otra instancia,
+            no se espera
+
+    Yields:
+        True si se ha tomado el bloqueo (siempre, si esperar es True).
+    """
+    global _bloqueos
+    if not _lock_archivo.acquire(blocking=esperar):
+        yield False
+        return
+    try:
+        if _bloqueos:
+            _bloqueos += 1
+            try:
+                yield True
+            finally:
+                _bloqueos -= 1
+            return
+        inicio = time.perf_counter()
+        with open(STATS_FILE + ".lock", 'a') as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX if esperar else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            espera = time.perf_counter() - inicio
+            _escritura["ultima_espera_bloqueo"] = espera
+            _escritura["max_espera_bloqueo"] = max(_escritura["max_espera_bloqueo"], espera)
+            _escritura["espera_bloqueo_total"] += espera
+            _bloqueos = 1
+            try:
+                yield True
+            finally:
+                _bloqueos = 0
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    finally:
+        _lock_archivo.release()
+
+def _estado_snapshot():
+    try:
+        st = os.stat(STATS_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _leer_disco():
+    """
+    Lee snapshot + journal (con el bloqueo de archivo y sin _lock).
+
+    Aparte del estado del journal no cambia nada en memoria: lo leído se pone
+    en memoria con _instalar, ya con _lock. Los rankings, que es lo más costoso
+    de preparar, se calculan aquí.
+
+    Returns:
+        Tupla (stats, indices, sesiones_archivadas, registros, rankings), con
+        indices y rankings a None si hay que recalcularlos desde cero y los
+        registros del journal que aún no están en el snapshot.
+    """
+    global _journal_id, _journal_pendientes, _journal_offset, _version_snapshot
+    stats, meta = _leer_snapshot()
+    _version_snapshot = _estado_snapshot()
+    journal_id, registros, fin = _leer_journal()
+    if journal_id is not None and journal_id == meta.get("journal_absorbido"):
+        # Se cerró a mitad de una compactación: el journal ya está en el snapshot
+        _nuevo_journal()
+        registros = []
+    else:
+        _journal_id = journal_id
+        _journal_pendientes = len(registros)
+        _journal_offset = fin
+    indices = meta.get("indices")
+    if indices and ("tiempo" not in indices["agregados"] or _formato(meta) < 2):
+        # Snapshot anterior a los estimadores de tiempo o a los ids (al migrarlo
+        # se pueden haber fusionado preguntas): se recalcula todo
+        indices = None
+    rankings = _calcular_rankings(stats) if indices else None
+    return stats, indices, meta.get("sesiones_archivadas") or {}, registros, rankings
+
+def _instalar(leido, pendientes=()):
+    """
+    Pone en memoria lo leído con _leer_disco y aplica encima las respuestas del
+    journal y las propias que aún no están en disco (pendientes). Se llama con
+    _lock tomado.
+
+    Returns:
+        El diccionario de estadísticas.
+    """
+    stats, indices, sesiones_archivadas, registros, rankings = leido
+    _sesiones_archivadas.clear()
+    _sesiones_archivadas.update(sesiones_archivadas)
+    if indices:
+        _reiniciar_indices(indices["sesiones"], indices["agregados"])
+        _instalar_rankings(*rankings)
+    else:
+        _reiniciar_indices()
+    for registro in list(registros) + list(pendientes):
+        _aplicar_registro(stats, registro)
+    if not indices:
+        _reconstruir_indices(stats)
+        _construir_rankings(stats)
+    return stats
+
+def _sincronizar():
+    """
+    Incorpora en memoria lo que otras instancias hayan escrito en disco.
+
+    Si sólo han añadido respuestas al journal, se aplican sobre lo que ya hay
+    en memoria (son sumas, el orden da igual). Si han reescrito el snapshot, se
+    vuelve a leer todo y se reaplican encima las respuestas propias que aún no
+    están en el journal. Se llama con el bloqueo de archivo tomado y sin _lock,
+    que sólo se toma para pasar a memoria lo ya leído.
+    """
+    global _journal_pendientes, _journal_offset
+    if _stats is None:
+        return
+    if _estado_snapshot() == _version_snapshot:
+        journal_id, registros, fin = _leer_journal(_journal_offset)
+        if journal_id == _journal_id:
+            with _lock:
+                for registro in registros:
+                    _aplicar_registro(_stats, registro)
+            _journal_pendientes += len(registros)
+            _journal_offset = fin
+            _escritura["fusionados"] += len(registros)
+            return
+    leido = _leer_disco()
+    with _lock:
+        stats = _instalar(leido, _no_journalizados)
+        # Se conserva el mismo diccionario: es el que devuelve load_stats
+        _stats.clear()
+        _stats.update(stats)
+    _escritura["recargas"] += 1
+
+def _cargar_json():
+    # Sólo se lee de disco la primera vez; después se devuelve el diccionario en memoria
+    global _stats
+    stats = _stats
+    if stats is None:
+        with _bloqueo_archivo():
+            stats = _stats
+            if stats is None:
+                leido = _leer_disco()
+                with _lock:
+                    stats = _stats = _instalar(leido, _no_journalizados)
+    return stats
+
+def sincronizar_stats(esperar=True):
+    """
+    Incorpora las respuestas que otras instancias del programa hayan guardado.
+
+    Args:
+        esperar: Si es False y otra instancia (o el hilo escritor) está
+            escribiendo, no se espera a que acabe y no se incorpora nada
+
+    Returns:
+        True si se ha sincronizado.
+    """
+    if BACKEND == "sqlite":
+        return True
+    with _bloqueo_archivo(esperar) as tomado:
+        if tomado:
+            _sincronizar()
+        return tomado
+
+def _conexion():
+    global _conn
+    if _conn is None:
+        nueva = not os.path.exists(DB_FILE)
+        _conn = estadisticas_sqlite.conectar(DB_FILE)
+        if nueva:
+            migrar_a_sqlite()
+    return _conn
+
+def migrar_a_sqlite():
+    """Importa en stats.db todo lo guardado en stats.json y su journal."""
+    stats = _cargar_json()
+    if stats:
+        estadisticas_sqlite.importar_stats(_conexion(), stats, _sesiones_archivadas)
+
+def _conexion_al_dia():
+    # Las lecturas en SQLite tienen que ver también las respuestas aún en cola
+    flush_stats()
+    return _conexion()
+
+def load_stats():
+    """
+    Devuelve las estadísticas como {id_pregunta: datos}; el texto de cada
+    pregunta se obtiene con texto_pregunta(id).
+
+    Con el backend JSON es el diccionario en memoria (snapshot + journal) que
+    update_stats mantiene al día, así que no debe modificarse directamente.
+    """
+    if BACKEND == "sqlite":
+        return estadisticas_sqlite.cargar_stats(_conexion_al_dia())
+    return _cargar_json()
+
+def _archivo_vacio():
+    return {"intentos": 0, "fallos": 0, "tiempo_total": 0, "tiempo_cuadrados": 0}
+
+def _archivar_antiguos(congelado, dias=None, sesiones=None):
+    """
+    Calcula qué intentos quedan fuera de la política de retención, para
+    quitarlos del historial y sumarlos al resumen de su pregunta ("archivado")
+    y de su sesión. No cambia nada: el resultado se aplica con
+    _aplicar_archivado, y sólo después de haberlo escrito en disco.
+
+    Las sesiones se archivan enteras: se conservan las últimas `sesiones` y las
+    que empezaron en los últimos `dias`, contando todas las sesiones (también
+    las que ya tienen intentos archivados, que pueden seguir recibiendo
+    respuestas). Los intentos sin sesión sólo se conservan por fecha. Los
+    contadores totales de cada pregunta no cambian.
+
+    Args:
+        congelado: Copia de las estadísticas y sus índices hecha con _congelar
+
+    Returns:
+        Tupla (nuevos, sesiones_archivadas, archivados): {id: (historial,
+        archivado)} de las preguntas que cambian, el resumen de las sesiones
+        archivadas ya sumado al anterior y el número de intentos archivados.
+    """
+    if dias is None and sesiones is None:
+        return {}, congelado["sesiones_archivadas"], 0
+    todas = congelado["sesiones_orden"]
+    conservar = set(todas[max(0, len(todas) - sesiones):]) if sesiones is not None else set()
+    corte = 0
+    if dias is not None:
+        fecha_corte = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+        corte = historial_columnar.a_segundos(fecha_corte)
+        conservar.update(s for s in todas if congelado["sesiones"][s]["timestamp"] >= fecha_corte)
+    conservar = {historial_columnar.SESIONES.indices[s] for s in conservar if s in historial_columnar.SESIONES.indices}
+
+    nuevos = {}
+    por_sesion = {}
+    archivados = 0
+    for q, data in congelado["stats"].items():
+        h = data["historial"]
+        filas = []
+        archivado = None
+        for i in range(len(h)):
+            sesion = h.sesiones[i]
+            if sesion in conservar or (sesion == 0 and dias is not None and h.segundos[i] >= corte):
+                filas.append(i)
+                continue
+            if archivado is None:
+                archivado = dict(data.get("archivado") or _archivo_vacio())
+            tiempo = h.centesimas[i] / 100
+            correcta = h.correctas[i]
+            archivados += 1
+            archivado["intentos"] += 1
+            archivado["fallos"] += 0 if correcta else 1
+            archivado["tiempo_total"] += tiempo
+            archivado["tiempo_cuadrados"] += tiempo * tiempo
+            if sesion:
+                fecha = historial_columnar.a_fecha(h.segundos[i])
+                resumen = por_sesion.setdefault(historial_columnar.SESIONES.valores[sesion], {
+                    "correctas": 0, "total": 0, "fecha": fecha[:10], "timestamp": fecha,
+                    "tiempo_total": 0, "tiempo_cuadrados": 0})
+                resumen["correctas"] += correcta
+                resumen["total"] += 1
+                resumen["tiempo_total"] += tiempo
+                resumen["tiempo_cuadrados"] += tiempo * tiempo
+                if fecha < resumen["timestamp"]:
+                    resumen["fecha"], resumen["timestamp"] = fecha[:10], fecha
+        if archivado is not None:
+            nuevos[q] = (h.seleccionar(filas), archivado)
+
+    # Los intentos nuevos de una sesión ya archivada en parte se suman a su resumen
+    sesiones_archivadas = dict(congelado["sesiones_archivadas"])
+    for sesion_id, resumen in por_sesion.items():
+        anterior = sesiones_archivadas.get(sesion_id)
+        if anterior:
+            for clave in ("correctas", "total", "tiempo_total", "tiempo_cuadrados"):
+                resumen[clave] += anterior[clave]
+            if anterior["timestamp"] < resumen["timestamp"]:
+                resumen["fecha"], resumen["timestamp"] = anterior["fecha"], anterior["timestamp"]
+        sesiones_archivadas[sesion_id] = resumen
+    return nuevos, sesiones_archivadas, archivados
+
+def _aplicar_archivado(congelado, nuevos, sesiones_archivadas):
+    # Con _lock. Las preguntas que han recibido respuestas mientras se escribía
+    # conservan los intentos añadidos después de la copia
+    global _version
+    _version += 1
+    for q, (historial, archivado) in nuevos.items():
+        data = _stats[q]
+        copiado = congelado["stats"][q]["historial"]
+        if data["historial"] is not copiado:
+            historial.extender(data["historial"], len(copiado))
+        data["historial"] = historial
+        data["tiempos"] = historial.tiempos
+        data["archivado"] = archivado
+    _sesiones_archivadas.clear()
+    _sesiones_archivadas.update(sesiones_archivadas)
+
+def _copiar_agregados(agregados):
+    categorias = {cat: dict(a, tiempo=estimador_tiempos.copiar(a["tiempo"]))
+                  for cat, a in agregados["categorias"].items()}
+    return dict(agregados, tiempo=estimador_tiempos.copiar(agregados["tiempo"]), categorias=categorias)
+
+def _congelar():
+    """
+    Empieza una compactación: copia lo que hay en memoria para escribirlo sin
+    _lock. Se llama con _lock y el bloqueo de archivo tomados, cuando todo lo
+    que hay en memoria está ya en el journal (o va en el lote que se está
+    escribiendo).
+
+    Las entradas de las preguntas no se copian (sería recorrer todo): se
+    comparten con _stats hasta que llega una respuesta a esa pregunta. Sólo se
+    copian los índices, que son pequeños.
+    """
+    global _congelado
+    _congelado = {
+        "stats": dict(_stats),
+        "sesiones": {sesion_id: dict(fila) for sesion_id, fila in _sesiones.items()},
+        "sesiones_orden": list(_sesiones_orden),
+        "agregados": _copiar_agregados(_agregados),
+        "sesiones_archivadas": dict(_sesiones_archivadas),
+    }
+    return _congelado
+
+def _compactar(congelado, dias=None, sesiones=None):
+    # Escribe en disco la copia hecha por _congelar, con el bloqueo de archivo
+    # pero sin _lock: mientras tanto se puede seguir respondiendo.
+    # Escritura atómica (temporal + rename): un cierre inesperado deja el
+    # snapshot anterior o el nuevo, nunca uno a medias. El historial se escribe
+    # antes en un archivo nuevo, así el snapshot anterior sigue teniendo el suyo.
+    # Antes de escribir se calcula la retención (por defecto, RETENER_DIAS y
+    # RETENER_SESIONES), pero sólo se aplica en memoria cuando el snapshot ya
+    # está en disco: si falla la escritura, memoria y disco siguen coincidiendo.
+    global _congelado, _version_snapshot
+    directorio = os.path.dirname(STATS_FILE)
+    nombre_historial = f"{_prefijo_historial()}{uuid.uuid4().hex[:12]}.bin"
+    tmp = STATS_FILE + ".tmp"
+    try:
+        stats = congelado["stats"]
+        nuevos, sesiones_archivadas, archivados = _archivar_antiguos(
+            congelado, RETENER_DIAS if dias is None else dias, RETENER_SESIONES if sesiones is None else sesiones)
+
+        historiales = {q: dict(data, historial=nuevos[q][0]) if q in nuevos else data for q, data in stats.items()}
+        historial_columnar.guardar(os.path.join(directorio, nombre_historial), historiales,
+                                   {q: textos_preguntas.texto(q) for q in stats})
+        _historiales_leidos.add(nombre_historial)
+
+        datos = {}
+        for q, data in stats.items():
+            datos[q] = {k: v for k, v in data.items() if k not in ("historial", "tiempos", "estimador_tiempo")}
+            if q in nuevos:
+                datos[q]["archivado"] = nuevos[q][1]
+        datos[_META] = {
+            "formato": FORMATO_SNAPSHOT,
+            "journal_absorbido": _journal_id,
+            "historial": nombre_historial,
+            "sesiones_archivadas": sesiones_archivadas,
+            "indices": {"sesiones": congelado["sesiones"], "agregados": congelado["agregados"]}
+        }
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, STATS_FILE)
+    except BaseException:
+        # El snapshot anterior sigue siendo el bueno: se quita el historial nuevo
+        for ruta in (tmp, os.path.join(directorio, nombre_historial)):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        _historiales_leidos.discard(nombre_historial)
+        with _lock:
+            _congelado = None
+        raise
+    with _lock:
+        if _stats is not None:
+            _aplicar_archivado(congelado, nuevos, sesiones_archivadas)
+        _congelado = None
+    _version_snapshot = _estado_snapshot()
+    _nuevo_journal()
+
+    # Sólo se borran los historiales anteriores que se hayan leído o escrito
+    # aquí: uno que no se ha podido leer nunca se borra
+    for ruta in glob.glob(os.path.join(directorio, _prefijo_historial() + "*.bin")):
+        nombre = os.path.basename(ruta)
+        if nombre != nombre_historial and nombre in _historiales_leidos:
+            os.remove(ruta)
+            _historiales_leidos.discard(nombre)
+    return archivados
+
+def _sustituir_stats(stats):
+    # save_stats con un diccionario externo: pasa a ser el de memoria (con sus
+    # índices) y se escribe como un snapshot normal. Con _lock
+    global _stats
+    _stats = _por_id(stats)
+    _reconstruir_indices(_stats)
+    _construir_rankings(_stats)
+
+def _prefijo_historial():
+    # stats.json -> stats.hist.<id>.bin
+    return os.path.splitext(os.path.basename(STATS_FILE))[0] + ".hist."
+
+def _guardar_snapshot_al_dia(stats=None, dias=None, sesiones=None):
+    # El snapshot sólo puede escribirse cuando todo lo que hay en memoria está
+    # ya en el journal; si no, esas respuestas acabarían contadas dos veces.
+    # Antes se incorporan las que otras instancias hayan añadido al journal: si
+    # no, el snapshot nuevo las perdería
+    global _stats
+    _cargar_json()
+    while True:
+        flush_stats()
+        with _bloqueo_archivo():
+            _sincronizar()
+            try:
+                with _lock:
+                    if _no_journalizados:
+                        continue
+                    if stats is not None:
+                        _sustituir_stats(stats)
+                    congelado = _congelar()
+                return _compactar(congelado, dias, sesiones)
+            except BaseException:
+                if stats is not None:
+                    with _lock:
+                        _stats = None  # Los índices ya no son los de disco: se vuelve a leer todo
+                raise
 
 def save_stats(stats):
-    with open(STATS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(stats, f, ensure_ascii=False, indent=2)
+    """Sustituye todas las estadísticas guardadas por stats."""
+    if BACKEND == "sqlite":
+        flush_stats()
+        estadisticas_sqlite.importar_stats(_conexion(), _por_id(stats))
+    else:
+        _guardar_snapshot_al_dia(stats)
+
+def compactar_stats(dias=None, sesiones=None):
+    """
+    Vuelca el journal en el snapshot (stats.json) y resume el historial antiguo.
+
+    Los totales, la evolución por sesión y los tiempos medios no cambian; sólo
+    se pierde el detalle de cada intento archivado. Es seguro interrumpirla:
+    el snapshot anterior sigue siendo válido hasta que se sustituye.
+
+    Args:
+        dias: Días de historial a conservar (por defecto, RETENER_DIAS)
+        sesiones: Sesiones de historial a conservar (por defecto, RETENER_SESIONES)
+
+    Returns:
+        Número de intentos que se han pasado al resumen.
+    """
+    return _guardar_snapshot_al_dia(dias=dias, sesiones=sesiones)
+
+def _persistir(lote):
+    global _conn_escritor, _congelado
+    if BACKEND == "sqlite":
+        if _conn_escritor is None:
+            _conn_escritor = estadisticas_sqlite.conectar(DB_FILE)
+        estadisticas_sqlite.registrar(_conn_escritor, lote)
+        return
+    with _bloqueo_archivo():
+        _sincronizar()
+        congelado = None
+        if _journal_pendientes + len(lote) >= COMPACTAR_CADA:
+            # Toca compactar: las respuestas que esperan en la cola pasan a este
+            # lote, así lo que se copia ahora de memoria es justo lo que va a
+            # quedar en el journal
+            with _lock:
+                while True:
+                    try:
+                        lote.append(_cola.get_nowait())
+                    except queue.Empty:
+                        break
+                congelado = _congelar()
+        try:
+            _anadir_al_journal(lote)
+        except BaseException:
+            with _lock:
+                _congelado = None
+            raise
+        with _lock:
+            # Sólo cuentan como escritas si han llegado al journal: si no, el
+            # lote se reintenta
+            del _no_journalizados[:len(lote)]
+        if congelado is not None:
+            # El lote ya está a salvo en el journal: si falla la compactación no
+            # se reintenta el lote (se duplicaría), se intentará en el siguiente
+            try:
+                _compactar(congelado)
+            except Exception as e:
+                _escritura["errores"] += 1
+                print(f"Error compactando estadísticas: {e}")
+
+def _escribir_en_segundo_plano():
+    global _conn_escritor
+    while True:
+        lote = [_cola.get()]
+        while len(lote) < LOTE_MAX:
+            try:
+                lote.append(_cola.get_nowait())
+            except queue.Empty:
+                break
+        inicio = time.perf_counter()
+        espera = REINTENTO_INICIAL
+        # Ninguna respuesta se da por escrita hasta que lo está: el lote se
+        # reintenta (con esperas cada vez más largas) y mientras tanto
+        # flush_stats avisa del error en lugar de esperar sin más
+        while True:
+            try:
+                _persistir(lote)
+                break
+            except Exception as e:
+                _conn_escritor = None  # Con SQLite se vuelve a conectar en el siguiente intento
+                _escritura["errores"] += 1
+                _escritura["ultimo_error"] = f"{type(e).__name__}: {e}"
+                print(f"Error guardando estadísticas (se reintenta en {espera:g} s): {e}")
+                with _cola.all_tasks_done:
+                    _cola.all_tasks_done.notify_all()
+                _reintentar.wait(espera)
+                _reintentar.clear()
+                espera = min(espera * 2, REINTENTO_MAX)
+        latencia = time.perf_counter() - inicio
+        _escritura["ultimo_error"] = None
+        _escritura["lotes"] += 1
+        _escritura["registros"] += len(lote)
+        _escritura["ultima_latencia"] = latencia
+        _escritura["max_latencia"] = max(_escritura["max_latencia"], latencia)
+        for _ in lote:
+            _cola.task_done()
+
+def _encolar(registro):
+    global _hilo_escritor
+    if _hilo_escritor is None or not _hilo_escritor.is_alive():
+        _hilo_escritor = threading.Thread(target=_escribir_en_segundo_plano, name="escritor-estadisticas", daemon=True)
+        _hilo_escritor.start()
+    _cola.put(registro)
+
+def recargar_stats():
+    """Descarta lo que hay en memoria para que la próxima lectura vuelva a disco."""
+    global _stats, _conn, _conn_escritor
+    flush_stats()
+    with _lock:
+        _stats = None
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+    # La conexión del hilo escritor sólo puede cerrarse desde ese hilo; se
+    # abandona y el hilo abrirá otra (sobre el DB_FILE actual) en el siguiente lote
+    _conn_escritor = None
+
+def flush_stats():
+    """
+    Espera a que todas las respuestas pendientes estén escritas en disco.
+
+    Raises:
+        ErrorEscritura: Si el lote que se está escribiendo ha fallado; el hilo
+            escritor lo sigue reintentando, así que se puede volver a llamar
+    """
+    with _cola.all_tasks_done:
+        while _cola.unfinished_tasks:
+            if _escritura["ultimo_error"] is not None:
+                raise ErrorEscritura(f"No se han podido guardar {_cola.unfinished_tasks} respuestas "
+                                     f"({_escritura['ultimo_error']})")
+            _cola.all_tasks_done.wait()
+
+def reintentar_escritura():
+    """
+    Si el lote actual ha fallado, hace que se reintente ya en lugar de esperar
+    al siguiente reintento; un flush_stats posterior espera a su resultado.
+    """
+    with _cola.all_tasks_done:
+        if _escritura["ultimo_error"] is not None:
+            _escritura["ultimo_error"] = None
+            _reintentar.set()
+
+def _flush_al_salir():
+    try:
+        flush_stats()
+    except ErrorEscritura as e:
+        print(f"{e}; se pierden al salir.")
+
+def estado_escritura():
+    """
+    Devuelve el estado de la cola de escritura.
+
+    Returns:
+        Dict con las respuestas pendientes, los lotes y registros escritos, los
+        errores, el último error si el lote actual está fallando (o None), la
+        latencia (en segundos) del último lote y del más lento, la
+        espera por el bloqueo de archivo (última, máxima y total, en segundos) y
+        cuántas respuestas de otras instancias se han fusionado y cuántas veces
+        se ha tenido que releer todo porque otra instancia compactó.
+    """
+    estado = dict(_escritura)
+    estado["pendientes"] = _cola.qsize()
+    return estado
+
+atexit.register(_flush_al_salir)
 
 def update_stats(pregunta, correcta, categoria="General", tiempo=0, sesion_id=None, archivo=None):
     """
     Actualiza estadísticas de una pregunta.
+
+    La respuesta se aplica en memoria y se encola; un hilo aparte la añade al
+    journal (o a stats.db), así que la llamada no espera a disco. Cada
+    COMPACTAR_CADA respuestas el journal se vuelca en stats.json. Usa
+    flush_stats() para esperar a que todo esté escrito.
     
     Args:
         pregunta: Texto de la pregunta
@@ -35,111 +1090,254 @@ def update_stats(pregunta, correcta, categoria="General", tiempo=0, sesion_id=No
         sesion_id: ID de la sesión actual
         archivo: Ruta al archivo PDF de donde procede la pregunta
     """
-    stats = load_stats()
-    key = pregunta.strip()
-    
     if archivo:
         categoria = os.path.splitext(os.path.basename(archivo))[0]
     
-    if key not in stats:
-        stats[key] = {
-            "intentos": 0, 
-            "fallos": 0,
-            "categoria": categoria,
-            "tiempos": [],
-            "historial": [],
-            "origen_archivo": archivo
-        }
-    
-    # Actualizar intentos y fallos
-    entry = stats[key]
-    entry["intentos"] += 1
-    if not correcta:
-        entry["fallos"] += 1
-    
-    # Actualizar la categoría si se proporciona un archivo nuevo
-    if archivo and not entry.get("origen_archivo"):
-        entry["origen_archivo"] = archivo
-        entry["categoria"] = categoria
-    
-    # Guarda el tiempo de respuesta
-    entry["tiempos"].append(round(tiempo, 2))
-    
-    # Guarda historial de respuestas
-    entry["historial"].append({
-        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    registro = {
+        "pregunta": textos_preguntas.normalizar(pregunta),
         "correcta": correcta,
+        "categoria": categoria,
         "tiempo": round(tiempo, 2),
         "sesion_id": sesion_id,
-        "archivo": archivo
-    })
-    
-    stats[key] = entry
-    save_stats(stats)
+        "archivo": archivo,
+        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    if BACKEND == "sqlite":
+        _conexion()  # Crea (y migra) stats.db antes de que escriba el hilo
+        textos_preguntas.internar(registro["pregunta"])  # Las consultas por id buscan en stats.db por el texto
+        _encolar(registro)
+        return
+    stats = _cargar_json()
+    with _lock:
+        _aplicar_registro(stats, registro)
+        _no_journalizados.append(registro)
+        _encolar(registro)
+
+def id_pregunta(texto):
+    """Identificador estable y de tamaño fijo de una pregunta a partir de su texto (normalizado)."""
+    return textos_preguntas.id_pregunta(texto)
+
+def texto_pregunta(q):
+    """Texto de la pregunta con id q."""
+    return textos_preguntas.texto(q)
+
+def n_tiempos_pregunta(data):
+    """
+    Número de tiempos de respuesta de una pregunta: los del historial más los
+    ya resumidos por la retención.
+
+    Args:
+        data: Estadísticas de la pregunta (un valor de load_stats)
+    """
+    return len(data.get("tiempos", [])) + (data.get("archivado") or {}).get("intentos", 0)
+
+def tiempo_medio_pregunta(data):
+    """Tiempo medio de respuesta (en segundos) de una pregunta, dadas sus estadísticas; 0 si no tiene ninguno."""
+    n = n_tiempos_pregunta(data)
+    if not n:
+        return 0
+    return data.get("tiempo_total", sum(data["tiempos"])) / n
+
+def _fila_ranking(q, cuestionario, intentos, fallos, tiempo_medio):
+    tasa = (fallos / intentos * 100) if intentos else 0
+    return (q, texto_pregunta(q), cuestionario, intentos, fallos, tasa, tiempo_medio)
+
+def _fila_de(q, data):
+    return _fila_ranking(q, data.get("categoria", "General"), data["intentos"], data["fallos"], tiempo_medio_pregunta(data))
+
+def get_ranking(criterio="tasa", top_n=None, stats=None):
+    """
+    Devuelve las preguntas ordenadas de peor a mejor según un criterio.
+
+    Con el backend JSON se lee del ranking que mantiene update_stats
+    (O(k log n)); si se pasa un diccionario stats propio se calcula con
+    heapq.nsmallest.
+
+    Args:
+        criterio: "fallos" (número de fallos), "tasa" (tasa de fallos) o
+            "tiempo" (tiempo medio de respuesta)
+        top_n: Número de preguntas a devolver (None = todas)
+        stats: Estadísticas sobre las que calcularlo (por defecto, las guardadas)
+
+    Returns:
+        Lista de tuplas (id, pregunta, cuestionario, intentos, fallos, tasa, tiempo_medio).
+    """
+    if criterio not in CRITERIOS_RANKING:
+        raise ValueError(f"Criterio de ranking desconocido: {criterio}")
+    if stats is None and BACKEND == "sqlite":
+        return [_fila_ranking(textos_preguntas.internar(texto), *fila)
+                for texto, *fila in estadisticas_sqlite.get_ranking(_conexion_al_dia(), criterio, top_n)]
+
+    if stats is None:
+        stats = _cargar_json()
+        with _lock:
+            entradas = _peores(criterio, top_n) if top_n is None or top_n > 0 else []
+            return [_fila_de(q, stats[q]) for _, q in entradas]
+    todas = ((_claves_de(data)[criterio], q) for q, data in stats.items())
+    entradas = sorted(todas) if top_n is None else heapq.nsmallest(top_n, todas)
+    return [_fila_de(q, stats[q]) for _, q in entradas]
+
+def get_stats_preguntas(ids):
+    """
+    Devuelve los contadores de las preguntas pedidas (las que no tienen
+    estadísticas no aparecen).
+
+    Args:
+        ids: Ids de pregunta (ver id_pregunta)
+
+    Returns:
+        Dict {id: {"intentos", "fallos", "tasa", "tiempo_medio"}}, con la tasa
+        de fallos en porcentaje.
+    """
+    if BACKEND == "sqlite":
+        filas = estadisticas_sqlite.get_stats_preguntas(_conexion_al_dia(), [texto_pregunta(q) for q in ids])
+        filas = [(textos_preguntas.internar(texto), *resto) for texto, *resto in filas]
+    else:
+        stats = _cargar_json()
+        with _lock:
+            filas = [(q, stats[q]["intentos"], stats[q]["fallos"], tiempo_medio_pregunta(stats[q])) for q in ids if q in stats]
+    return {
+        q: {"intentos": intentos, "fallos": fallos, "tasa": fallos / intentos * 100 if intentos else 0,
+            "tiempo_medio": tiempo_medio}
+        for q, intentos, fallos, tiempo_medio in filas
+    }
 
 def get_most_failed(top_n=5):
-    stats = load_stats()
-    items = [(q, data["fallos"], data["intentos"], data.get("categoria", "General"), 
-              sum(data.get("tiempos", [0])) / len(data.get("tiempos", [1])) if data.get("tiempos") else 0) 
-             for q, data in stats.items()]
-    items.sort(key=lambda x: x[1], reverse=True)
-    return items[:top_n]
+    return [(q, fallos, intentos, cuestionario, tiempo_medio)
+            for _, q, cuestionario, intentos, fallos, _, tiempo_medio in get_ranking("fallos", top_n)]
+
+def get_preguntas_dificiles(stats=None):
+    """
+    Devuelve todas las preguntas ordenadas por tasa de fallos y número de intentos.
+
+    Returns:
+        Lista de tuplas (id, pregunta, cuestionario, intentos, fallos, tasa, tiempo_medio).
+    """
+    return get_ranking("tasa", stats=stats)
+
+def get_resumen():
+    """
+    Devuelve los agregados globales de las estadísticas.
+
+    Returns:
+        Dict con preguntas, intentos, fallos, tiempo_total y n_tiempos, más
+        "categorias" con esos mismos contadores para cada cuestionario.
+    """
+    if BACKEND == "sqlite":
+        return estadisticas_sqlite.get_resumen(_conexion_al_dia())
+    _cargar_json()
+    with _lock:
+        resumen = {k: v for k, v in _agregados.items() if k != "categorias"}
+        resumen["categorias"] = {cat: dict(a) for cat, a in _agregados["categorias"].items() if a["preguntas"] > 0}
+    return resumen
 
 def get_stats_by_category():
-    stats = load_stats()
-    by_cuestionario = {}
-    
-    for q, data in stats.items():
-        cuestionario = data.get("categoria", "General")
-        if cuestionario not in by_cuestionario:
-            by_cuestionario[cuestionario] = {"intentos": 0, "fallos": 0, "preguntas": 0}
-        
-        by_cuestionario[cuestionario]["intentos"] += data["intentos"]
-        by_cuestionario[cuestionario]["fallos"] += data["fallos"]
-        by_cuestionario[cuestionario]["preguntas"] += 1
-        
-    return by_cuestionario
+    if BACKEND == "sqlite":
+        return estadisticas_sqlite.get_stats_by_category(_conexion_al_dia())
+    return {
+        cuestionario: {"intentos": a["intentos"], "fallos": a["fallos"], "preguntas": a["preguntas"]}
+        for cuestionario, a in get_resumen()["categorias"].items()
+    }
+
+def version_stats():
+    """
+    Devuelve un valor que cambia siempre que cambian las estadísticas, para
+    poder reutilizar cálculos mientras siga siendo el mismo.
+    """
+    if BACKEND == "sqlite":
+        return estadisticas_sqlite.version(_conexion_al_dia())
+    _cargar_json()
+    return _version
+
+def get_tiempos_respuesta():
+    """
+    Devuelve las estadísticas de tiempos de respuesta global y por cuestionario.
+
+    Con el backend JSON salen de los estimadores que mantiene update_stats, sin
+    recorrer los tiempos guardados.
+
+    Returns:
+        Dict {"global": datos, "categorias": {cuestionario: datos}}, donde datos
+        tiene n, media, desviacion, p50, p90 y p99 (en segundos).
+    """
+    if BACKEND == "sqlite":
+        total, por_categoria = estadisticas_sqlite.get_estimadores_tiempo(_conexion_al_dia())
+    else:
+        _cargar_json()
+        with _lock:
+            total = estimador_tiempos.copiar(_agregados["tiempo"])
+            por_categoria = {cat: estimador_tiempos.copiar(a["tiempo"])
+                             for cat, a in _agregados["categorias"].items() if a["preguntas"] > 0}
+    return {
+        "global": estimador_tiempos.resumen(total),
+        "categorias": {cat: estimador_tiempos.resumen(est) for cat, est in por_categoria.items()}
+    }
+
+def get_tiempos_pregunta(pregunta):
+    """Como get_tiempos_respuesta, pero de una sola pregunta, dada por su texto (None si no tiene estadísticas)."""
+    pregunta = textos_preguntas.normalizar(pregunta)
+    if BACKEND == "sqlite":
+        est = estadisticas_sqlite.get_estimador_pregunta(_conexion_al_dia(), pregunta)
+        return estimador_tiempos.resumen(est) if est["n"] else None
+    stats = _cargar_json()
+    with _lock:
+        data = stats.get(id_pregunta(pregunta))
+        return estimador_tiempos.resumen(data["estimador_tiempo"]) if data else None
+
+def get_historial_pregunta(q, ultimos=None):
+    """
+    Devuelve los intentos de una pregunta que siguen en el historial, del más
+    antiguo al más reciente.
+
+    Args:
+        q: Id de la pregunta (ver id_pregunta)
+        ultimos: Número de intentos a devolver, los más recientes (None = todos)
+
+    Returns:
+        Lista de dicts con fecha, correcta, tiempo, sesion_id y archivo (vacía
+        si la pregunta no tiene estadísticas).
+    """
+    if ultimos is not None and ultimos <= 0:
+        return []
+    if BACKEND == "sqlite":
+        return estadisticas_sqlite.get_historial_pregunta(_conexion_al_dia(), texto_pregunta(q), ultimos)
+    stats = _cargar_json()
+    with _lock:
+        data = stats.get(q)
+        if not data:
+            return []
+        return data["historial"][-ultimos:] if ultimos is not None else list(data["historial"])
 
 def get_trend_data(last_n_sessions=10):
-    stats = load_stats()
-    
-    # Recoge todos los IDs de sesión y ordenarlos
-    all_sessions = set()
-    for q, data in stats.items():
-        for entry in data.get("historial", []):
-            if "sesion_id" in entry:
-                all_sessions.add(entry["sesion_id"])
-    
-    sessions_list = sorted(list(all_sessions))
-    if last_n_sessions > 0:
-        sessions_list = sessions_list[-last_n_sessions:]
-    
-    # Calcular rendimiento por sesión
-    trend_data = []
-    for sesion_id in sessions_list:
-        session_stats = {"correctas": 0, "total": 0, "fecha": "", "timestamp": ""}
-        
-        for q, data in stats.items():
-            for entry in data.get("historial", []):
-                if entry.get("sesion_id") == sesion_id:
-                    session_stats["total"] += 1
-                    if entry.get("correcta"):
-                        session_stats["correctas"] += 1
-                    
-                    # Solo tomamos la fecha y hora una vez
-                    if not session_stats["fecha"]:
-                        session_stats["fecha"] = entry.get("fecha", "")[:10]  # Solo la fecha para mostrar
-                        session_stats["timestamp"] = entry.get("fecha", "")  # Fecha completa con hora
-        
-        if session_stats["total"] > 0:
+    if BACKEND == "sqlite":
+        return estadisticas_sqlite.get_trend_data(_conexion_al_dia(), last_n_sessions)
+    _cargar_json()
+
+    # El índice de sesiones ya está ordenado y agregado: sólo recorremos la ventana
+    with _lock:
+        sessions_list = _sesiones_orden
+        if last_n_sessions > 0:
+            sessions_list = sessions_list[-last_n_sessions:]
+
+        trend_data = []
+        for sesion_id in sessions_list:
+            session_stats = dict(_sesiones[sesion_id])
             session_stats["tasa"] = round(session_stats["correctas"] / session_stats["total"] * 100, 1)
             trend_data.append(session_stats)
     
     return trend_data
 
 def mostrar_estadisticas_globales():
-    stats = load_stats()
-    if not stats:
+    # tkinter y gui.ventana_estadisticas (con matplotlib y numpy) sólo se
+    # importan al abrir la ventana, para que el menú principal (y quien use este
+    # módulo sin interfaz) arranque sin ellos
+    import tkinter as tk
+    from tkinter import messagebox, Toplevel, Button, Frame, Label, ttk
+    from gui import ventana_estadisticas
+
+    sincronizar_stats(esperar=False)  # Por si hay otra ventana de examen abierta (si está escribiendo, no se espera)
+    resumen = get_resumen()
+    if not resumen["preguntas"]:
         messagebox.showinfo("Estadísticas globales", "Aún no hay datos de estadísticas.")
         return
 
@@ -170,234 +1368,385 @@ def mostrar_estadisticas_globales():
     # Tab 5: Tiempos
     tab_tiempos = ttk.Frame(notebook)
     notebook.add(tab_tiempos, text="Tiempos")
-    
+
+    # Tab 6: Buscar
+    tab_buscar = ttk.Frame(notebook)
+    notebook.add(tab_buscar, text="Buscar")
+
+    # Los gráficos se piden a ventana_estadisticas por nombre: si se cerró
+    # otra ventana de estadísticas, se reutiliza su figura ya dibujada
+    graficos = []
+
+    def grafico(nombre, clase, master, *args, **pack_kwargs):
+        g = ventana_estadisticas.obtener(nombre, clase, *args)
+        g.incrustar(master, **pack_kwargs)
+        graficos.append(g)
+        return g
+
     # ---- RESUMEN ----
-    total_preg = len(stats)
-    total_int = sum(d["intentos"] for d in stats.values())
-    total_fal = sum(d["fallos"] for d in stats.values())
-    tasa_global = (total_fal / total_int * 100) if total_int else 0
-    
-    # Frame para info general
-    frame_info = LabelFrame(tab_resumen, text="Información general")
-    frame_info.pack(fill="x", padx=10, pady=10)
-    
-    Label(frame_info, text=f"Preguntas únicas: {total_preg}", font=("Helvetica", 12)).grid(row=0, column=0, padx=10, pady=5, sticky="w")
-    Label(frame_info, text=f"Total de intentos: {total_int}", font=("Helvetica", 12)).grid(row=1, column=0, padx=10, pady=5, sticky="w")
-    Label(frame_info, text=f"Total fallos: {total_fal}", font=("Helvetica", 12)).grid(row=2, column=0, padx=10, pady=5, sticky="w")
-    Label(frame_info, text=f"Tasa de fallos: {tasa_global:.1f}%", font=("Helvetica", 12)).grid(row=3, column=0, padx=10, pady=5, sticky="w")
-    
-    # Gráfico de pastel para aciertos/fallos
-    fig, ax = plt.subplots(figsize=(5, 4))
-    labels = ['Aciertos', 'Fallos']
-    sizes = [total_int - total_fal, total_fal]
-    colors = ['#4CAF50', '#f44336']
-    ax.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-    ax.axis('equal')  # Para que sea un círculo
-    canvas = FigureCanvasTkAgg(fig, master=tab_resumen)
-    canvas.draw()
-    canvas.get_tk_widget().pack(pady=10)
-    
+    def construir_resumen():
+        info = ventana_estadisticas.InfoGeneral(tab_resumen)
+        pastel = grafico("resumen", ventana_estadisticas.GraficoPastel, tab_resumen, pady=10)
+
+        def actualizar(version):
+            resumen = get_resumen()
+            total_int = resumen["intentos"]
+            total_fal = resumen["fallos"]
+            tasa_global = (total_fal / total_int * 100) if total_int else 0
+            info.set_data(resumen["preguntas"], total_int, total_fal, tasa_global)
+            pastel.actualizar(version, lambda: (total_int - total_fal, total_fal))
+        return actualizar
+
     # ---- PREGUNTAS PROBLEMÁTICAS ----
-    items = []
-    for q, data in stats.items():
-        intentos = data["intentos"]
-        fallos = data["fallos"]
-        cuestionario = data.get("categoria", "General")
-        tiempo_medio = sum(data.get("tiempos", [0])) / len(data.get("tiempos", [1])) if data.get("tiempos") else 0
-        tasa = (fallos / intentos * 100) if intentos else 0
-        items.append((q, cuestionario, intentos, fallos, tasa, tiempo_medio))
-    items.sort(key=lambda x: (-x[4], -x[2]))
-
-    # --- Selector de número de preguntas a mostrar ---
-    frame_selector = Frame(tab_preguntas)
-    frame_selector.pack(fill="x", padx=10, pady=(10, 0), anchor="w")
-    Label(frame_selector, text="Mostrar:", font=("Helvetica", 11)).pack(side="left")
-    num_preg_var = tk.IntVar(value=10)
-    spin = ttk.Spinbox(frame_selector, from_=1, to=max(1, len(items)), width=5, textvariable=num_preg_var)
-    spin.pack(side="left", padx=5)
-    Label(frame_selector, text="preguntas", font=("Helvetica", 11)).pack(side="left")
-
-    vsb = ttk.Scrollbar(tab_preguntas, orient="vertical")
-    vsb.pack(side="right", fill="y")
-
-    cols = ("Pregunta", "Cuestionario", "Intentos", "Fallos", "% Fallos", "Tiempo medio (s)")
-    tree = ttk.Treeview(tab_preguntas, columns=cols, show="headings", yscrollcommand=vsb.set)
-    vsb.config(command=tree.yview)
-
-    for col in cols:
-        tree.heading(col, text=col)
-        if col == "Pregunta":
-            tree.column(col, anchor="w", width=350)
-        elif col == "Cuestionario":
-            tree.column(col, anchor="w", width=120)
-        else:
-            tree.column(col, anchor="center", width=110)
+    def construir_preguntas():
+        # Los datos se (re)calculan en actualizar; cada fila del Treeview usa
+        # el id de la pregunta como iid. items son sólo las primeras del
+        # ranking (las que se muestran), de la versión de las estadísticas
+        # "version"; total es el número de preguntas con estadísticas
+        datos = {"items": [], "por_id": {}, "total": 0, "version": None}
 
-    def actualizar_lista_preguntas(*args):
-        tree.delete(*tree.get_children())
-        try:
-            n = int(num_preg_var.get())
-        except Exception:
-            n = 10  # valor por defecto si el spinbox está vacío o no es válido
-        n = max(1, min(n, len(items)))
-        for q, cuestionario, intentos, fallos, tasa, tiempo_medio in items[:n]:
-            texto_q = q if len(q) < 60 else q[:57] + "..."
-            tree.insert(
-                "", "end",
-                values=(
-                    texto_q,
-                    cuestionario,
-                    intentos,
-                    fallos,
-                    f"{tasa:.1f}%",
-                    f"{tiempo_medio:.1f}"
+        def cargar(n):
+            # Las n peores, del ranking que mantiene update_stats: O(n log N),
+            # sin ordenar todas las preguntas en cada actualización
+            datos["items"] = get_ranking("tasa", n)
+            datos["por_id"] = {item[0]: item for item in datos["items"]}
+            if len(datos["items"]) < n:
+                datos["total"] = len(datos["items"])  # No hay más
+
+        # --- Selector de número de preguntas a mostrar ---
+        frame_selector = Frame(tab_preguntas)
+        frame_selector.pack(fill="x", padx=10, pady=(10, 0), anchor="w")
+        Label(frame_selector, text="Mostrar:", font=("Helvetica", 11)).pack(side="left")
+        num_preg_var = tk.IntVar(value=10)
+        spin = ttk.Spinbox(frame_selector, from_=1, to=1, width=5, textvariable=num_preg_var)
+        spin.pack(side="left", padx=5)
+        Label(frame_selector, text="preguntas", font=("Helvetica", 11)).pack(side="left")
+
+        vsb = ttk.Scrollbar(tab_preguntas, orient="vertical")
+        vsb.pack(side="right", fill="y")
+
+        cols = ("Pregunta", "Cuestionario", "Intentos", "Fallos", "% Fallos", "Tiempo medio (s)")
+        tree = ventana_estadisticas.treeview(tab_preguntas, cols, vsb)
+
+        # La lista siempre muestra un prefijo de items: al cambiar N sólo se
+        # insertan o borran las filas de la diferencia, y las inserciones se
+        # hacen por bloques para no bloquear la interfaz con listas enormes.
+        estado = {"mostradas": 0, "objetivo": 0, "pendiente": None}
+
+        def insertar_bloque():
+            estado["pendiente"] = None
+            if not tree.winfo_exists():
+                return
+            inicio = estado["mostradas"]
+            fin = min(estado["objetivo"], inicio + FILAS_POR_BLOQUE)
+            for iid, q, cuestionario, intentos, fallos, tasa, tiempo_medio in datos["items"][inicio:fin]:
+                texto_q = q if len(q) < 60 else q[:57] + "..."
+                tree.insert(
+                    "", "end", iid=iid,
+                    values=(
+                        texto_q,
+                        cuestionario,
+                        intentos,
+                        fallos,
+                        f"{tasa:.1f}%",
+                        f"{tiempo_medio:.1f}"
+                    )
                 )
-            )
+            estado["mostradas"] = fin
+            if estado["mostradas"] < estado["objetivo"]:
+                estado["pendiente"] = tree.after(1, insertar_bloque)
 
-    num_preg_var.trace_add("write", actualizar_lista_preguntas)
-    tree.pack(fill="both", expand=True, padx=10, pady=10)
-    actualizar_lista_preguntas()
+        def numero_pedido():
+            try:
+                n = int(num_preg_var.get())
+            except Exception:
+                n = 10  # valor por defecto si el spinbox está vacío o no es válido
+            return max(1, min(n, datos["total"]))
 
-    def mostrar_detalle(event):
-        item_id = tree.focus()
-        if not item_id:
-            return
-        vals = tree.item(item_id, "values")
-        pregunta_texto = vals[0]
-        for q, cuestionario, intentos, fallos, tasa, tiempo_medio in items:
-            if (q if len(q) < 60 else q[:57] + "...") == pregunta_texto:
-                detalles = stats[q]
-                historial = detalles.get("historial", [])
-                detalle_str = f"Pregunta:\n{q}\n\n"
-                detalle_str += f"Cuestionario: {cuestionario}\nIntentos: {intentos}\nFallos: {fallos}\nTasa de fallos: {tasa:.1f}%\nTiempo medio: {tiempo_medio:.1f}s\n\n"
-                detalle_str += "Historial:\n"
-                for h in historial[-5:]:
-                    detalle_str += f"- {h['fecha']} | {'✔' if h['correcta'] else '✘'} | {h['tiempo']}s\n"
-                messagebox.showinfo("Detalle de pregunta", detalle_str)
-                break
+        def actualizar_lista_preguntas(*args):
+            n = numero_pedido()
+            if n > len(datos["items"]):
+                if version_stats() != datos["version"]:
+                    # Ha cambiado el orden desde que se llenó la lista: se rehace entera
+                    actualizar(version_stats())
+                    return
+                cargar(n)  # Mismas estadísticas: las que ya se muestran siguen siendo las primeras
+            items = datos["items"]
+            estado["objetivo"] = n
+            if n < estado["mostradas"]:
+                tree.delete(*[item[0] for item in items[n:estado["mostradas"]]])
+                estado["mostradas"] = n
+            elif n > estado["mostradas"] and estado["pendiente"] is None:
+                insertar_bloque()
+
+        num_preg_var.trace_add("write", actualizar_lista_preguntas)
 
-    tree.bind("<Double-1>", mostrar_detalle)
+        def actualizar(version):
+            # Con respuestas nuevas cambia el orden de toda la lista: se vacía
+            # y se vuelven a insertar las N primeras
+            if estado["pendiente"] is not None:
+                tree.after_cancel(estado["pendiente"])
+                estado["pendiente"] = None
+            datos["version"] = version
+            datos["total"] = get_resumen()["preguntas"]
+            spin.config(to=max(1, datos["total"]))
+            cargar(numero_pedido())
+            foco = tree.focus()
+            tree.delete(*tree.get_children())
+            estado["mostradas"] = 0
+            actualizar_lista_preguntas()
+            if foco and tree.exists(foco):
+                tree.focus(foco)
+                tree.selection_set(foco)
+
+        def mostrar_detalle(event):
+            item = datos["por_id"].get(tree.focus())
+            if not item:
+                return
+            iid, q, cuestionario, intentos, fallos, tasa, tiempo_medio = item
+            historial = get_historial_pregunta(iid, 5)
+            detalle_str = f"Pregunta:\n{q}\n\n"
+            detalle_str += f"Cuestionario: {cuestionario}\nIntentos: {intentos}\nFallos: {fallos}\nTasa de fallos: {tasa:.1f}%\nTiempo medio: {tiempo_medio:.1f}s\n"
+            tiempos = get_tiempos_pregunta(q)
+            if tiempos:
+                detalle_str += f"Tiempo p50/p90/p99: {tiempos['p50']:.1f}s / {tiempos['p90']:.1f}s / {tiempos['p99']:.1f}s\n"
+            detalle_str += "\n"
+            detalle_str += "Historial:\n"
+            for h in historial:
+                detalle_str += f"- {h['fecha']} | {'✔' if h['correcta'] else '✘'} | {h['tiempo']}s\n"
+            messagebox.showinfo("Detalle de pregunta", detalle_str)
+
+        tree.bind("<Double-1>", mostrar_detalle)
+        return actualizar
     
     # ---- CUESTIONARIOS ----
-    cuestionarios = get_stats_by_category()
-    
-    if cuestionarios:
-        cuestionario_names = list(cuestionarios.keys())
-        if cuestionario_names != sorted(cuestionario_names):
-            # Si no están ordenados, los ordenamos
-            cuestionarios = {k: cuestionarios[k] for k in sorted(cuestionarios.keys())}
-            cuestionario_names = list(cuestionarios.keys())
-        
-        fig2, ax2 = plt.subplots(figsize=(8, 6))
-        # Usar la lista ordenada
-        success_rates = [(cuestionarios[name]["intentos"] - cuestionarios[name]["fallos"]) / cuestionarios[name]["intentos"] * 100 if cuestionarios[name]["intentos"] > 0 else 0 for name in cuestionario_names]
-        
-        bars = ax2.bar(cuestionario_names, success_rates, color='#2196F3')
-        
-        ax2.set_xlabel('Cuestionario')
-        ax2.set_ylabel('Tasa de Éxito (%)')
-        ax2.set_title('Tasa de Éxito por Cuestionario')
-        ax2.set_ylim(0, 100)
-        
-        for bar, val in zip(bars, success_rates):
-            height = bar.get_height()
-            ax2.text(bar.get_x() + bar.get_width()/2., height + 1,
-                    f'{val:.1f}%', ha='center', va='bottom', rotation=0)
-        
-        plt.xticks(rotation=45, ha="right")
-        plt.tight_layout()
-        
-        canvas2 = FigureCanvasTkAgg(fig2, master=tab_cuestionarios)
-        canvas2.draw()
-        canvas2.get_tk_widget().pack(fill="both", expand=True, pady=10)
-        
+    def construir_cuestionarios():
+        barras = grafico("cuestionarios", ventana_estadisticas.GraficoBarras, tab_cuestionarios,
+                         '#2196F3', 'Cuestionario', 'Tasa de Éxito (%)', 'Tasa de Éxito por Cuestionario',
+                         (0, 100), lambda val: f'{val:.1f}%', fill="both", expand=True, pady=10)
+
         frame_details = Frame(tab_cuestionarios)
         frame_details.pack(fill="both", expand=True, padx=10, pady=10)
-        
+
         cols2 = ("Cuestionario", "Preguntas", "Intentos", "Fallos", "Tasa de Fallos")
         tree2 = ttk.Treeview(frame_details, columns=cols2, show="headings")
-        
+
         for col in cols2:
             tree2.heading(col, text=col)
             tree2.column(col, anchor="w", width=120)
-        
-        # Insertar en orden alfabético
-        for cuestionario in cuestionario_names:
-            data = cuestionarios[cuestionario]
-            tasa = (data["fallos"] / data["intentos"] * 100) if data["intentos"] > 0 else 0
-            tree2.insert("", "end", values=(cuestionario, data["preguntas"], data["intentos"], data["fallos"], f"{tasa:.1f}%"))
-        
         tree2.pack(fill="both", expand=True)
-    
+
+        def actualizar(version):
+            cuestionarios = get_stats_by_category()
+            # Orden alfabético
+            cuestionario_names = sorted(cuestionarios.keys())
+
+            def tasas_exito():
+                return cuestionario_names, [
+                    (cuestionarios[name]["intentos"] - cuestionarios[name]["fallos"]) / cuestionarios[name]["intentos"] * 100
+                    if cuestionarios[name]["intentos"] > 0 else 0
+                    for name in cuestionario_names
+                ]
+            barras.actualizar(version, tasas_exito)
+
+            tree2.delete(*tree2.get_children())
+            for cuestionario in cuestionario_names:
+                data = cuestionarios[cuestionario]
+                tasa = (data["fallos"] / data["intentos"] * 100) if data["intentos"] > 0 else 0
+                tree2.insert("", "end", values=(cuestionario, data["preguntas"], data["intentos"], data["fallos"], f"{tasa:.1f}%"))
+        return actualizar
+
     # ---- PROGRESO ----
-    trend_data = get_trend_data()
-    
-    if trend_data:
-        fig3, ax3 = plt.subplots(figsize=(8, 6))
-        
-        # Usamos las timestamps completas para el eje X
-        dates = [td.get("timestamp", td["fecha"]) for td in trend_data]
-        rates = [td["tasa"] for td in trend_data]
-        
-        ax3.plot(dates, rates, marker='o', linestyle='-', color='#4CAF50')
-        ax3.set_xlabel('Fecha y Hora')
-        ax3.set_ylabel('Tasa de Éxito (%)')
-        ax3.set_title('Evolución del Rendimiento')
-        ax3.set_ylim(0, 100)
-        
-        # Formato de fecha más detallado
-        fig3.autofmt_xdate()  # Rota automáticamente las etiquetas para mejor visualización
-        plt.xticks(rotation=45)
-        
-        # Añadir línea de tendencia
-        if len(trend_data) > 1:
-            z = np.polyfit(range(len(dates)), rates, 1)
-            p = np.poly1d(z)
-            ax3.plot(dates, p(range(len(dates))), "r--", alpha=0.7)
-        
-        plt.tight_layout()
-        
-        canvas3 = FigureCanvasTkAgg(fig3, master=tab_progreso)
-        canvas3.draw()
-        canvas3.get_tk_widget().pack(fill="both", expand=True, pady=10)
-    
+    def construir_progreso():
+        lineas = grafico("progreso", ventana_estadisticas.GraficoLineas, tab_progreso,
+                         'Evolución del Rendimiento', fill="both", expand=True, pady=10)
+
+        def tendencia():
+            trend_data = get_trend_data()
+            # Usamos las timestamps completas para el eje X
+            return [td.get("timestamp", td["fecha"]) for td in trend_data], [td["tasa"] for td in trend_data]
+
+        return lambda version: lineas.actualizar(version, tendencia)
+
     # ---- TIEMPOS ----
-    # Recopilar datos de tiempo
-    tiempo_por_cat = {}
-    for q, data in stats.items():
-        cat = data.get("categoria", "General")
-        if cat not in tiempo_por_cat:
-            tiempo_por_cat[cat] = []
-        
-        tiempo_por_cat[cat].extend(data.get("tiempos", []))
-    
-    if tiempo_por_cat:
-        # Calcular tiempos medios
-        cats = list(tiempo_por_cat.keys())
-        if cats != sorted(cats):
-            cats = sorted(cats)
-        tiempos_medios = {cat: sum(tiempo_por_cat[cat])/len(tiempo_por_cat[cat]) if tiempo_por_cat[cat] else 0 for cat in cats}
-        
-        fig4, ax4 = plt.subplots(figsize=(8, 6))
-        times = list(tiempos_medios.values())
-        
-        bars2 = ax4.bar(cats, times, color='#FF9800')
-        
-        ax4.set_xlabel('Categoría')
-        ax4.set_ylabel('Tiempo medio (seg)')
-        ax4.set_title('Tiempo de respuesta por categoría')
-        
-        for bar, val in zip(bars2, times):
-            height = bar.get_height()
-            ax4.text(bar.get_x() + bar.get_width()/2., height + 0.1,
-                    f'{val:.1f}s', ha='center', va='bottom', rotation=0)
-        
-        plt.xticks(rotation=45, ha="right")
-        plt.tight_layout()
-        
-        canvas4 = FigureCanvasTkAgg(fig4, master=tab_tiempos)
-        canvas4.draw()
-        canvas4.get_tk_widget().pack(fill="both", expand=True, pady=10)
+    def construir_tiempos():
+        percentiles = grafico("tiempos", ventana_estadisticas.GraficoPercentiles, tab_tiempos,
+                              'Tiempo de respuesta por categoría (percentiles)', fill="both", expand=True, pady=10)
+
+        def tiempos():
+            # Media y percentiles de cada cuestionario, sacados de los estimadores
+            # que mantiene update_stats (no se recorren los tiempos guardados)
+            tiempo_por_cat = get_tiempos_respuesta()["categorias"]
+            cats = sorted(tiempo_por_cat.keys())
+            return (cats,
+                    tuple([tiempo_por_cat[cat][p] for cat in cats] for p in ("p50", "p90", "p99")),
+                    [tiempo_por_cat[cat]["media"] for cat in cats])
+
+        return lambda version: percentiles.actualizar(version, tiempos)
+
+    # ---- BUSCAR ----
+    def construir_buscar():
+        import buscador  # Sólo hace falta si se abre esta pestaña
+        import precarga
+
+        frame_consulta = Frame(tab_buscar)
+        frame_consulta.pack(fill="x", padx=10, pady=(10, 0))
+        Label(frame_consulta, text="Buscar en los cuestionarios:", font=("Helvetica", 11)).pack(side="left")
+        consulta_var = tk.StringVar()
+        entrada = ttk.Entry(frame_consulta, textvariable=consulta_var, width=60)
+        entrada.pack(side="left", padx=5, fill="x", expand=True)
+        lbl_resultados = Label(frame_consulta, text="", font=("Helvetica", 10))
+        lbl_resultados.pack(side="left", padx=5)
+
+        vsb = ttk.Scrollbar(tab_buscar, orient="vertical")
+        vsb.pack(side="right", fill="y")
+        cols = ("Pregunta", "Cuestionario", "Intentos", "Fallos", "% Fallos", "Tiempo medio (s)")
+        tree = ttk.Treeview(tab_buscar, columns=cols, show="headings", yscrollcommand=vsb.set)
+        vsb.config(command=tree.yview)
+        for col in cols:
+            tree.heading(col, text=col)
+            if col == "Pregunta":
+                tree.column(col, anchor="w", width=400)
+            elif col == "Cuestionario":
+                tree.column(col, anchor="w", width=120)
+            else:
+                tree.column(col, anchor="center", width=100)
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        # Se busca cuando se deja de escribir un momento, no en cada tecla
+        estado = {"pendiente": None, "resultados": {}, "tarea": None}
+
+        # Cada vez que se abre la pestaña se pone al día el índice en segundo
+        # plano (la primera vez puede tener que leer todos los PDF); mientras
+        # tanto no se puede buscar, porque el índice está cambiando
+        def actualizar_indice(event=None):
+            if estado["tarea"] is not None:
+                return
+            entrada.configure(state="disabled")
+            estado["tarea"] = precarga.ejecutar(
+                lambda progreso, cancelar: buscador.actualizar_indice(progreso=progreso, cancelar=cancelar),
+                "indice-busqueda")
+            seguir_indice()
+
+        def seguir_indice():
+            tarea = estado["tarea"]
+            if not tree.winfo_exists():
+                precarga.cancelar(tarea)
+                return
+            if tarea["estado"] == "cargando":
+                if tarea["total"]:
+                    lbl_resultados.config(text=f"Indexando cuestionarios… {tarea['leidas']}/{tarea['total']} PDF")
+                tree.after(50, seguir_indice)
+                return
+            estado["tarea"] = None
+            entrada.configure(state="normal")
+            if tarea["estado"] == "error":
+                lbl_resultados.config(text=f"No se pudo indexar: {tarea['error']}")
+            else:
+                buscar()
+
+        def buscar():
+            estado["pendiente"] = None
+            if not tree.winfo_exists() or estado["tarea"] is not None:
+                return
+            inicio = time.perf_counter()
+            resultados = buscador.buscar(consulta_var.get())
+            milisegundos = (time.perf_counter() - inicio) * 1000
+            tree.delete(*tree.get_children())
+            estado["resultados"] = {r["id"]: r for r in resultados}
+            for r in resultados:
+                texto_q = r["texto"] if len(r["texto"]) < 80 else r["texto"][:77] + "..."
+                contestada = r["intentos"] > 0
+                tree.insert("", "end", iid=r["id"], values=(
+                    texto_q,
+                    r["categoria"],
+                    r["intentos"],
+                    r["fallos"] if contestada else "-",
+                    f"{r['tasa']:.1f}%" if contestada else "-",
+                    f"{r['tiempo_medio']:.1f}" if contestada else "-",
+                ))
+            lbl_resultados.config(text=f"{len(resultados)} resultados ({milisegundos:.1f} ms)" if consulta_var.get().strip() else "")
+
+        def al_escribir(*args):
+            if estado["pendiente"] is not None:
+                tree.after_cancel(estado["pendiente"])
+            estado["pendiente"] = tree.after(150, buscar)
+
+        def mostrar_detalle(event):
+            r = estado["resultados"].get(tree.focus())
+            if not r:
+                return
+            detalle_str = f"Pregunta:\n{r['texto']}\n\nCuestionarios: "
+            detalle_str += ", ".join(os.path.splitext(os.path.basename(a))[0] for a in r["archivos"]) + "\n"
+            if r["intentos"]:
+                detalle_str += (f"Intentos: {r['intentos']}\nFallos: {r['fallos']}\n"
+                                f"Tasa de fallos: {r['tasa']:.1f}%\nTiempo medio: {r['tiempo_medio']:.1f}s\n")
+            else:
+                detalle_str += "Aún no se ha contestado.\n"
+            messagebox.showinfo("Detalle de pregunta", detalle_str)
+
+        consulta_var.trace_add("write", al_escribir)
+        tree.bind("<Double-1>", mostrar_detalle)
+        tab_buscar.bind("<Map>", actualizar_indice)
+        actualizar_indice()
+        entrada.focus_set()
+
+    # Cada pestaña se construye la primera vez que se selecciona. Las que tienen
+    # gráficos devuelven una función que los rellena con los datos de una
+    # versión de las estadísticas, y se vuelve a llamar cuando esta cambia
+    constructores = {
+        str(tab_resumen): construir_resumen,
+        str(tab_preguntas): construir_preguntas,
+        str(tab_cuestionarios): construir_cuestionarios,
+        str(tab_progreso): construir_progreso,
+        str(tab_tiempos): construir_tiempos,
+        str(tab_buscar): construir_buscar,
+    }
+    actualizadores = {}
+    versiones = {}
+
+    def refrescar(tab):
+        actualizar = actualizadores.get(tab)
+        version = version_stats()
+        if actualizar and versiones.get(tab) != version:
+            versiones[tab] = version
+            actualizar(version)
+
+    def al_cambiar_pestana(event=None):
+        tab = notebook.select()
+        constructor = constructores.pop(tab, None)
+        if constructor:
+            actualizadores[tab] = constructor()
+        refrescar(tab)
+
+    # Al volver a la ventana (p. ej. después de hacer un examen) se redibuja
+    # lo que haya cambiado en la pestaña visible
+    pendiente = {"id": None}
+
+    def al_volver(event=None):
+        pendiente["id"] = None
+        if win.winfo_exists():
+            sincronizar_stats(esperar=False)  # Si otra instancia está escribiendo, ya se verá en la próxima vez
+            refrescar(notebook.select())
+
+    def al_recibir_foco(event):
+        if pendiente["id"] is None:
+            pendiente["id"] = win.after_idle(al_volver)
+
+    notebook.bind("<<NotebookTabChanged>>", al_cambiar_pestana)
+    win.bind("<FocusIn>", al_recibir_foco)
+    al_cambiar_pestana()
+
+    def guardar_graficos(event):
+        if event.widget is not win:
+            return
+        for g in graficos:
+            ventana_estadisticas.devolver(g)
+        graficos.clear()
+        constructores.clear()
+        actualizadores.clear()
+
+    win.bind("<Destroy>", guardar_graficos)
     
     # Botón para cerrar
     Button(win, text="Cerrar", command=win.destroy, bg="#f44336", fg="white",
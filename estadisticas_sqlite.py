@@ -0,0 +1,380 @@
+import json
+import sqlite3
+
+import estimador_tiempos
+import textos_preguntas
+
+# Almacenamiento de estadísticas en SQLite. Las funciones devuelven los mismos
+# formatos que las de estadisticas.py, que delega aquí cuando BACKEND == "sqlite".
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS preguntas (
+    id INTEGER PRIMARY KEY,
+    texto TEXT NOT NULL UNIQUE,
+    categoria TEXT NOT NULL DEFAULT 'General',
+    origen_archivo TEXT,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    fallos INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS intentos (
+    id INTEGER PRIMARY KEY,
+    pregunta_id INTEGER NOT NULL REFERENCES preguntas(id),
+    fecha TEXT NOT NULL,
+    correcta INTEGER NOT NULL,
+    tiempo REAL NOT NULL,
+    sesion_id TEXT,
+    archivo TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_preguntas_categoria ON preguntas(categoria);
+CREATE INDEX IF NOT EXISTS idx_preguntas_fallos ON preguntas(fallos DESC, id);
+CREATE INDEX IF NOT EXISTS idx_intentos_pregunta ON intentos(pregunta_id);
+CREATE INDEX IF NOT EXISTS idx_intentos_sesion ON intentos(sesion_id);
+CREATE INDEX IF NOT EXISTS idx_intentos_fecha ON intentos(fecha);
+
+-- Agregado por sesión, mantenido por trigger al insertar cada intento
+CREATE TABLE IF NOT EXISTS sesiones (
+    sesion_id TEXT PRIMARY KEY,
+    correctas INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    inicio TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS trg_intentos_sesion AFTER INSERT ON intentos
+WHEN NEW.sesion_id IS NOT NULL
+BEGIN
+    INSERT INTO sesiones (sesion_id, correctas, total, inicio)
+    VALUES (NEW.sesion_id, NEW.correcta, 1, NEW.fecha)
+    ON CONFLICT(sesion_id) DO UPDATE SET
+        correctas = correctas + excluded.correctas,
+        total = total + 1,
+        inicio = MIN(inicio, excluded.inicio);
+END;
+
+-- Estimadores de tiempos (ver estimador_tiempos, guardados en JSON) de cada
+-- pregunta y de cada cuestionario, mantenidos por registrar
+CREATE TABLE IF NOT EXISTS estimadores_pregunta (
+    pregunta_id INTEGER PRIMARY KEY REFERENCES preguntas(id),
+    estimador TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS estimadores_categoria (
+    categoria TEXT PRIMARY KEY,
+    estimador TEXT NOT NULL
+);
+"""
+# Expresión por la que se ordena cada ranking (coincide con los índices)
+_EXPRESION_RANKING = {
+    "fallos": "fallos",
+    "tasa": "(CAST(fallos AS REAL) / intentos)",
+    "tiempo": "(tiempo_total / n_tiempos)",
+}
+# Tabla y columna clave de cada tipo de estimador de tiempos
+_ESTIMADORES = {
+    "pregunta": ("estimadores_pregunta", "pregunta_id"),
+    "categoria": ("estimadores_categoria", "categoria"),
+}
+# Versión del esquema guardada en PRAGMA user_version
+VERSION_ESQUEMA = 6
+
+def conectar(ruta):
+    conn = sqlite3.connect(ruta)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(ESQUEMA)
+    _migrar_esquema(conn)
+    return conn
+
+def _migrar_esquema(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= VERSION_ESQUEMA:
+        return
+    with conn:
+        if version < 2:
+            # Bases de datos anteriores al agregado por sesión
+            conn.execute("DELETE FROM sesiones")
+            conn.execute(
+                "INSERT INTO sesiones (sesion_id, correctas, total, inicio) "
+                "SELECT sesion_id, SUM(correcta), COUNT(*), MIN(fecha) FROM intentos "
+                "WHERE sesion_id IS NOT NULL GROUP BY sesion_id")
+        if version < 3:
+            # Suma y número de tiempos por pregunta, para los agregados sin recorrer intentos
+            conn.execute("ALTER TABLE preguntas ADD COLUMN tiempo_total REAL NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE preguntas ADD COLUMN n_tiempos INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                "UPDATE preguntas SET "
+                "tiempo_total = (SELECT COALESCE(SUM(tiempo), 0) FROM intentos WHERE pregunta_id = preguntas.id), "
+                "n_tiempos = (SELECT COUNT(*) FROM intentos WHERE pregunta_id = preguntas.id)")
+        if version < 4:
+            # Índices sobre expresiones para los rankings por tasa y por tiempo medio
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_preguntas_tasa ON preguntas({_EXPRESION_RANKING['tasa']} DESC, intentos DESC)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_preguntas_tiempo ON preguntas({_EXPRESION_RANKING['tiempo']} DESC, intentos DESC)")
+        if version < 5:
+            _normalizar_textos(conn)
+        if version < 6:
+            _estimadores_desde_intentos(conn)
+        conn.execute(f"PRAGMA user_version = {VERSION_ESQUEMA}")
+
+def _normalizar_textos(conn):
+    # Textos normalizados (ver textos_preguntas): las preguntas que sólo se
+    # distinguían por espacios se fusionan en la de menor id
+    grupos = {}
+    filas = conn.execute(
+        "SELECT id, texto, categoria, origen_archivo, intentos, fallos, tiempo_total, n_tiempos "
+        "FROM preguntas ORDER BY id").fetchall()
+    for fila in filas:
+        grupos.setdefault(textos_preguntas.normalizar(fila[1]), []).append(fila)
+    for normal, grupo in grupos.items():
+        if len(grupo) == 1:
+            continue
+        destino = grupo[0][0]
+        otros = [fila[0] for fila in grupo[1:]]
+        con_origen = next((fila for fila in grupo if fila[3]), grupo[0])
+        marcas = ", ".join("?" * len(otros))
+        conn.execute(f"UPDATE intentos SET pregunta_id = ? WHERE pregunta_id IN ({marcas})", (destino, *otros))
+        conn.execute(f"DELETE FROM preguntas WHERE id IN ({marcas})", otros)
+        conn.execute(
+            "UPDATE preguntas SET categoria = ?, origen_archivo = ?, intentos = ?, fallos = ?, "
+            "tiempo_total = ?, n_tiempos = ? WHERE id = ?",
+            (con_origen[2], con_origen[3], sum(f[4] for f in grupo), sum(f[5] for f in grupo),
+             sum(f[6] for f in grupo), sum(f[7] for f in grupo), destino))
+    # Con los duplicados ya borrados, ningún texto normalizado puede chocar con otro
+    for normal, grupo in grupos.items():
+        if grupo[0][1] != normal:
+            conn.execute("UPDATE preguntas SET texto = ? WHERE id = ?", (normal, grupo[0][0]))
+
+def _id_pregunta(conn, texto, categoria, archivo):
+    # Devuelve (id, categoría) de la pregunta, creándola si no existe
+    texto = textos_preguntas.normalizar(texto)
+    conn.execute(
+        "INSERT INTO preguntas (texto, categoria, origen_archivo) VALUES (?, ?, ?) "
+        "ON CONFLICT(texto) DO NOTHING",
+        (texto, categoria, archivo))
+    pregunta_id, anterior, origen = conn.execute(
+        "SELECT id, categoria, origen_archivo FROM preguntas WHERE texto = ?", (texto,)).fetchone()
+    # Igual que en el JSON: si la pregunta no tenía archivo de origen, se le
+    # asigna, y sus tiempos pasan al estimador de su cuestionario nuevo
+    if archivo and origen is None:
+        conn.execute("UPDATE preguntas SET origen_archivo = ?, categoria = ? WHERE id = ?",
+                     (archivo, categoria, pregunta_id))
+        if categoria != anterior:
+            est = _leer_estimador(conn, "pregunta", pregunta_id)
+            for clave, signo in ((anterior, -1), (categoria, 1)):
+                total = _leer_estimador(conn, "categoria", clave)
+                estimador_tiempos.combinar(total, est, signo)
+                _guardar_estimador(conn, "categoria", clave, total)
+        return pregunta_id, categoria
+    return pregunta_id, anterior
+
+def _leer_estimador(conn, tipo, clave):
+    tabla, columna = _ESTIMADORES[tipo]
+    fila = conn.execute(f"SELECT estimador FROM {tabla} WHERE {columna} = ?", (clave,)).fetchone()
+    return json.loads(fila[0]) if fila else estimador_tiempos.nuevo()
+
+def _guardar_estimador(conn, tipo, clave, est):
+    tabla, columna = _ESTIMADORES[tipo]
+    conn.execute(f"INSERT OR REPLACE INTO {tabla} ({columna}, estimador) VALUES (?, ?)", (clave, json.dumps(est)))
+
+def _estimadores_desde_intentos(conn):
+    # Estimador de cada pregunta a partir de sus intentos (bases de datos
+    # anteriores a las tablas de estimadores) y, con ellos, los de cada cuestionario
+    estimadores = {}
+    for pregunta_id, tiempo in conn.execute("SELECT pregunta_id, tiempo FROM intentos ORDER BY id"):
+        estimador_tiempos.anadir(estimadores.setdefault(pregunta_id, estimador_tiempos.nuevo()), tiempo)
+    conn.execute("DELETE FROM estimadores_pregunta")
+    conn.executemany("INSERT INTO estimadores_pregunta (pregunta_id, estimador) VALUES (?, ?)",
+                     [(pregunta_id, json.dumps(est)) for pregunta_id, est in estimadores.items()])
+    _estimadores_por_categoria(conn)
+
+def _estimadores_por_categoria(conn):
+    por_categoria = {}
+    for categoria, estimador in conn.execute(
+            "SELECT p.categoria, e.estimador FROM estimadores_pregunta e JOIN preguntas p ON p.id = e.pregunta_id"):
+        estimador_tiempos.combinar(por_categoria.setdefault(categoria, estimador_tiempos.nuevo()), json.loads(estimador))
+    conn.execute("DELETE FROM estimadores_categoria")
+    conn.executemany("INSERT INTO estimadores_categoria (categoria, estimador) VALUES (?, ?)",
+                     [(categoria, json.dumps(est)) for categoria, est in por_categoria.items()])
+
+def registrar(conn, registros):
+    """Guarda en una única transacción una lista de respuestas (formato del journal)."""
+    with conn:
+        for r in registros:
+            pregunta_id, categoria = _id_pregunta(conn, r["pregunta"], r.get("categoria", "General"), r.get("archivo"))
+            conn.execute(
+                "UPDATE preguntas SET intentos = intentos + 1, fallos = fallos + ?, "
+                "tiempo_total = tiempo_total + ?, n_tiempos = n_tiempos + 1 WHERE id = ?",
+                (0 if r["correcta"] else 1, r["tiempo"], pregunta_id))
+            conn.execute(
+                "INSERT INTO intentos (pregunta_id, fecha, correcta, tiempo, sesion_id, archivo) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (pregunta_id, r["fecha"], 1 if r["correcta"] else 0, r["tiempo"], r.get("sesion_id"), r.get("archivo")))
+            for tipo, clave in (("pregunta", pregunta_id), ("categoria", categoria)):
+                est = _leer_estimador(conn, tipo, clave)
+                estimador_tiempos.anadir(est, r["tiempo"])
+                _guardar_estimador(conn, tipo, clave, est)
+
+def importar_stats(conn, stats, sesiones_archivadas=None):
+    """
+    Sustituye el contenido de la base de datos por el de un diccionario de
+    estadísticas por id de pregunta (como el de estadisticas.load_stats).
+
+    sesiones_archivadas son los resúmenes de las sesiones cuyos intentos ya no
+    están en el historial (ver estadisticas.compactar_stats).
+    """
+    with conn:
+        conn.execute("DELETE FROM estimadores_pregunta")
+        conn.execute("DELETE FROM intentos")
+        conn.execute("DELETE FROM preguntas")
+        conn.execute("DELETE FROM sesiones")
+        for q, data in stats.items():
+            texto = textos_preguntas.texto(q)
+            tiempos = data.get("tiempos", [])
+            archivado = data.get("archivado") or {}
+            cur = conn.execute(
+                "INSERT INTO preguntas (texto, categoria, origen_archivo, intentos, fallos, tiempo_total, n_tiempos) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (texto, data.get("categoria", "General"), data.get("origen_archivo"),
+                 data.get("intentos", 0), data.get("fallos", 0), data.get("tiempo_total", sum(tiempos)),
+                 len(tiempos) + archivado.get("intentos", 0)))
+            conn.executemany(
+                "INSERT INTO intentos (pregunta_id, fecha, correcta, tiempo, sesion_id, archivo) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(cur.lastrowid, h.get("fecha", ""), 1 if h.get("correcta") else 0, h.get("tiempo", 0),
+                  h.get("sesion_id"), h.get("archivo")) for h in data.get("historial", [])])
+            est = data.get("estimador_tiempo")
+            if est is None:
+                # Sin estimador: los tiempos del historial más los resumidos por la retención
+                est = estimador_tiempos.desde_sumas(archivado.get("intentos", 0), archivado.get("tiempo_total", 0),
+                                                    archivado.get("tiempo_cuadrados", 0))
+                for tiempo in tiempos:
+                    estimador_tiempos.anadir(est, tiempo)
+            _guardar_estimador(conn, "pregunta", cur.lastrowid, est)
+        _estimadores_por_categoria(conn)
+        for sesion_id, resumen in (sesiones_archivadas or {}).items():
+            conn.execute(
+                "INSERT INTO sesiones (sesion_id, correctas, total, inicio) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(sesion_id) DO UPDATE SET "
+                "correctas = correctas + excluded.correctas, total = total + excluded.total, "
+                "inicio = MIN(inicio, excluded.inicio)",
+                (sesion_id, resumen["correctas"], resumen["total"], resumen["timestamp"]))
+
+def cargar_stats(conn):
+    """Devuelve las estadísticas como {id_pregunta: datos}, igual que estadisticas.load_stats."""
+    stats = {}
+    por_id = {}
+    for pid, texto, categoria, origen, intentos, fallos, tiempo_total in conn.execute(
+            "SELECT id, texto, categoria, origen_archivo, intentos, fallos, tiempo_total FROM preguntas ORDER BY id"):
+        entry = {
+            "intentos": intentos,
+            "fallos": fallos,
+            "categoria": categoria,
+            "tiempos": [],
+            "historial": [],
+            "origen_archivo": origen,
+            "tiempo_total": tiempo_total
+        }
+        stats[textos_preguntas.internar(texto)] = entry
+        por_id[pid] = entry
+    for pid, fecha, correcta, tiempo, sesion_id, archivo in conn.execute(
+            "SELECT pregunta_id, fecha, correcta, tiempo, sesion_id, archivo FROM intentos ORDER BY id"):
+        entry = por_id[pid]
+        entry["tiempos"].append(tiempo)
+        entry["historial"].append({
+            "fecha": fecha,
+            "correcta": bool(correcta),
+            "tiempo": tiempo,
+            "sesion_id": sesion_id,
+            "archivo": archivo
+        })
+    return stats
+
+def get_ranking(conn, criterio, top_n=None):
+    """Devuelve (texto, categoria, intentos, fallos, tiempo_medio) de las top_n peores preguntas."""
+    desempate = "id" if criterio == "fallos" else "intentos DESC"
+    return conn.execute(
+        "SELECT texto, categoria, intentos, fallos, COALESCE(tiempo_total / n_tiempos, 0) FROM preguntas "
+        f"ORDER BY {_EXPRESION_RANKING[criterio]} DESC, {desempate} LIMIT ?",
+        (-1 if top_n is None else top_n,)).fetchall()
+
+def get_stats_preguntas(conn, textos):
+    """Devuelve (texto, intentos, fallos, tiempo_medio) de las preguntas con esos textos."""
+    filas = []
+    textos = list(textos)
+    for inicio in range(0, len(textos), 500):  # Por debajo del límite de parámetros de SQLite
+        bloque = textos[inicio:inicio + 500]
+        filas += conn.execute(
+            "SELECT texto, intentos, fallos, COALESCE(tiempo_total / n_tiempos, 0) FROM preguntas "
+            f"WHERE texto IN ({', '.join('?' * len(bloque))})", bloque).fetchall()
+    return filas
+
+def get_historial_pregunta(conn, texto, ultimos=None):
+    """Devuelve los últimos intentos (todos si ultimos es None) de la pregunta con ese texto, por orden."""
+    filas = conn.execute(
+        "SELECT i.fecha, i.correcta, i.tiempo, i.sesion_id, i.archivo FROM intentos i "
+        "JOIN preguntas p ON p.id = i.pregunta_id WHERE p.texto = ? ORDER BY i.id DESC LIMIT ?",
+        (texto, -1 if ultimos is None else ultimos)).fetchall()
+    return [{"fecha": fecha, "correcta": bool(correcta), "tiempo": tiempo, "sesion_id": sesion_id, "archivo": archivo}
+            for fecha, correcta, tiempo, sesion_id, archivo in reversed(filas)]
+
+def get_resumen(conn):
+    claves = ("preguntas", "intentos", "fallos", "tiempo_total", "n_tiempos")
+    resumen = dict.fromkeys(claves, 0)
+    resumen["categorias"] = {}
+    for categoria, *valores in conn.execute(
+            "SELECT categoria, COUNT(*), SUM(intentos), SUM(fallos), SUM(tiempo_total), SUM(n_tiempos) "
+            "FROM preguntas GROUP BY categoria ORDER BY MIN(id)"):
+        resumen["categorias"][categoria] = dict(zip(claves, valores))
+        for clave, valor in zip(claves, valores):
+            resumen[clave] += valor
+    return resumen
+
+def get_stats_by_category(conn):
+    return {
+        categoria: {"intentos": intentos, "fallos": fallos, "preguntas": preguntas}
+        for categoria, intentos, fallos, preguntas in conn.execute(
+            "SELECT categoria, SUM(intentos), SUM(fallos), COUNT(*) FROM preguntas "
+            "GROUP BY categoria ORDER BY MIN(id)")
+    }
+
+def get_trend_data(conn, last_n_sessions=10):
+    limite = last_n_sessions if last_n_sessions > 0 else -1
+    filas = conn.execute(
+        "SELECT correctas, total, inicio FROM "
+        "(SELECT * FROM sesiones ORDER BY sesion_id DESC LIMIT ?) "
+        "ORDER BY sesion_id",
+        (limite,)).fetchall()
+    return [
+        {
+            "correctas": correctas,
+            "total": total,
+            "fecha": inicio[:10],
+            "timestamp": inicio,
+            "tasa": round(correctas / total * 100, 1)
+        }
+        for correctas, total, inicio in filas
+    ]
+
+def version(conn):
+    # Último intento y número de intentos: cambia con cada respuesta o importación
+    return conn.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM intentos").fetchone()
+
+def get_estimadores_tiempo(conn):
+    """
+    Estimadores de tiempos de respuesta (ver estimador_tiempos) global y por
+    cuestionario, de los que mantiene registrar.
+
+    Returns:
+        Tupla (estimador_global, {categoria: estimador}).
+    """
+    total = estimador_tiempos.nuevo()
+    por_categoria = {}
+    for categoria, estimador in conn.execute(
+            "SELECT e.categoria, e.estimador FROM estimadores_categoria e "
+            "JOIN (SELECT categoria, MIN(id) AS primera FROM preguntas GROUP BY categoria) p "
+            "ON p.categoria = e.categoria ORDER BY p.primera"):
+        est = por_categoria[categoria] = json.loads(estimador)
+        estimador_tiempos.combinar(total, est)
+    return total, por_categoria
+
+def get_estimador_pregunta(conn, texto):
+    fila = conn.execute(
+        "SELECT e.estimador FROM estimadores_pregunta e JOIN preguntas p ON p.id = e.pregunta_id "
+        "WHERE p.texto = ?", (texto,)).fetchone()
+    return json.loads(fila[0]) if fila else estimador_tiempos.nuevo()
@@ -0,0 +1,134 @@
+import math
+
+# Estimador de tiempos de respuesta que se actualiza en O(1) sin guardar cada
+# muestra: media y varianza por el método de Welford, mínimo y máximo, y un
+# histograma con cubetas de tamaño geométrico para los percentiles.
+#
+# Es un diccionario (se guarda tal cual en stats.json):
+#   {"n", "media", "m2", "min", "max", "cubetas": {"<i>": cuenta}}
+# La cubeta 0 es [0, TIEMPO_BASE) y la i >= 1 es
+# [TIEMPO_BASE * (1 + PRECISION)^(i-1), TIEMPO_BASE * (1 + PRECISION)^i), así
+# que el error relativo de un percentil es como mucho PRECISION / 2 y hay como
+# mucho CUBETAS_MAX + 1 cubetas por estimador, haya las respuestas que haya.
+
+TIEMPO_BASE = 0.5
+PRECISION = 0.1
+CUBETAS_MAX = 100  # TIEMPO_BASE * 1.1^100 ≈ 2 horas; lo que pase de ahí va a la última
+PERCENTILES = (50, 90, 99)
+
+_LOG_CRECIMIENTO = math.log1p(PRECISION)
+
+def nuevo():
+    return {"n": 0, "media": 0.0, "m2": 0.0, "min": None, "max": None, "cubetas": {}}
+
+def copiar(est):
+    """Copia de un estimador que se puede cambiar sin tocar el original."""
+    return dict(est, cubetas=dict(est["cubetas"]))
+
+def _cubeta(tiempo):
+    if tiempo < TIEMPO_BASE:
+        return 0
+    return min(CUBETAS_MAX, 1 + int(math.log(tiempo / TIEMPO_BASE) / _LOG_CRECIMIENTO))
+
+def _limites(i):
+    if i == 0:
+        return 0.0, TIEMPO_BASE
+    return TIEMPO_BASE * (1 + PRECISION) ** (i - 1), TIEMPO_BASE * (1 + PRECISION) ** i
+
+def anadir(est, tiempo):
+    """Añade un tiempo de respuesta (en segundos) al estimador."""
+    est["n"] += 1
+    delta = tiempo - est["media"]
+    est["media"] += delta / est["n"]
+    est["m2"] += delta * (tiempo - est["media"])
+    est["min"] = tiempo if est["min"] is None else min(est["min"], tiempo)
+    est["max"] = tiempo if est["max"] is None else max(est["max"], tiempo)
+    clave = str(_cubeta(tiempo))
+    est["cubetas"][clave] = est["cubetas"].get(clave, 0) + 1
+
+def combinar(destino, origen, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) el estimador origen a destino.
+
+    Al restar, el mínimo y el máximo no se pueden recuperar y se dejan como
+    estaban; sólo sirven de cota para los percentiles, así que no pasa nada.
+    """
+    n_origen = origen["n"]
+    if not n_origen:
+        return
+    n_total = destino["n"] + signo * n_origen
+    if n_total <= 0:
+        destino.update(nuevo())
+        return
+    if signo > 0:
+        # Chan et al.: combinación de dos medias y varianzas
+        delta = origen["media"] - destino["media"]
+        media = destino["media"] + delta * n_origen / n_total
+        m2 = destino["m2"] + origen["m2"] + delta * delta * destino["n"] * n_origen / n_total
+        for clave, valor in (("min", min), ("max", max)):
+            if origen[clave] is not None:
+                destino[clave] = origen[clave] if destino[clave] is None else valor(destino[clave], origen[clave])
+    else:
+        # La misma fórmula despejando el resto a partir del total
+        media = (destino["n"] * destino["media"] - n_origen * origen["media"]) / n_total
+        delta = origen["media"] - media
+        m2 = max(0.0, destino["m2"] - origen["m2"] - delta * delta * n_total * n_origen / destino["n"])
+    destino["n"] = n_total
+    destino["media"] = media
+    destino["m2"] = m2
+    cubetas = destino["cubetas"]
+    for clave, cuenta in origen["cubetas"].items():
+        cuenta = cubetas.get(clave, 0) + signo * cuenta
+        if cuenta > 0:
+            cubetas[clave] = cuenta
+        else:
+            cubetas.pop(clave, None)
+
+def desde_sumas(n, suma, suma_cuadrados):
+    """Estimador sin histograma a partir de número, suma y suma de cuadrados de los tiempos."""
+    est = nuevo()
+    if n:
+        est["n"] = n
+        est["media"] = suma / n
+        est["m2"] = max(0.0, suma_cuadrados - suma * suma / n)
+    return est
+
+def varianza(est):
+    return est["m2"] / (est["n"] - 1) if est["n"] > 1 else 0.0
+
+def desviacion(est):
+    return math.sqrt(varianza(est))
+
+def percentil(est, p):
+    """
+    Devuelve el percentil p (0-100) de los tiempos añadidos, o 0 si no hay ninguno.
+
+    Se interpola linealmente dentro de la cubeta en la que cae y se acota al
+    mínimo y al máximo vistos.
+    """
+    cubetas = est["cubetas"]
+    total = sum(cubetas.values())
+    if not total:
+        return 0.0
+    objetivo = p / 100 * total
+    acumulado = 0
+    for i in sorted(int(clave) for clave in cubetas):
+        cuenta = cubetas[str(i)]
+        if acumulado + cuenta >= objetivo:
+            inferior, superior = _limites(i)
+            valor = inferior + (superior - inferior) * (objetivo - acumulado) / cuenta
+            break
+        acumulado += cuenta
+    if est["min"] is not None:
+        valor = max(est["min"], min(est["max"], valor))
+    return valor
+
+def resumen(est, percentiles=PERCENTILES):
+    """
+    Returns:
+        Dict con n, media, desviacion y "p<k>" para cada percentil pedido.
+    """
+    datos = {"n": est["n"], "media": est["media"], "desviacion": desviacion(est)}
+    for p in percentiles:
+        datos[f"p{p}"] = percentil(est, p)
+    return datos
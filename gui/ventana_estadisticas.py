@@ -1,27 +1,259 @@
-import tkinter as tk
-from tkinter import messagebox, Toplevel, Button, Frame, LabelFrame, Label, ttk
-import matplotlib.pyplot as plt
+from tkinter import LabelFrame, Label, ttk
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 
-def mostrar_info_general(tab, total_preg, total_int, total_fal, tasa_global):
-    frame_info = LabelFrame(tab, text="Información general")
-    frame_info.pack(fill="x", padx=10, pady=10)
-    Label(frame_info, text=f"Preguntas únicas: {total_preg}", font=("Helvetica", 12)).grid(row=0, column=0, padx=10, pady=5, sticky="w")
-    Label(frame_info, text=f"Total de intentos: {total_int}", font=("Helvetica", 12)).grid(row=1, column=0, padx=10, pady=5, sticky="w")
-    Label(frame_info, text=f"Total fallos: {total_fal}", font=("Helvetica", 12)).grid(row=2, column=0, padx=10, pady=5, sticky="w")
-    Label(frame_info, text=f"Tasa de fallos: {tasa_global:.1f}%", font=("Helvetica", 12)).grid(row=3, column=0, padx=10, pady=5, sticky="w")
-
-def grafico_pastel(tab, total_int, total_fal):
-    fig, ax = plt.subplots(figsize=(5, 4))
-    labels = ['Aciertos', 'Fallos']
-    sizes = [total_int - total_fal, total_fal]
-    colors = ['#4CAF50', '#f44336']
-    ax.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-    ax.axis('equal')
-    canvas = FigureCanvasTkAgg(fig, master=tab)
-    canvas.draw()
-    canvas.get_tk_widget().pack(pady=10)
+# Widgets de la ventana de estadísticas. Cada gráfico tiene su Figure, que se
+# crea una sola vez y se actualiza con set_data: si la forma de los datos no
+# cambia (mismos cuestionarios, mismo número de sesiones...) sólo se mueven
+# los artistas que ya hay (set_height, set_data...) y se repinta con
+# draw_idle; si los datos son iguales a los dibujados no se toca nada.
+#
+# Las figuras se guardan al cerrar la ventana en una caché por nombre, junto a
+# la versión de las estadísticas (estadisticas.version_stats) con la que se
+# dibujaron, así que al volver a abrirla sin respuestas nuevas no se vuelven a
+# calcular los datos ni a crear los artistas.
+
+# {nombre: gráfico} de los que no están en ninguna ventana abierta
+_cache = {}
+
+def obtener(nombre, clase, *args, **kwargs):
+    """
+    Devuelve el gráfico guardado con ese nombre o, si no hay, uno nuevo
+    clase(*args, **kwargs). Mientras esté en una ventana sale de la caché, así
+    que una segunda ventana abierta a la vez tiene su propia figura.
+    """
+    grafico = _cache.pop(nombre, None)
+    if not isinstance(grafico, clase):
+        grafico = clase(*args, **kwargs)
+    grafico.nombre = nombre
+    return grafico
+
+def devolver(grafico):
+    """Guarda en la caché un gráfico de una ventana que se cierra."""
+    grafico.canvas = None
+    _cache[grafico.nombre] = grafico
+
+class Grafico:
+    """
+    Figura con un solo eje que se actualiza sin volver a crearla.
+
+    Las subclases implementan _construir(*datos), que dibuja desde cero sobre
+    el eje vacío, y _cambiar(*datos), que actualiza los artistas ya dibujados
+    y devuelve False si no puede (y entonces se construye desde cero).
+    """
+
+    def __init__(self, figsize=(8, 6)):
+        self.nombre = None
+        self.fig = Figure(figsize=figsize)
+        self.ax = self.fig.add_subplot()
+        self.canvas = None
+        self.datos = None
+        self.version = None  # Versión de las estadísticas de los datos dibujados
+
+    def incrustar(self, master, **pack_kwargs):
+        """Pone la figura en master (con pack) y la pinta en cuanto Tk esté libre."""
+        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+        self.canvas.get_tk_widget().pack(**pack_kwargs)
+        self.draw_idle()
+        return self.canvas
+
+    def draw_idle(self):
+        if self.canvas is not None:
+            self.canvas.draw_idle()
+
+    def set_data(self, *datos):
+        """
+        Cambia los datos del gráfico.
+
+        Returns:
+            False si los datos eran los mismos que ya estaban dibujados.
+        """
+        if datos == self.datos:
+            return False
+        if self.datos is None or not self._cambiar(*datos):
+            self.ax.clear()
+            self._construir(*datos)
+        self.datos = datos
+        self.fig.tight_layout()
+        self.draw_idle()
+        return True
+
+    def actualizar(self, version, calcular_datos):
+        """
+        Llama a set_data(*calcular_datos()) si la figura no está dibujada ya con
+        esa versión de las estadísticas.
+
+        Returns:
+            True si se ha vuelto a dibujar algo.
+        """
+        if version is not None and version == self.version:
+            return False
+        cambiado = self.set_data(*calcular_datos())
+        self.version = version
+        return cambiado
+
+    def _construir(self, *datos):
+        raise NotImplementedError
+
+    def _cambiar(self, *datos):
+        return False
+
+class InfoGeneral:
+    """Recuadro con los totales de la pestaña de resumen."""
+
+    def __init__(self, tab):
+        frame_info = LabelFrame(tab, text="Información general")
+        frame_info.pack(fill="x", padx=10, pady=10)
+        self.etiquetas = []
+        for fila in range(4):
+            etiqueta = Label(frame_info, font=("Helvetica", 12))
+            etiqueta.grid(row=fila, column=0, padx=10, pady=5, sticky="w")
+            self.etiquetas.append(etiqueta)
+
+    def set_data(self, total_preg, total_int, total_fal, tasa_global):
+        textos = (
+            f"Preguntas únicas: {total_preg}",
+            f"Total de intentos: {total_int}",
+            f"Total fallos: {total_fal}",
+            f"Tasa de fallos: {tasa_global:.1f}%",
+        )
+        for etiqueta, texto in zip(self.etiquetas, textos):
+            etiqueta.config(text=texto)
+
+class GraficoPastel(Grafico):
+    """Aciertos frente a fallos; set_data(aciertos, fallos)."""
+
+    def __init__(self):
+        super().__init__(figsize=(5, 4))
+
+    def _construir(self, aciertos, fallos):
+        # Con dos sectores es más sencillo volver a dibujarlos que recolocar
+        # cada porción y sus etiquetas
+        self.ax.pie([aciertos, fallos], labels=['Aciertos', 'Fallos'], colors=['#4CAF50', '#f44336'],
+                    autopct='%1.1f%%', startangle=90)
+        self.ax.axis('equal')  # Para que sea un círculo
+
+class GraficoBarras(Grafico):
+    """
+    Barras con su valor encima; set_data(nombres, valores).
+
+    Args:
+        color: Color de las barras
+        xlabel, ylabel, title: Textos de los ejes y título
+        ylim: Límites fijos del eje Y (si no, se ajustan a los datos)
+        value_fmt: Función que da el texto de cada valor (por defecto, un decimal)
+    """
+
+    def __init__(self, color, xlabel, ylabel, title, ylim=None, value_fmt=None):
+        super().__init__()
+        self.color = color
+        self.textos = (xlabel, ylabel, title)
+        self.ylim = ylim
+        self.value_fmt = value_fmt or (lambda val: f'{val:.1f}')
+
+    def _construir(self, nombres, valores):
+        xlabel, ylabel, title = self.textos
+        self.barras = self.ax.bar(nombres, valores, color=self.color)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.set_title(title)
+        if self.ylim:
+            self.ax.set_ylim(*self.ylim)
+        self.etiquetas = [
+            self.ax.text(bar.get_x() + bar.get_width()/2., val + 1, self.value_fmt(val), ha='center', va='bottom')
+            for bar, val in zip(self.barras, valores)
+        ]
+        for etiqueta in self.ax.get_xticklabels():
+            etiqueta.set_rotation(45)
+            etiqueta.set_horizontalalignment("right")
+
+    def _cambiar(self, nombres, valores):
+        if nombres != self.datos[0]:
+            return False
+        for bar, etiqueta, val in zip(self.barras, self.etiquetas, valores):
+            bar.set_height(val)
+            etiqueta.set_y(val + 1)
+            etiqueta.set_text(self.value_fmt(val))
+        if not self.ylim:
+            self.ax.relim()
+            self.ax.autoscale_view()
+        return True
+
+class GraficoLineas(Grafico):
+    """
+    Evolución de una tasa (0-100 %) con su recta de tendencia;
+    set_data(etiquetas, tasas), con una etiqueta del eje X por punto.
+    """
+
+    def __init__(self, title):
+        super().__init__()
+        self.title = title
+
+    def _construir(self, etiquetas, tasas):
+        self.linea, = self.ax.plot([], [], marker='o', linestyle='-', color='#4CAF50')
+        self.tendencia, = self.ax.plot([], [], "r--", alpha=0.7)
+        self.ax.set_xlabel('Fecha y Hora')
+        self.ax.set_ylabel('Tasa de Éxito (%)')
+        self.ax.set_title(self.title)
+        self.ax.set_ylim(0, 100)
+        self._cambiar(etiquetas, tasas)
+
+    def _cambiar(self, etiquetas, tasas):
+        # El eje X es la posición de cada punto, con las fechas como etiquetas,
+        # para poder mover las líneas aunque cambien las fechas
+        x = np.arange(len(tasas))
+        self.linea.set_data(x, tasas)
+        if len(tasas) > 1:
+            self.tendencia.set_data(x, np.poly1d(np.polyfit(x, tasas, 1))(x))
+        else:
+            self.tendencia.set_data([], [])
+        self.ax.set_xticks(x, etiquetas, rotation=45, ha="right")
+        self.ax.set_xlim(-0.5, max(len(tasas) - 0.5, 0.5))
+        return True
+
+class GraficoPercentiles(Grafico):
+    """
+    Barras agrupadas de p50/p90/p99 con la media marcada encima;
+    set_data(categorias, percentiles, medias), donde percentiles es
+    ((p50 de cada categoría), (p90...), (p99...)).
+    """
+
+    SERIES = (("p50", "#FFC107"), ("p90", "#FF9800"), ("p99", "#F44336"))
+    ANCHO = 0.27
+
+    def __init__(self, title):
+        super().__init__()
+        self.title = title
+
+    def _construir(self, categorias, percentiles, medias):
+        x = np.arange(len(categorias))
+        self.barras = [
+            self.ax.bar(x + (k - 1) * self.ANCHO, valores, self.ANCHO, color=color, label=p)
+            for k, ((p, color), valores) in enumerate(zip(self.SERIES, percentiles))
+        ]
+        self.medias, = self.ax.plot(x, medias, 'k_', markersize=18, markeredgewidth=2, label='media')
+        self.etiquetas = [self.ax.text(xi, val, f'{val:.1f}s', ha='center', va='bottom', fontsize=8)
+                          for xi, val in zip(x, medias)]
+        self.ax.set_xticks(x, categorias, rotation=45, ha="right")
+        self.ax.set_xlabel('Categoría')
+        self.ax.set_ylabel('Tiempo (seg)')
+        self.ax.set_title(self.title)
+        self.ax.legend()
+
+    def _cambiar(self, categorias, percentiles, medias):
+        if categorias != self.datos[0]:
+            return False
+        for barras, valores in zip(self.barras, percentiles):
+            for bar, val in zip(barras, valores):
+                bar.set_height(val)
+        self.medias.set_ydata(medias)
+        for etiqueta, val in zip(self.etiquetas, medias):
+            etiqueta.set_y(val)
+            etiqueta.set_text(f'{val:.1f}s')
+        self.ax.relim()
+        self.ax.autoscale_view()
+        return True
 
 def treeview(tab, cols, vsb):
     tree = ttk.Treeview(tab, columns=cols, show="headings", yscrollcommand=vsb.set)
@@ -36,39 +268,3 @@ def treeview(tab, cols, vsb):
             tree.column(col, anchor="center", width=110)
     tree.pack(fill="both", expand=True, padx=10, pady=10)
     return tree
-
-def grafico_barras(tab, names, values, color, xlabel, ylabel, title, ylim=None, value_fmt=None):
-    fig, ax = plt.subplots(figsize=(8, 6))
-    bars = ax.bar(names, values, color=color)
-    ax.set_xlabel(xlabel)
-    ax.set_ylabel(ylabel)
-    ax.set_title(title)
-    if ylim:
-        ax.set_ylim(*ylim)
-    for bar, val in zip(bars, values):
-        height = bar.get_height()
-        label = value_fmt(val) if value_fmt else f'{val:.1f}'
-        ax.text(bar.get_x() + bar.get_width()/2., height + 1, label, ha='center', va='bottom', rotation=0)
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout()
-    canvas = FigureCanvasTkAgg(fig, master=tab)
-    canvas.draw()
-    canvas.get_tk_widget().pack(fill="both", expand=True, pady=10)
-
-def grafico_lineas(tab, dates, rates, title):
-    fig, ax = plt.subplots(figsize=(8, 6))
-    ax.plot(dates, rates, marker='o', linestyle='-', color='#4CAF50')
-    ax.set_xlabel('Fecha y Hora')
-    ax.set_ylabel('Tasa de Éxito (%)')
-    ax.set_title(title)
-    ax.set_ylim(0, 100)
-    fig.autofmt_xdate()
-    plt.xticks(rotation=45)
-    if len(rates) > 1:
-        z = np.polyfit(range(len(dates)), rates, 1)
-        p = np.poly1d(z)
-        ax.plot(dates, p(range(len(dates))), "r--", alpha=0.7)
-    plt.tight_layout()
-    canvas = FigureCanvasTkAgg(fig, master=tab)
-    canvas.draw()
-    canvas.get_tk_widget().pack(fill="both", expand=True, pady=10)
@@ -6,7 +6,36 @@ import os
 import estadisticas
 from examen import calcular_nota
 
-def iniciar_examen(preguntas, root_menu=None, root=None):
+def guardar_respuestas():
+    """
+    Espera a que las respuestas estén en disco; si falla la escritura, pregunta
+    si reintentar.
+
+    Returns:
+        False si el usuario decide seguir sin que se hayan guardado.
+    """
+    while True:
+        try:
+            estadisticas.flush_stats()
+            return True
+        except estadisticas.ErrorEscritura as e:
+            if not messagebox.askretrycancel("Error guardando estadísticas", f"{e}.\n\n¿Reintentar?"):
+                return False
+            estadisticas.reintentar_escritura()
+
+def iniciar_examen(preguntas, root_menu=None, root=None, planificador=None):
+    """
+    Abre la ventana del examen.
+
+    Args:
+        preguntas: Preguntas del examen, en orden. Con planificador, lista
+            (normalmente vacía) a la que se van añadiendo las que él sortea
+        root_menu: Ventana del menú, que se vuelve a mostrar al terminar
+        root: Ventana padre (None = crear una ventana Tk nueva)
+        planificador: planificador.Planificador opcional; elige cada pregunta
+            en el momento de mostrarla, teniendo en cuenta las respuestas
+            anteriores
+    """
     resultados = {"totales": 0, "correctas": 0, "falladas": 0, "saltadas": 0}
     sesion_id = datetime.now().strftime("%Y%m%d%H%M%S")
     tiempos_respuesta = {}
@@ -69,6 +98,7 @@ def iniciar_examen(preguntas, root_menu=None, root=None):
                 root_menu.destroy()
             except Exception:
                 pass
+        guardar_respuestas()  # Que no se pierda ninguna respuesta en cola
         os._exit(0)  
 
     btn_exit = tk.Button(root, text="Salir", width=20, height=2, bg="#f44336", fg="white", font=font_option, command=cerrar_todo)
@@ -77,6 +107,10 @@ def iniciar_examen(preguntas, root_menu=None, root=None):
     root.protocol("WM_DELETE_WINDOW", cerrar_todo)
 
     def mostrar_pregunta(index):
+        if planificador is not None and index == len(preguntas):
+            siguiente = planificador.siguiente()
+            if siguiente is not None:
+                preguntas.append(siguiente)
         if index >= len(preguntas):
             root.after(100, mostrar_estadisticas)
             return
@@ -96,6 +130,8 @@ def iniciar_examen(preguntas, root_menu=None, root=None):
 
     def responder(respuesta, index):
         tiempo_respuesta = time.time() - tiempos_respuesta.get(index, time.time())
+        if planificador is not None and respuesta != "S":
+            planificador.registrar(preguntas[index], respuesta == preguntas[index]["respuesta_correcta"], tiempo_respuesta)
         resultados["totales"] += 1
         if respuesta == preguntas[index]["respuesta_correcta"]:
             resultados["correctas"] += 1
@@ -130,6 +166,7 @@ def iniciar_examen(preguntas, root_menu=None, root=None):
     def mostrar_estadisticas():
         if not root.winfo_exists():
             return
+        guardar_respuestas()
         nota = calcular_nota(resultados["totales"], resultados["correctas"], resultados["falladas"])
         resumen = (
             f"Correctas: {resultados['correctas']}\n"
@@ -0,0 +1,342 @@
+import io
+import math
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+
+# Historial de intentos de cada pregunta guardado por columnas (arrays de
+# enteros) en lugar de una lista de diccionarios. Las sesiones y los archivos se
+# guardan una sola vez en tablas internadas y cada intento sólo lleva su índice.
+# Historial y Tiempos se comportan como las listas de antes, así que
+# data["historial"][-5:], sum(data["tiempos"]), len(...) etc. siguen funcionando.
+
+_EPOCA = datetime(1970, 1, 1)
+_FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+MAGIC = b"GPDSHIST"
+# La 1 guardaba las fechas en 32 bits sin signo y la 2 no llevaba ni el texto
+# ni el estimador de tiempos de cada pregunta, ni iba comprimida
+VERSION = 3
+
+# Tipos de las columnas con tamaño fijo en todas las plataformas (el de 'I' o
+# 'L' depende del compilador): enteros sin signo de 32 bits y con signo de 64
+U32 = next(t for t in "ILH" if array(t).itemsize == 4)
+I64 = 'q'
+assert array(I64).itemsize == 8
+MAX_U32 = 2**32 - 1
+# Tipo de cada columna numérica de Historial
+COLUMNAS = {"segundos": I64, "centesimas": U32, "sesiones": U32, "archivos": U32}
+
+class Internador:
+    """Tabla de cadenas internadas; el índice 0 representa None."""
+
+    def __init__(self):
+        self.valores = [None]
+        self.indices = {None: 0}
+        # Pueden añadir a la vez la interfaz (al responder) y el hilo escritor
+        # (al leer un historial de disco)
+        self._lock = threading.Lock()
+
+    def indice(self, valor):
+        i = self.indices.get(valor)
+        if i is None:
+            with self._lock:
+                i = self.indices.get(valor)
+                if i is None:
+                    self.valores.append(valor)
+                    i = self.indices[valor] = len(self.valores) - 1
+        return i
+
+SESIONES = Internador()
+ARCHIVOS = Internador()
+
+def a_segundos(fecha):
+    """Segundos desde 1970 (negativos antes); 0 si no hay fecha o no es válida."""
+    if not fecha:
+        return 0
+    try:
+        return int((datetime.fromisoformat(fecha) - _EPOCA).total_seconds())
+    except (TypeError, ValueError):
+        return 0
+
+def a_fecha(segundos):
+    if not segundos:
+        return ""
+    return (_EPOCA + timedelta(seconds=segundos)).strftime(_FORMATO_FECHA)
+
+class Tiempos(Sequence):
+    """Vista de sólo lectura de los tiempos de respuesta (en segundos) de un Historial."""
+
+    def __init__(self, historial):
+        self._historial = historial
+
+    def __len__(self):
+        return len(self._historial.centesimas)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [c / 100 for c in self._historial.centesimas[i]]
+        return self._historial.centesimas[i] / 100
+
+    def __iter__(self):
+        return (c / 100 for c in self._historial.centesimas)
+
+    def __repr__(self):
+        return repr(list(self))
+
+class Historial(Sequence):
+    """Intentos de una pregunta: fecha, acierto, tiempo, sesión y archivo por columnas."""
+
+    __slots__ = ("segundos", "correctas", "centesimas", "sesiones", "archivos", "tiempos")
+
+    def __init__(self):
+        self.segundos = array(I64)    # Fecha como segundos desde 1970 (0 = sin fecha)
+        self.correctas = bytearray()  # 1 acierto, 0 fallo
+        self.centesimas = array(U32)  # Tiempo de respuesta en centésimas de segundo
+        self.sesiones = array(U32)    # Índice en SESIONES
+        self.archivos = array(U32)    # Índice en ARCHIVOS
+        self.tiempos = Tiempos(self)
+
+    @classmethod
+    def desde_lista(cls, historial):
+        nuevo = cls()
+        for h in historial:
+            nuevo.append(h.get("fecha", ""), h.get("correcta"), h.get("tiempo", 0), h.get("sesion_id"), h.get("archivo"))
+        return nuevo
+
+    def append(self, fecha, correcta, tiempo, sesion_id, archivo):
+        self.segundos.append(a_segundos(fecha))
+        self.correctas.append(1 if correcta else 0)
+        self.centesimas.append(min(max(int(round((tiempo or 0) * 100)), 0), MAX_U32))
+        self.sesiones.append(SESIONES.indice(sesion_id))
+        self.archivos.append(ARCHIVOS.indice(archivo))
+
+    def seleccionar(self, filas):
+        """Devuelve un Historial nuevo sólo con los intentos de las posiciones filas."""
+        nuevo = Historial()
+        for nombre in ("segundos", "centesimas", "sesiones", "archivos"):
+            columna = getattr(self, nombre)
+            setattr(nuevo, nombre, array(columna.typecode, (columna[i] for i in filas)))
+        nuevo.correctas = bytearray(self.correctas[i] for i in filas)
+        return nuevo
+
+    def extender(self, otro, desde=0):
+        """Añade al final los intentos de otro a partir de la posición desde."""
+        for nombre in ("segundos", "centesimas", "sesiones", "archivos", "correctas"):
+            getattr(self, nombre).extend(getattr(otro, nombre)[desde:])
+
+    def copiar(self):
+        nuevo = Historial()
+        nuevo.extender(self)
+        return nuevo
+
+    def _intento(self, i):
+        return {
+            "fecha": a_fecha(self.segundos[i]),
+            "correcta": bool(self.correctas[i]),
+            "tiempo": self.centesimas[i] / 100,
+            "sesion_id": SESIONES.valores[self.sesiones[i]],
+            "archivo": ARCHIVOS.valores[self.archivos[i]]
+        }
+
+    def __len__(self):
+        return len(self.segundos)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._intento(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("índice de historial fuera de rango")
+        return self._intento(i)
+
+    def __repr__(self):
+        return repr(list(self))
+
+def compactar_entrada(entry):
+    """Sustituye las listas "historial" y "tiempos" de una entrada por su versión columnar."""
+    historial = entry.get("historial")
+    if not isinstance(historial, Historial):
+        historial = Historial.desde_lista(historial or [])
+    entry["historial"] = historial
+    entry["tiempos"] = historial.tiempos
+    return entry
+
+# ---- Archivo binario ----
+# MAGIC y VERSION y, comprimido con zlib, la tabla de sesiones, la de archivos
+# y, para cada pregunta, su clave (el id de la pregunta), su texto, el número de
+# intentos, las cinco columnas (fechas en 64 bits con signo, tiempos e índices
+# en 32 sin signo y aciertos en un byte) y su estimador de tiempos (ver
+# _escribir_estimador). Todo en little-endian.
+
+def _bytes(columna):
+    if sys.byteorder == "big" and isinstance(columna, array):
+        columna = array(columna.typecode, columna)
+        columna.byteswap()
+    return bytes(columna)
+
+def _escribir_cadena(f, texto):
+    datos = ("" if texto is None else texto).encode("utf-8")
+    f.write(struct.pack("<I", len(datos)))
+    f.write(datos)
+
+def _escribir_estimador(f, est):
+    # Un byte que indica si hay estimador; n, media, m2, mínimo y máximo (NaN si
+    # no hay) y las cubetas no vacías como pares (índice, cuenta)
+    if est is None:
+        f.write(b"\0")
+        return
+    f.write(b"\1")
+    f.write(struct.pack("<Qdddd", est["n"], est["media"], est["m2"],
+                        math.nan if est["min"] is None else est["min"],
+                        math.nan if est["max"] is None else est["max"]))
+    f.write(struct.pack("<I", len(est["cubetas"])))
+    for clave, cuenta in est["cubetas"].items():
+        f.write(struct.pack("<II", int(clave), cuenta))
+
+def guardar(ruta, stats, textos=None):
+    """
+    Escribe en ruta (de forma atómica) el historial y el estimador de tiempos de
+    todas las preguntas de stats.
+
+    Args:
+        ruta: Archivo de destino.
+        stats: Dict {id_pregunta: entrada}; de cada entrada se usan "historial"
+            y, si lo tiene, "estimador_tiempo".
+        textos: Dict {id_pregunta: texto} opcional con el texto de cada pregunta.
+    """
+    textos = textos or {}
+    cuerpo = io.BytesIO()
+    for tabla in (SESIONES, ARCHIVOS):
+        # La tabla puede crecer mientras se escribe (al responder): se
+        # escriben los valores que tenía al empezar
+        valores = tabla.valores[1:]
+        cuerpo.write(struct.pack("<I", len(valores)))
+        for valor in valores:
+            _escribir_cadena(cuerpo, valor)
+    cuerpo.write(struct.pack("<I", len(stats)))
+    for q, data in stats.items():
+        h = data["historial"]
+        _escribir_cadena(cuerpo, q)
+        _escribir_cadena(cuerpo, textos.get(q))
+        cuerpo.write(struct.pack("<I", len(h)))
+        for columna in (h.segundos, h.centesimas, h.sesiones, h.archivos, h.correctas):
+            cuerpo.write(_bytes(columna))
+        _escribir_estimador(cuerpo, data.get("estimador_tiempo"))
+
+    tmp = ruta + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", VERSION))
+        f.write(zlib.compress(cuerpo.getbuffer()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+def cargar(ruta):
+    """
+    Lee un archivo escrito con guardar.
+
+    Returns:
+        Dict {id_pregunta: datos}, donde datos tiene "historial" (Historial, con
+        los índices ya traducidos a las tablas SESIONES y ARCHIVOS de este
+        proceso) y, si el archivo los trae (desde la versión 3), "texto" y
+        "estimador_tiempo".
+
+    Raises:
+        ValueError: Si no es un historial, es de una versión no soportada o no
+            se puede descomprimir.
+    """
+    with open(ruta, "rb") as f:
+        datos = memoryview(f.read())
+    if bytes(datos[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{ruta} no es un historial válido")
+    pos = len(MAGIC)
+
+    def leer_u32():
+        nonlocal pos
+        valor = struct.unpack_from("<I", datos, pos)[0]
+        pos += 4
+        return valor
+
+    def leer_cadena():
+        nonlocal pos
+        n = leer_u32()
+        texto = bytes(datos[pos:pos + n]).decode("utf-8")
+        pos += n
+        return texto
+
+    def leer_columna(typecode, n):
+        nonlocal pos
+        columna = array(typecode)
+        fin = pos + n * columna.itemsize
+        columna.frombytes(datos[pos:fin])
+        if sys.byteorder == "big":
+            columna.byteswap()
+        pos = fin
+        return columna
+
+    def leer_estimador():
+        nonlocal pos
+        hay = struct.unpack_from("<B", datos, pos)[0]
+        pos += 1
+        if not hay:
+            return None
+        n, media, m2, minimo, maximo = struct.unpack_from("<Qdddd", datos, pos)
+        pos += struct.calcsize("<Qdddd")
+        cubetas = {}
+        for _ in range(leer_u32()):
+            clave, cuenta = struct.unpack_from("<II", datos, pos)
+            pos += 8
+            cubetas[str(clave)] = cuenta
+        return {"n": n, "media": media, "m2": m2,
+                "min": None if math.isnan(minimo) else minimo,
+                "max": None if math.isnan(maximo) else maximo, "cubetas": cubetas}
+
+    version = leer_u32()
+    if version not in (1, 2, VERSION):
+        raise ValueError(f"Versión de historial no soportada: {version}")
+    if version >= 3:
+        try:
+            datos = memoryview(zlib.decompress(datos[pos:]))
+        except zlib.error as e:
+            raise ValueError(f"{ruta} está dañado: {e}") from e
+        pos = 0
+
+    # Traducción de los índices del archivo a los de las tablas en memoria
+    traducciones = []
+    for tabla in (SESIONES, ARCHIVOS):
+        traduccion = [0] + [tabla.indice(leer_cadena()) for _ in range(leer_u32())]
+        identidad = traduccion == list(range(len(traduccion)))
+        traducciones.append(None if identidad else traduccion)
+
+    historiales = {}
+    for _ in range(leer_u32()):
+        q = leer_cadena()
+        leido = historiales[q] = {}
+        if version >= 3:
+            texto = leer_cadena()
+            if texto:
+                leido["texto"] = texto
+        n = leer_u32()
+        h = Historial()
+        h.segundos = leer_columna(I64, n) if version >= 2 else array(I64, leer_columna(U32, n))
+        h.centesimas = leer_columna(U32, n)
+        h.sesiones = leer_columna(U32, n)
+        h.archivos = leer_columna(U32, n)
+        h.correctas = bytearray(datos[pos:pos + n])
+        pos += n
+        for nombre, traduccion in zip(("sesiones", "archivos"), traducciones):
+            if traduccion:
+                setattr(h, nombre, array(U32, (traduccion[i] for i in getattr(h, nombre))))
+        leido["historial"] = h
+        if version >= 3:
+            est = leer_estimador()
+            if est is not None:
+                leido["estimador_tiempo"] = est
+    return historiales
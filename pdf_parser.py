@@ -1,43 +1,202 @@
 import re
 import random
 import os
-from PyPDF2 import PdfReader
+import json
+import hashlib
+import threading
 
-def leer_pdf(filename):
+# Caché en disco de las preguntas ya extraídas de cada PDF
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '.cache_preguntas')
+CACHE_VERSION = 1
+# PDF abiertos últimamente (para precargarlos al arrancar), el más reciente primero
+RECIENTES_MAX = 5
+
+PATRON_PREGUNTA = r"Pregunta número:\s*(\d+)\s*(.*)\s*A:\s*(.*?)\s*B:\s*(.*?)\s*C:\s*(.*?)\s*D:\s*(.*?)\s*Respuesta correcta:\s*([A-D])"
+
+def _escribir_json_atomico(ruta, datos):
+    # Escribimos en un temporal y lo renombramos para no dejar nunca un JSON a medias
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+    os.replace(tmp, ruta)
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _hash_contenido(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 16), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+def _ruta_huella(filename):
+    clave = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, "rutas", f"{clave}.json")
+
+def _ruta_cache(hash_pdf):
+    return os.path.join(CACHE_DIR, f"{hash_pdf}.json")
+
+def _hash_pdf(filename):
+    """
+    Devuelve el hash del contenido del PDF.
+
+    Si el tamaño y la fecha de modificación coinciden con los guardados para
+    esa ruta se reutiliza el hash anterior sin volver a leer el archivo.
+    """
+    st = os.stat(filename)
+    ruta_huella = _ruta_huella(filename)
+    huella = _leer_json(ruta_huella)
+    if huella and huella.get("size") == st.st_size and huella.get("mtime_ns") == st.st_mtime_ns:
+        return huella["sha256"]
+    hash_pdf = _hash_contenido(filename)
+    try:
+        _escribir_json_atomico(ruta_huella, {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": hash_pdf})
+    except OSError:
+        pass
+    return hash_pdf
+
+def _cargar_cache(hash_pdf):
+    datos = _leer_json(_ruta_cache(hash_pdf))
+    if not datos or datos.get("version") != CACHE_VERSION:
+        return None
+    return datos.get("preguntas")
+
+def _guardar_cache(hash_pdf, preguntas):
+    try:
+        _escribir_json_atomico(_ruta_cache(hash_pdf), {"version": CACHE_VERSION, "preguntas": preguntas})
+    except OSError:
+        pass  # Sin caché seguimos funcionando, sólo perdemos velocidad
+
+def _parsear_pagina(texto):
+    match = re.search(PATRON_PREGUNTA, texto, re.DOTALL)
+    if not match:
+        return None
+    return {
+        "pregunta": match.group(2).replace("\n", " "),
+        "A": match.group(3).replace("\n", " "),
+        "B": match.group(4).replace("\n", " "),
+        "C": match.group(5).replace("\n", " "),
+        "D": match.group(6).replace("\n", " "),
+        "respuesta_correcta": match.group(7).replace("\n", " "),
+    }
+
+def _categoria(filename):
+    nombre_archivo = os.path.basename(filename)
+    return os.path.splitext(nombre_archivo)[0]
+
+def _con_origen(pregunta, categoria, filename):
+    pregunta = dict(pregunta)
+    pregunta["categoria"] = categoria
+    pregunta["origen_archivo"] = filename
+    return pregunta
+
+# Bancos completos ya cargados en este proceso, indexados por hash del PDF
+_bancos = {}
+
+class CargaCancelada(Exception):
+    """Se pidió cancelar la lectura de un PDF antes de que terminara."""
+
+def en_memoria(filename):
+    """Indica si el banco del PDF ya está cargado en este proceso (leer_pdf será inmediato)."""
+    try:
+        return _hash_pdf(filename) in _bancos
+    except OSError:
+        return False
+
+def iter_preguntas(filename, progreso=None, cancelar=None):
+    """
+    Genera las preguntas del PDF a medida que se extraen.
+
+    Si el PDF ya está en caché las preguntas salen directamente de ella. Si no,
+    se parsea página a página (la primera pregunta está disponible en cuanto se
+    lee su página) y, cuando se termina de recorrer el archivo, se guarda el
+    banco completo en caché.
+
+    Args:
+        filename: Ruta del PDF
+        progreso: Función opcional progreso(paginas_leidas, paginas_totales),
+            llamada tras cada página cuando hay que parsear el PDF
+        cancelar: threading.Event opcional; si se activa se lanza CargaCancelada
+            antes de la siguiente página y no se guarda nada en caché
+    """
+    hash_pdf = _hash_pdf(filename)
+    categoria = _categoria(filename)
+    banco = _banco_guardado(hash_pdf)
+    preguntas = banco if banco is not None else _parsear_pdf(filename, hash_pdf, progreso, cancelar)
+    for pregunta in preguntas:
+        yield _con_origen(pregunta, categoria, filename)
+
+def _banco_guardado(hash_pdf):
+    # Banco ya extraído, de memoria o de la caché en disco (None si no está en ninguna)
+    banco = _bancos.get(hash_pdf)
+    if banco is None:
+        banco = _cargar_cache(hash_pdf)
+        if banco is not None:
+            _bancos[hash_pdf] = banco
+    return banco
+
+def _parsear_pdf(filename, hash_pdf, progreso=None, cancelar=None):
+    # Genera las preguntas (sin origen) según se parsea cada página y, al
+    # terminar, guarda el banco en memoria y en caché
+    from PyPDF2 import PdfReader  # Sólo hace falta si el PDF no está en caché
+
+    banco = []
+    with open(filename, 'rb') as archivo_pdf:
+        lector_pdf = PdfReader(archivo_pdf)
+        paginas = lector_pdf.pages[1:]  # Nos saltamos la primera página
+        for leidas, pagina in enumerate(paginas, 1):
+            if cancelar is not None and cancelar.is_set():
+                raise CargaCancelada(filename)
+            pregunta = _parsear_pagina(pagina.extract_text())
+            if pregunta:
+                banco.append(pregunta)
+                yield pregunta
+            if progreso:
+                progreso(leidas, len(paginas))
+    _bancos[hash_pdf] = banco
+    _guardar_cache(hash_pdf, banco)
+
+def cargar_banco(filename, progreso=None, cancelar=None):
+    """
+    Devuelve el banco completo de preguntas del PDF.
+
+    El PDF sólo se parsea la primera vez; después se sirve desde la caché en
+    disco o desde memoria. A diferencia de leer_pdf, los errores se propagan.
+    progreso y cancelar son los de iter_preguntas.
+    """
+    return list(iter_preguntas(filename, progreso, cancelar))
+
+def pdfs_recientes():
+    """Devuelve las rutas de los últimos PDF abiertos que siguen existiendo, el más reciente primero."""
+    recientes = _leer_json(os.path.join(CACHE_DIR, "recientes.json")) or []
+    return [ruta for ruta in recientes if os.path.exists(ruta)]
+
+def anadir_reciente(filename):
+    ruta = os.path.abspath(filename)
+    recientes = [ruta] + [r for r in pdfs_recientes() if r != ruta]
+    try:
+        _escribir_json_atomico(os.path.join(CACHE_DIR, "recientes.json"), recientes[:RECIENTES_MAX])
+    except OSError:
+        pass
+
+def leer_pdf(filename, n=10):
     preguntas = []
     try:
-        with open(filename, 'rb') as archivo_pdf:
-            lector_pdf = PdfReader(archivo_pdf)
-            num_paginas = len(lector_pdf.pages)
-
-            patron = r"Pregunta número:\s*(\d+)\s*(.*)\s*A:\s*(.*?)\s*B:\s*(.*?)\s*C:\s*(.*?)\s*D:\s*(.*?)\s*Respuesta correcta:\s*([A-D])"
-
-            paginas = list(range(1, num_paginas))  # Nos saltamos la primera página
-            random.shuffle(paginas) # Mezclamos las páginas para obtener preguntas aleatorias
-            
-            nombre_archivo = os.path.basename(filename)
-            categoria = os.path.splitext(nombre_archivo)[0]  
-
-            for pagina_num in paginas:
-                pagina = lector_pdf.pages[pagina_num]
-                texto = pagina.extract_text()
-
-                match = re.search(patron, texto, re.DOTALL)
-                if match:
-                    texto_pregunta = match.group(2).replace("\n", " ")
-                    pregunta = {
-                        "pregunta": texto_pregunta,
-                        "A": match.group(3).replace("\n", " "),
-                        "B": match.group(4).replace("\n", " "),
-                        "C": match.group(5).replace("\n", " "),
-                        "D": match.group(6).replace("\n", " "),
-                        "respuesta_correcta": match.group(7).replace("\n", " "),
-                        "categoria": categoria,
-                        "origen_archivo": filename
-                    }
-                    preguntas.append(pregunta)
-                    if len(preguntas) == 10:  
-                        break
+        hash_pdf = _hash_pdf(filename)
+        banco = _banco_guardado(hash_pdf)
+        if banco is None:
+            banco = list(_parsear_pdf(filename, hash_pdf))
+
+        # Muestra aleatoria de n preguntas, sin recorrer el banco entero
+        categoria = _categoria(filename)
+        for pregunta in random.sample(banco, min(n, len(banco))):
+            preguntas.append(_con_origen(pregunta, categoria, filename))
     except FileNotFoundError:
         print("El archivo no existe.")
     except Exception as e:
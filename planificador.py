@@ -0,0 +1,185 @@
+import math
+import random
+from datetime import datetime
+
+import estadisticas
+import historial_columnar
+import textos_preguntas
+
+# Elección adaptativa de preguntas: cada pregunta tiene un peso según su tasa
+# de fallos, el tiempo que hace que no se contesta y lo que se tarda en
+# responderla, y se sortea con probabilidad proporcional a su peso. Los pesos
+# viven en un árbol de Fenwick, así que sortear una pregunta o cambiar el peso
+# de una tras responderla cuesta O(log n) sin reconstruir nada.
+
+# Vida media del "olvido": a los VIDA_MEDIA_DIAS sin contestar una pregunta,
+# su factor de olvido va por la mitad de camino entre 0,5 y 1,5
+VIDA_MEDIA_DIAS = 3
+# Tiempo medio de respuesta (segundos) a partir del cual una pregunta se
+# considera lenta del todo (duplica su peso)
+TIEMPO_LENTO = 30
+# Peso mínimo, para que ninguna pregunta deje de salir nunca
+PESO_MINIMO = 0.05
+
+class ArbolFenwick:
+    """Sumas prefijas de pesos con actualización y búsqueda en O(log n)."""
+
+    def __init__(self, pesos):
+        # Construcción en O(n): cada nodo pasa su suma a su padre
+        self.pesos = list(pesos)
+        self.arbol = [0.0] + self.pesos
+        n = len(self.pesos)
+        for i in range(1, n + 1):
+            padre = i + (i & -i)
+            if padre <= n:
+                self.arbol[padre] += self.arbol[i]
+        self._total = math.fsum(self.pesos)
+
+    def __len__(self):
+        return len(self.pesos)
+
+    def total(self):
+        return self._total
+
+    def actualizar(self, i, peso):
+        """Cambia el peso de la posición i (desde 0)."""
+        delta = peso - self.pesos[i]
+        self.pesos[i] = peso
+        self._total += delta
+        i += 1
+        while i < len(self.arbol):
+            self.arbol[i] += delta
+            i += i & -i
+
+    def buscar(self, u):
+        """Devuelve la posición i tal que suma(pesos[:i]) <= u < suma(pesos[:i + 1])."""
+        pos = 0
+        paso = 1 << (len(self.pesos).bit_length() - 1) if self.pesos else 0
+        while paso:
+            siguiente = pos + paso
+            if siguiente < len(self.arbol) and self.arbol[siguiente] <= u:
+                pos = siguiente
+                u -= self.arbol[siguiente]
+            paso >>= 1
+        # Por redondeo u puede caer justo en un borde o pasarse del total: se
+        # busca la posición con peso más cercana
+        pos = min(pos, len(self.pesos) - 1)
+        i = pos
+        while i < len(self.pesos) and self.pesos[i] <= 0:
+            i += 1
+        if i == len(self.pesos):
+            i = pos
+            while i > 0 and self.pesos[i] <= 0:
+                i -= 1
+        return i
+
+def _ahora():
+    return historial_columnar.a_segundos(datetime.now().isoformat(sep=" ", timespec="seconds"))
+
+def _ultimo_intento(data):
+    # Segundos desde la época del último intento guardado, o None
+    historial = data.get("historial") or []
+    if not len(historial):
+        return None
+    if isinstance(historial, historial_columnar.Historial):
+        segundos = historial.segundos[-1]
+    else:
+        segundos = historial_columnar.a_segundos(historial[-1].get("fecha"))
+    return segundos or None
+
+def _estado_de(data):
+    if not data:
+        return {"intentos": 0, "fallos": 0, "ultimo": None, "tiempo_medio": 0.0, "n_tiempos": 0}
+    return {
+        "intentos": data.get("intentos", 0),
+        "fallos": data.get("fallos", 0),
+        "ultimo": _ultimo_intento(data),
+        "tiempo_medio": estadisticas.tiempo_medio_pregunta(data),
+        "n_tiempos": estadisticas.n_tiempos_pregunta(data),
+    }
+
+def peso(estado, ahora):
+    """
+    Peso de una pregunta a partir de su estado (intentos, fallos, último intento
+    y tiempo medio).
+
+    peso = PESO_MINIMO + tasa * olvido * lentitud, donde
+      - tasa = (fallos + 1) / (intentos + 2): las nuevas parten de 0,5
+      - olvido va de 0,5 (recién contestada) a 1,5 (nunca o hace mucho)
+      - lentitud va de 1 (inmediata) a 2 (TIEMPO_LENTO o más)
+    """
+    tasa = (estado["fallos"] + 1) / (estado["intentos"] + 2)
+    if estado["ultimo"] is None:
+        olvido = 1.5
+    else:
+        dias = max(0, ahora - estado["ultimo"]) / 86400
+        olvido = 1.5 - 0.5 ** (dias / VIDA_MEDIA_DIAS)
+    lentitud = 1 + min(estado["tiempo_medio"] / TIEMPO_LENTO, 1)
+    return PESO_MINIMO + tasa * olvido * lentitud
+
+class Planificador:
+    """
+    Saca preguntas de un banco dando más probabilidad a las que más se fallan,
+    las que hace más que no salen y las más lentas.
+
+    Se construye una vez por examen en O(n) (una consulta a las estadísticas
+    por pregunta); después siguiente() y registrar() cuestan O(log n).
+
+    Args:
+        banco: Lista de preguntas (como las de leer_pdf o cargar_banco)
+        n: Número de preguntas del examen (None = todo el banco)
+        stats: Estadísticas de partida (por defecto, las guardadas)
+        repetir: Si es True, una pregunta ya contestada vuelve al sorteo con
+            su peso actualizado (las falladas pueden volver a salir); si no,
+            cada pregunta sale como mucho una vez
+        rng: Generador de números aleatorios (por defecto, el del módulo random)
+    """
+
+    def __init__(self, banco, n=None, stats=None, repetir=False, rng=random):
+        if stats is None:
+            stats = estadisticas.load_stats()
+        self.banco = banco
+        self.restantes = len(banco) if n is None else n
+        self.repetir = repetir
+        self.rng = rng
+        self.ahora = _ahora()
+        ids = [textos_preguntas.id_pregunta(p["pregunta"]) for p in banco]
+        self.estados = [_estado_de(stats.get(q)) for q in ids]
+        self.posiciones = {}
+        for i, q in enumerate(ids):
+            self.posiciones.setdefault(q, []).append(i)
+        self.arbol = ArbolFenwick(peso(e, self.ahora) for e in self.estados)
+
+    def siguiente(self):
+        """Sortea la siguiente pregunta, o devuelve None si el examen ya está completo."""
+        if self.restantes <= 0 or self.arbol.total() <= 0:
+            return None
+        self.restantes -= 1
+        i = self.arbol.buscar(self.rng.random() * self.arbol.total())
+        if self.arbol.pesos[i] <= 0:
+            return None  # Sólo quedaba error de redondeo en el total
+        self.arbol.actualizar(i, 0.0)  # Fuera del sorteo hasta que se conteste
+        return self.banco[i]
+
+    def registrar(self, pregunta, correcta, tiempo=0):
+        """Actualiza el peso de una pregunta contestada (O(log n) por copia en el banco)."""
+        self.ahora = _ahora()
+        for i in self.posiciones.get(textos_preguntas.id_pregunta(pregunta["pregunta"]), ()):
+            estado = self.estados[i]
+            estado["intentos"] += 1
+            estado["fallos"] += not correcta
+            estado["ultimo"] = self.ahora
+            estado["n_tiempos"] += 1
+            estado["tiempo_medio"] += (tiempo - estado["tiempo_medio"]) / estado["n_tiempos"]
+            if self.repetir:
+                self.arbol.actualizar(i, peso(estado, self.ahora))
+            elif self.arbol.pesos[i] > 0:
+                self.arbol.actualizar(i, 0.0)  # Copia de la misma pregunta en otro PDF
+
+    def probabilidad(self, pregunta):
+        """Probabilidad de que la pregunta salga en el próximo sorteo."""
+        total = self.arbol.total()
+        if total <= 0:
+            return 0.0
+        posiciones = self.posiciones.get(textos_preguntas.id_pregunta(pregunta["pregunta"]), ())
+        return sum(self.arbol.pesos[i] for i in posiciones) / total
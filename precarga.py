@@ -0,0 +1,181 @@
+import glob
+import itertools
+import os
+import queue
+import threading
+
+import pdf_parser
+
+# Lectura de PDF en un hilo aparte, para que el menú no se congele mientras se
+# parsea uno. Las peticiones del usuario van delante de las especulativas (los
+# PDF recientes y sus vecinos en cuestionarios/, que se precargan mientras el
+# menú está parado) y, si llega una mientras se precarga otro PDF, esa
+# precarga se interrumpe y se vuelve a encolar detrás.
+
+CUESTIONARIOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cuestionarios')
+
+URGENTE = 0
+ESPECULATIVA = 1
+
+_cola = queue.PriorityQueue()
+_orden = itertools.count()   # Desempate FIFO dentro de cada prioridad
+_hilo = None
+_lock = threading.Lock()
+_tareas = {}                 # Tareas pendientes o en curso, por ruta absoluta
+_en_curso = None
+
+def _nueva_tarea(ruta, prioridad):
+    return {
+        "ruta": ruta,
+        "prioridad": prioridad,
+        "estado": "pendiente",   # pendiente, cargando, lista, error o cancelada
+        "leidas": 0,
+        "total": 0,
+        "error": None,
+        "cancelar": threading.Event(),
+        "hecha": threading.Event(),
+    }
+
+def _trabajar():
+    global _en_curso
+    while True:
+        _, _, tarea = _cola.get()
+        with _lock:
+            if tarea["estado"] != "pendiente":
+                continue  # Entrada repetida de una tarea a la que se le subió la prioridad
+            if tarea["cancelar"].is_set():
+                _terminar(tarea, "cancelada")
+                continue
+            _en_curso = tarea
+            tarea["estado"] = "cargando"
+
+        def progreso(leidas, total):
+            tarea["leidas"], tarea["total"] = leidas, total
+
+        try:
+            pdf_parser.cargar_banco(tarea["ruta"], progreso, tarea["cancelar"])
+            estado = "lista"
+        except pdf_parser.CargaCancelada:
+            estado = "cancelada"
+        except Exception as e:
+            tarea["error"] = f"{type(e).__name__}: {e}"
+            estado = "error"
+        with _lock:
+            _en_curso = None
+            if estado == "cancelada" and tarea.get("reencolar"):
+                # Precarga interrumpida por una petición del usuario: vuelve a la cola
+                tarea["reencolar"] = False
+                tarea["cancelar"].clear()
+                tarea["estado"] = "pendiente"
+                _cola.put((tarea["prioridad"], next(_orden), tarea))
+                continue
+            _terminar(tarea, estado)
+
+def _terminar(tarea, estado):
+    tarea["estado"] = estado
+    if _tareas.get(tarea["ruta"]) is tarea:
+        del _tareas[tarea["ruta"]]
+    tarea["hecha"].set()
+
+def pedir(filename, prioridad=URGENTE):
+    """
+    Pide que se cargue un PDF en segundo plano.
+
+    Si ya hay una tarea para ese PDF se devuelve la misma (subiéndole la
+    prioridad si hace falta). Una petición URGENTE interrumpe la precarga
+    especulativa que esté en curso.
+
+    Returns:
+        Dict de la tarea: "estado" ("pendiente", "cargando", "lista", "error" o
+        "cancelada"), "leidas" y "total" (páginas), "error" y los eventos
+        "cancelar" y "hecha". Se actualiza desde el hilo de carga, así que desde
+        Tk hay que consultarlo periódicamente (root.after).
+    """
+    global _hilo
+    ruta = os.path.abspath(filename)
+    with _lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_trabajar, name="precarga-pdf", daemon=True)
+            _hilo.start()
+        tarea = _tareas.get(ruta)
+        if tarea is not None and tarea["cancelar"].is_set() and not tarea.get("reencolar"):
+            tarea = None  # Cancelada pero aún en la cola: se pide de nuevo
+        if tarea is None:
+            if pdf_parser.en_memoria(ruta):
+                tarea = _nueva_tarea(ruta, prioridad)
+                tarea["estado"] = "lista"
+                tarea["hecha"].set()
+                return tarea
+            tarea = _tareas[ruta] = _nueva_tarea(ruta, prioridad)
+            _cola.put((prioridad, next(_orden), tarea))
+        elif prioridad < tarea["prioridad"]:
+            tarea["prioridad"] = prioridad
+            if tarea["estado"] == "pendiente":
+                _cola.put((prioridad, next(_orden), tarea))  # La entrada antigua se descarta al salir
+        if prioridad == URGENTE and _en_curso is not None and _en_curso is not tarea \
+                and _en_curso["prioridad"] == ESPECULATIVA:
+            _en_curso["reencolar"] = True
+            _en_curso["cancelar"].set()
+        return tarea
+
+def ejecutar(funcion, nombre="tarea"):
+    """
+    Ejecuta funcion(progreso, cancelar) en un hilo aparte, con el mismo dict
+    de tarea que pedir() para poder seguirla y cancelarla desde Tk.
+
+    progreso(hechos, total) actualiza "leidas" y "total"; si la función lanza
+    pdf_parser.CargaCancelada la tarea queda "cancelada".
+
+    Returns:
+        Dict de la tarea (ver pedir), con el valor devuelto en "resultado" y,
+        si ha fallado, la excepción en "excepcion".
+    """
+    tarea = _nueva_tarea(None, URGENTE)
+    tarea["resultado"] = tarea["excepcion"] = None
+    tarea["estado"] = "cargando"
+
+    def progreso(hechos, total):
+        tarea["leidas"], tarea["total"] = hechos, total
+
+    def trabajar():
+        try:
+            tarea["resultado"] = funcion(progreso, tarea["cancelar"])
+            estado = "lista"
+        except pdf_parser.CargaCancelada:
+            estado = "cancelada"
+        except Exception as e:
+            tarea["error"] = f"{type(e).__name__}: {e}"
+            tarea["excepcion"] = e
+            estado = "error"
+        tarea["estado"] = estado
+        tarea["hecha"].set()
+
+    threading.Thread(target=trabajar, name=nombre, daemon=True).start()
+    return tarea
+
+def cancelar(tarea):
+    """Cancela una tarea de pedir(); si ya estaba cargando, se para antes de la siguiente página."""
+    with _lock:
+        tarea["reencolar"] = False
+        tarea["cancelar"].set()
+
+def candidatas(directorio=CUESTIONARIOS_DIR):
+    """
+    PDF que probablemente se abran pronto: los recientes y, para cada uno, el
+    anterior y el siguiente de su carpeta (B3-T1-1 -> B3-T1-2, B3-T2-1...).
+    """
+    rutas = []
+    for reciente in pdf_parser.pdfs_recientes():
+        vecinos = sorted(glob.glob(os.path.join(os.path.dirname(reciente), '*.pdf')))
+        rutas.append(reciente)
+        if reciente in vecinos:
+            i = vecinos.index(reciente)
+            rutas.extend(vecinos[max(0, i - 1):i] + vecinos[i + 1:i + 2])
+    if not rutas:
+        rutas = sorted(glob.glob(os.path.join(directorio, '*.pdf')))[:2]
+    return list(dict.fromkeys(rutas))
+
+def precargar(rutas=None):
+    """Encola como especulativas las rutas (por defecto, candidatas()) que no estén ya en memoria."""
+    for ruta in candidatas() if rutas is None else rutas:
+        pedir(ruta, ESPECULATIVA)
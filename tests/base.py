@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import estadisticas
+
+# Configuración de estadisticas que cambian las pruebas y se restaura al acabar
+_CONFIGURACION = ("STATS_FILE", "JOURNAL_FILE", "DB_FILE", "BACKEND", "RETENER_DIAS",
+                  "RETENER_SESIONES", "COMPACTAR_CADA")
+
+class EstadisticasTestCase(unittest.TestCase):
+    """
+    Pruebas sobre estadisticas con sus archivos en un directorio temporal
+    (nunca se toca el stats.json real) y el estado del módulo como recién
+    importado.
+    """
+
+    def setUp(self):
+        estadisticas.flush_stats()
+        self.configuracion = {nombre: getattr(estadisticas, nombre) for nombre in _CONFIGURACION}
+        self.temporal = tempfile.TemporaryDirectory()
+        self.directorio = self.temporal.name
+        estadisticas.STATS_FILE = self.ruta("stats.json")
+        estadisticas.JOURNAL_FILE = self.ruta("stats.journal")
+        estadisticas.DB_FILE = self.ruta("stats.db")
+        estadisticas.BACKEND = "json"
+        estadisticas.RETENER_DIAS = None
+        estadisticas.RETENER_SESIONES = None
+        self.reiniciar()
+
+    def tearDown(self):
+        self.reiniciar()
+        for nombre, valor in self.configuracion.items():
+            setattr(estadisticas, nombre, valor)
+        self.temporal.cleanup()
+
+    def ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def reiniciar(self):
+        """Deja estadisticas como en un proceso nuevo: la siguiente lectura va a disco."""
+        estadisticas.recargar_stats()
+        estadisticas._journal_id = None
+        estadisticas._journal_pendientes = 0
+        estadisticas._journal_offset = 0
+        estadisticas._version_snapshot = None
+        estadisticas._historiales_leidos.clear()
+        estadisticas._sesiones_archivadas.clear()
+
+    def responder(self, n=1, pregunta="¿Cuál es la capital de Francia?", correcta=True, tiempo=5.0,
+                  sesion_id="20240101100000"):
+        """Registra n respuestas con update_stats y espera a que estén escritas."""
+        for _ in range(n):
+            estadisticas.update_stats(pregunta, correcta, tiempo=tiempo, sesion_id=sesion_id,
+                                      archivo="cuestionarios/B1-T1-1.pdf")
+        estadisticas.flush_stats()
+
+    def intentos(self, pregunta="¿Cuál es la capital de Francia?"):
+        data = estadisticas.load_stats().get(estadisticas.id_pregunta(pregunta))
+        return data["intentos"] if data else 0
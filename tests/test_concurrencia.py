@@ -0,0 +1,121 @@
+import glob
+import multiprocessing
+import os
+import threading
+import time
+import unittest
+
+import estadisticas
+from tests.base import EstadisticasTestCase
+
+PREGUNTA = "¿Cuál es la capital de Francia?"
+
+def _instancia(directorio, n, sesion_id, compactar_cada):
+    # Otra instancia del programa, en su propio proceso, sobre los mismos archivos
+    estadisticas.STATS_FILE = os.path.join(directorio, "stats.json")
+    estadisticas.JOURNAL_FILE = os.path.join(directorio, "stats.journal")
+    estadisticas.BACKEND = "json"
+    estadisticas.COMPACTAR_CADA = compactar_cada
+    for i in range(n):
+        estadisticas.update_stats(PREGUNTA, i % 3 != 0, tiempo=4.0, sesion_id=sesion_id)
+        if i % 7 == 0:
+            estadisticas.flush_stats()  # Lotes pequeños, para que se intercalen con los de la otra
+    estadisticas.flush_stats()
+
+class Concurrencia(EstadisticasTestCase):
+    """Varias instancias escribiendo a la vez en los mismos archivos."""
+
+    def instancias(self, *configuraciones):
+        contexto = multiprocessing.get_context("spawn")
+        procesos = [contexto.Process(target=_instancia, args=(self.directorio, *c)) for c in configuraciones]
+        for proceso in procesos:
+            proceso.start()
+        for proceso in procesos:
+            proceso.join(60)
+            self.assertEqual(proceso.exitcode, 0)
+
+    def test_dos_instancias_no_pierden_respuestas(self):
+        self.instancias((60, "20240101100000", 500), (60, "20240102100000", 500))
+        self.assertEqual(self.intentos(PREGUNTA), 120)
+        self.assertEqual([s["total"] for s in estadisticas.get_trend_data(0)], [60, 60])
+
+    def test_compactaciones_concurrentes(self):
+        # Cada instancia reescribe el snapshot a menudo mientras la otra responde
+        self.instancias((60, "20240101100000", 10), (60, "20240102100000", 7))
+        self.assertEqual(self.intentos(PREGUNTA), 120)
+        self.reiniciar()
+        self.assertEqual(self.intentos(PREGUNTA), 120)
+        self.assertEqual(estadisticas.get_resumen()["fallos"], 40)
+        self.assertEqual(len(glob.glob(self.ruta("stats.hist.*.bin"))), 1)
+
+    def test_respuestas_de_otra_instancia_se_fusionan_en_memoria(self):
+        self.responder(sesion_id="20240101100000")
+        self.instancias((5, "20240102100000", 500))
+        self.responder(sesion_id="20240101100000")
+        self.assertEqual(self.intentos(PREGUNTA), 7)
+        self.assertGreaterEqual(estadisticas.estado_escritura()["fusionados"], 5)
+        # Un snapshot escrito desde aquí incluye las de la otra instancia
+        estadisticas.compactar_stats()
+        self.reiniciar()
+        self.assertEqual(self.intentos(PREGUNTA), 7)
+
+    def test_snapshot_reescrito_por_otra_instancia(self):
+        self.responder(sesion_id="20240101100000")
+        self.instancias((5, "20240102100000", 1))  # Compacta en cada lote
+        recargas = estadisticas.estado_escritura()["recargas"]
+        self.responder(sesion_id="20240101100000")
+        self.assertEqual(estadisticas.estado_escritura()["recargas"], recargas + 1)
+        self.assertEqual(self.intentos(PREGUNTA), 7)
+        self.reiniciar()
+        self.assertEqual(self.intentos(PREGUNTA), 7)
+
+    def test_snapshot_corrupto_se_aparta(self):
+        with open(estadisticas.STATS_FILE, "w", encoding="utf-8") as f:
+            f.write('{"a1b2c3d4e5f60718": {"intentos": 3')
+        self.assertEqual(self.intentos(PREGUNTA), 0)
+        apartados = glob.glob(estadisticas.STATS_FILE + ".corrupto-*")
+        self.assertEqual(len(apartados), 1)
+        with open(apartados[0], encoding="utf-8") as f:
+            self.assertEqual(f.read(), '{"a1b2c3d4e5f60718": {"intentos": 3')
+        # Lo siguiente que se guarda no lo sobreescribe
+        self.responder()
+        estadisticas.compactar_stats()
+        self.assertEqual(glob.glob(estadisticas.STATS_FILE + ".corrupto-*"), apartados)
+
+    @unittest.skipIf(estadisticas.fcntl is None, "sin bloqueo entre procesos")
+    def test_otra_instancia_con_el_bloqueo_no_frena_la_interfaz(self):
+        self.responder()
+        # Otra instancia tiene el bloqueo de archivo (por ejemplo, compactando)
+        # durante 3 s: el hilo escritor espera, pero sin bloquear lo demás
+        bloqueo = open(estadisticas.STATS_FILE + ".lock", "a")
+        estadisticas.fcntl.flock(bloqueo, estadisticas.fcntl.LOCK_EX)
+        liberar = threading.Timer(3, bloqueo.close)
+        liberar.start()
+        try:
+            latencias = []
+            for i in range(5):
+                inicio = time.perf_counter()
+                estadisticas.update_stats(PREGUNTA, i % 2 == 0, tiempo=4.0, sesion_id="20240101100000")
+                estadisticas.get_resumen()
+                estadisticas.get_ranking("tasa", 5)
+                estadisticas.get_trend_data()
+                self.assertFalse(estadisticas.sincronizar_stats(esperar=False))
+                latencias.append(time.perf_counter() - inicio)
+                time.sleep(0.05)  # Para que el escritor ya esté esperando con un lote
+            self.assertLess(max(latencias), 0.5)
+            self.assertEqual(self.intentos(PREGUNTA), 6)
+        finally:
+            liberar.join()
+        estadisticas.flush_stats()
+        self.reiniciar()
+        self.assertEqual(self.intentos(PREGUNTA), 6)
+        self.assertEqual(estadisticas.get_resumen()["fallos"], 2)
+
+    def test_espera_por_el_bloqueo(self):
+        self.responder()
+        estado = estadisticas.estado_escritura()
+        self.assertGreaterEqual(estado["espera_bloqueo_total"], estado["ultima_espera_bloqueo"])
+        self.assertGreaterEqual(estado["max_espera_bloqueo"], estado["ultima_espera_bloqueo"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import json
+import os
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import estadisticas
+import estimador_tiempos
+import historial_columnar
+from tests.base import EstadisticasTestCase
+
+PALABRAS = ("cuál de la el los las que es son según artículo ley real decreto procedimiento administrativo "
+            "recurso plazo días hábiles órgano competente interesado resolución constitución española "
+            "tribunal cortes generales gobierno comunidades autónomas régimen jurídico sector público "
+            "contrato funcionario estatuto básico empleado potestad sancionadora acto nulo silencio").split()
+
+def _stats_antiguo(n_preguntas, n_intentos, semilla=0):
+    """stats.json como se escribía antes del historial binario: texto como clave e historial en listas."""
+    rng = random.Random(semilla)
+    sesiones = [datetime(2024, 1, 1, 9) + timedelta(hours=6 * i) for i in range(100)]
+    stats = {}
+    for i in range(n_preguntas):
+        categoria = f"B{rng.randint(1, 4)}-T{rng.randint(1, 5)}-1"
+        archivo = f"cuestionarios/{categoria}.pdf"
+        historial = []
+        for _ in range(n_intentos):
+            sesion = rng.choice(sesiones)
+            historial.append({
+                "fecha": (sesion + timedelta(seconds=rng.randint(0, 1800))).strftime("%Y-%m-%d %H:%M:%S"),
+                "correcta": rng.random() > 0.3,
+                "tiempo": round(rng.uniform(2, 60), 2),
+                "sesion_id": sesion.strftime("%Y%m%d%H%M%S"),
+                "archivo": archivo
+            })
+        texto = f"{i}. ¿" + " ".join(rng.choice(PALABRAS) for _ in range(rng.randint(12, 40))) + "?"
+        stats[texto] = {
+            "intentos": n_intentos,
+            "fallos": sum(not h["correcta"] for h in historial),
+            "categoria": categoria,
+            "tiempos": [h["tiempo"] for h in historial],
+            "historial": historial,
+            "origen_archivo": archivo
+        }
+    return stats
+
+class Snapshot(EstadisticasTestCase):
+
+    def tamano_snapshot(self):
+        with open(estadisticas.STATS_FILE, encoding="utf-8") as f:
+            meta = json.load(f)["__meta__"]
+        return os.path.getsize(estadisticas.STATS_FILE) + os.path.getsize(self.ruta(meta["historial"]))
+
+    def test_ocupa_al_menos_cinco_veces_menos_que_el_formato_antiguo(self):
+        with open(estadisticas.STATS_FILE, "w", encoding="utf-8") as f:
+            json.dump(_stats_antiguo(300, 10), f, ensure_ascii=False, indent=2)
+        antiguo = os.path.getsize(estadisticas.STATS_FILE)
+        estadisticas.load_stats()
+        estadisticas.compactar_stats()
+        self.assertGreaterEqual(antiguo / self.tamano_snapshot(), 5)
+
+    def test_texto_y_estimador_van_en_el_historial(self):
+        self.responder(3, tiempo=4.0)
+        self.responder(tiempo=12.0, correcta=False)
+        q = estadisticas.id_pregunta("¿Cuál es la capital de Francia?")
+        estimador = estimador_tiempos.copiar(estadisticas.load_stats()[q]["estimador_tiempo"])
+        estadisticas.compactar_stats()
+        with open(estadisticas.STATS_FILE, encoding="utf-8") as f:
+            guardado = json.load(f)
+        self.assertEqual(guardado["__meta__"]["formato"], estadisticas.FORMATO_SNAPSHOT)
+        self.assertNotIn("textos", guardado["__meta__"])
+        self.assertNotIn("estimador_tiempo", guardado[q])
+
+        self.reiniciar()
+        data = estadisticas.load_stats()[q]
+        self.assertEqual(data["estimador_tiempo"], estimador)
+        self.assertEqual(estadisticas.texto_pregunta(q), "¿Cuál es la capital de Francia?")
+        self.assertEqual((data["intentos"], data["fallos"], len(data["historial"])), (4, 1, 4))
+
+    def test_lee_el_formato_con_textos_en_meta(self):
+        # Formato 2: por id, con los textos en __meta__ y el estimador en cada pregunta
+        texto = "¿Cuál es la capital de Italia?"
+        q = estadisticas.id_pregunta(texto)
+        estimador = estimador_tiempos.nuevo()
+        for tiempo in (3.0, 9.0):
+            estimador_tiempos.anadir(estimador, tiempo)
+        with open(estadisticas.STATS_FILE, "w", encoding="utf-8") as f:
+            json.dump({q: {"intentos": 2, "fallos": 0, "categoria": "B1-T1-1", "tiempo_total": 12.0,
+                           "origen_archivo": "cuestionarios/B1-T1-1.pdf", "estimador_tiempo": estimador},
+                       "__meta__": {"journal_absorbido": None, "textos": {q: texto}}}, f, ensure_ascii=False)
+        data = estadisticas.load_stats()[q]
+        self.assertEqual(estadisticas.texto_pregunta(q), texto)
+        self.assertEqual(data["estimador_tiempo"], estimador)
+
+    def test_historial_danado_no_impide_cargar_los_contadores(self):
+        self.responder(2)
+        estadisticas.compactar_stats()
+        with open(estadisticas.STATS_FILE, encoding="utf-8") as f:
+            nombre = json.load(f)["__meta__"]["historial"]
+        with open(self.ruta(nombre), "r+b") as f:
+            f.seek(len(historial_columnar.MAGIC) + 4)
+            f.write(b"\0" * 16)
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 2)
+        self.assertTrue(any(n.startswith(nombre + ".corrupto-") for n in os.listdir(self.directorio)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import threading
+import time
+import unittest
+from unittest import mock
+
+import estadisticas
+import historial_columnar
+from tests.base import EstadisticasTestCase
+
+class Journal(EstadisticasTestCase):
+    """Cada respuesta es una línea del journal y se vuelve a aplicar al cargar."""
+
+    def lineas_journal(self):
+        with open(estadisticas.JOURNAL_FILE, encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_respuesta_va_al_journal_sin_reescribir_el_snapshot(self):
+        self.responder(3)
+        self.assertFalse(os.path.exists(estadisticas.STATS_FILE))
+        cabecera, *registros = self.lineas_journal()
+        self.assertIn("journal_id", json.loads(cabecera))
+        self.assertEqual(len(registros), 3)
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 3)
+
+    def test_linea_cortada_se_ignora(self):
+        self.responder(2)
+        # Cierre a mitad de escribir una respuesta
+        with open(estadisticas.JOURNAL_FILE, "ab") as f:
+            f.write(b'{"pregunta": "\xc2\xbfCu')
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 2)
+        # La siguiente respuesta empieza en una línea nueva y no se pierde
+        self.responder()
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 3)
+
+    def test_linea_ilegible_no_impide_leer_las_siguientes(self):
+        self.responder()
+        with open(estadisticas.JOURNAL_FILE, "a", encoding="utf-8") as f:
+            f.write("no es json\n")
+        self.reiniciar()
+        self.responder()
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 2)
+
+    def test_compacta_cada_compactar_cada_respuestas(self):
+        estadisticas.COMPACTAR_CADA = 3
+        self.responder(4)
+        self.assertTrue(os.path.exists(estadisticas.STATS_FILE))
+        self.assertLess(len(self.lineas_journal()) - 1, 3)
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 4)
+
+    def test_journal_ya_absorbido_no_se_cuenta_dos_veces(self):
+        self.responder(2)
+        copia = self.ruta("journal.copia")
+        shutil.copy(estadisticas.JOURNAL_FILE, copia)
+        estadisticas.compactar_stats()
+        # Cierre entre la escritura del snapshot y la del journal nuevo
+        os.replace(copia, estadisticas.JOURNAL_FILE)
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 2)
+        self.responder()
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 3)
+
+    def test_snapshot_temporal_a_medias_no_cuenta(self):
+        self.responder(2)
+        estadisticas.compactar_stats()
+        self.responder()
+        # Cierre a mitad de escribir el snapshot siguiente: sólo queda el temporal
+        with open(estadisticas.STATS_FILE + ".tmp", "w", encoding="utf-8") as f:
+            f.write('{"a')
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 3)
+
+class CompactacionEnSegundoPlano(EstadisticasTestCase):
+    """Mientras se escribe el snapshot se puede seguir respondiendo y consultando."""
+
+    def setUp(self):
+        super().setUp()
+        # La compactación se queda escribiendo el historial hasta que se le deja seguir
+        self.empezada = threading.Event()
+        self.seguir = threading.Event()
+        guardar = historial_columnar.guardar
+
+        def guardar_lento(ruta, stats, textos=None):
+            self.empezada.set()
+            self.seguir.wait(5)
+            guardar(ruta, stats, textos)
+
+        parche = mock.patch.object(historial_columnar, "guardar", guardar_lento)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.addCleanup(self.seguir.set)
+
+    def responder_durante(self, n, sesion_id):
+        latencias = []
+        for i in range(n):
+            inicio = time.perf_counter()
+            estadisticas.update_stats("¿Cuál es la capital de Francia?", i % 2 == 0, tiempo=5.0,
+                                      sesion_id=sesion_id, archivo="cuestionarios/B1-T1-1.pdf")
+            estadisticas.get_resumen()
+            estadisticas.get_ranking("tasa", 5)
+            estadisticas.get_trend_data()
+            latencias.append(time.perf_counter() - inicio)
+        self.assertLess(max(latencias), 0.5)
+
+    def test_responder_no_espera_a_la_compactacion(self):
+        estadisticas.COMPACTAR_CADA = 5
+        for _ in range(5):
+            estadisticas.update_stats("¿Cuál es la capital de Francia?", True, tiempo=5.0,
+                                      sesion_id="20240101100000")
+        self.assertTrue(self.empezada.wait(5))
+        self.responder_durante(20, "20240101100000")
+        self.assertFalse(os.path.exists(estadisticas.STATS_FILE))  # Sigue compactando
+        self.seguir.set()
+        estadisticas.flush_stats()
+        self.assertTrue(os.path.exists(estadisticas.STATS_FILE))
+        # Las respuestas dadas mientras tanto ni se pierden ni se cuentan dos veces
+        self.assertEqual(self.intentos(), 25)
+        self.assertEqual(len(estadisticas.load_stats()[estadisticas.id_pregunta("¿Cuál es la capital de Francia?")]["historial"]), 25)
+        self.reiniciar()
+        self.assertEqual(self.intentos(), 25)
+        self.assertEqual(estadisticas.get_resumen()["fallos"], 10)
+
+    def test_retencion_conserva_lo_respondido_durante_la_compactacion(self):
+        self.seguir.set()
+        self.responder(2, sesion_id="20240101100000")
+        self.responder(1, sesion_id="20240102100000")
+        self.seguir.clear()
+        compactacion = threading.Thread(target=estadisticas.compactar_stats, kwargs={"sesiones": 1})
+        compactacion.start()
+        self.assertTrue(self.empezada.wait(5))
+        self.responder_durante(2, "20240103100000")
+        self.seguir.set()
+        compactacion.join()
+        estadisticas.flush_stats()
+
+        def comprobar():
+            data = estadisticas.load_stats()[estadisticas.id_pregunta("¿Cuál es la capital de Francia?")]
+            self.assertEqual(data["intentos"], 5)
+            self.assertEqual(data["archivado"]["intentos"], 2)
+            self.assertEqual([h["sesion_id"] for h in data["historial"]],
+                             ["20240102100000", "20240103100000", "20240103100000"])
+        comprobar()
+        self.reiniciar()
+        comprobar()
+
+if __name__ == "__main__":
+    unittest.main()
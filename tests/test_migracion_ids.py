@@ -0,0 +1,162 @@
+import json
+import os
+import unittest
+
+import estadisticas
+import estadisticas_sqlite
+import estimador_tiempos
+import historial_columnar
+import textos_preguntas
+from tests.base import EstadisticasTestCase
+
+TEXTO = "¿Cuál es la capital de Francia?"
+# Misma pregunta extraída con otros espacios y saltos de línea
+TEXTO_ESPACIOS = "¿Cuál  es la\ncapital de   Francia? "
+OTRO_TEXTO = "¿Cuál es la capital de Italia?"
+
+def _intento(fecha, correcta, tiempo, sesion_id):
+    return {"fecha": fecha, "correcta": correcta, "tiempo": tiempo, "sesion_id": sesion_id,
+            "archivo": "cuestionarios/B1-T1-1.pdf"}
+
+def _entrada(historial, archivado=None):
+    entry = {
+        "intentos": len(historial) + (archivado or {}).get("intentos", 0),
+        "fallos": sum(not h["correcta"] for h in historial) + (archivado or {}).get("fallos", 0),
+        "categoria": "B1-T1-1",
+        "origen_archivo": "cuestionarios/B1-T1-1.pdf",
+        "tiempos": [h["tiempo"] for h in historial],
+        "historial": historial,
+        "tiempo_total": sum(h["tiempo"] for h in historial) + (archivado or {}).get("tiempo_total", 0),
+    }
+    if archivado:
+        entry["archivado"] = archivado
+    return entry
+
+class MigracionJSON(EstadisticasTestCase):
+    """Snapshot anterior a los ids (claves de texto, sin "textos" en __meta__)."""
+
+    def setUp(self):
+        super().setUp()
+        a = _entrada([_intento("2024-01-01 10:00:00", True, 10.0, "20240101100000"),
+                      _intento("2024-01-03 10:00:00", False, 20.0, "20240103100000")],
+                     {"intentos": 1, "fallos": 0, "tiempo_total": 5.0, "tiempo_cuadrados": 25.0})
+        # Esta trae su estimador de tiempos; la otra lo tiene que recalcular
+        a["estimador_tiempo"] = estimador_tiempos.nuevo()
+        for tiempo in (5.0, 10.0, 20.0):
+            estimador_tiempos.anadir(a["estimador_tiempo"], tiempo)
+        b = _entrada([_intento("2024-01-02 10:00:00", False, 3.0, "20240102100000")],
+                     {"intentos": 1, "fallos": 1, "tiempo_total": 4.0, "tiempo_cuadrados": 16.0})
+        c = _entrada([_intento("2024-01-02 10:00:05", True, 8.0, "20240102100000")])
+        with open(estadisticas.STATS_FILE, "w", encoding="utf-8") as f:
+            json.dump({TEXTO: a, TEXTO_ESPACIOS: b, OTRO_TEXTO: c,
+                       "__meta__": {"journal_absorbido": None,
+                                    "sesiones_archivadas": {}}}, f, ensure_ascii=False)
+
+    def comprobar_fusion(self):
+        stats = estadisticas.load_stats()
+        q = estadisticas.id_pregunta(TEXTO)
+        self.assertEqual(q, estadisticas.id_pregunta(TEXTO_ESPACIOS))
+        self.assertEqual(set(stats), {q, estadisticas.id_pregunta(OTRO_TEXTO)})
+        self.assertEqual(estadisticas.texto_pregunta(q), TEXTO)
+
+        data = stats[q]
+        self.assertEqual(data["intentos"], 5)
+        self.assertEqual(data["fallos"], 3)
+        self.assertAlmostEqual(data["tiempo_total"], 42.0)
+        self.assertEqual(data["archivado"], {"intentos": 2, "fallos": 1, "tiempo_total": 9.0,
+                                             "tiempo_cuadrados": 41.0})
+        # Los dos historiales, juntos y por fecha
+        self.assertEqual([h["fecha"] for h in data["historial"]],
+                         ["2024-01-01 10:00:00", "2024-01-02 10:00:00", "2024-01-03 10:00:00"])
+        self.assertEqual([h["correcta"] for h in data["historial"]], [True, False, False])
+        self.assertEqual(data["estimador_tiempo"]["n"], 5)
+        self.assertAlmostEqual(data["estimador_tiempo"]["media"], 42.0 / 5)
+
+        resumen = estadisticas.get_resumen()
+        self.assertEqual((resumen["preguntas"], resumen["intentos"], resumen["fallos"]), (2, 6, 3))
+        self.assertEqual(resumen["n_tiempos"], 6)
+        self.assertAlmostEqual(resumen["tiempo_total"], 50.0)
+        self.assertEqual(estadisticas.get_tiempos_respuesta()["global"]["n"], 6)
+        self.assertEqual([(s["total"], s["correctas"]) for s in estadisticas.get_trend_data(0)],
+                         [(1, 1), (2, 1), (1, 0)])
+
+    def test_fusiona_duplicados_por_espacios(self):
+        self.comprobar_fusion()
+
+    def test_compactar_guarda_por_id(self):
+        estadisticas.load_stats()
+        estadisticas.compactar_stats()
+        with open(estadisticas.STATS_FILE, encoding="utf-8") as f:
+            guardado = json.load(f)
+        meta = guardado.pop("__meta__")
+        self.assertTrue(all(textos_preguntas.es_id(q) for q in guardado))
+        # El texto va en el historial binario, no en stats.json
+        historiales = historial_columnar.cargar(os.path.join(os.path.dirname(estadisticas.STATS_FILE),
+                                                             meta["historial"]))
+        self.assertEqual(historiales[estadisticas.id_pregunta(TEXTO)]["texto"], TEXTO)
+        self.reiniciar()
+        self.comprobar_fusion()
+
+    def test_respuestas_nuevas_van_a_la_pregunta_fusionada(self):
+        estadisticas.load_stats()
+        estadisticas.update_stats(TEXTO_ESPACIOS + "\n", False, tiempo=6, sesion_id="20240104100000")
+        estadisticas.flush_stats()
+        self.reiniciar()
+        data = estadisticas.load_stats()[estadisticas.id_pregunta(TEXTO)]
+        self.assertEqual((data["intentos"], data["fallos"]), (6, 4))
+        self.assertEqual(len(data["historial"]), 4)
+
+class MigracionSQLite(EstadisticasTestCase):
+    """Base de datos con el esquema v4, en la que las preguntas se distinguían por su texto exacto."""
+
+    def setUp(self):
+        super().setUp()
+        conn = estadisticas_sqlite.conectar(estadisticas.DB_FILE)
+        with conn:
+            preguntas = [(TEXTO_ESPACIOS, None, 2, 1, 7.0, 2),
+                         (TEXTO, "cuestionarios/B1-T1-1.pdf", 3, 1, 35.0, 3),
+                         (OTRO_TEXTO, None, 1, 0, 8.0, 1)]
+            for texto, origen, intentos, fallos, tiempo_total, n_tiempos in preguntas:
+                cur = conn.execute(
+                    "INSERT INTO preguntas (texto, categoria, origen_archivo, intentos, fallos, tiempo_total, n_tiempos) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (texto, "B1-T1-1" if origen else "General", origen, intentos, fallos, tiempo_total, n_tiempos))
+                for i in range(n_tiempos):
+                    conn.execute(
+                        "INSERT INTO intentos (pregunta_id, fecha, correcta, tiempo, sesion_id) VALUES (?, ?, ?, ?, ?)",
+                        (cur.lastrowid, f"2024-01-0{i + 1} 10:00:00", int(i >= fallos), tiempo_total / n_tiempos,
+                         f"2024010{i + 1}100000"))
+            conn.execute("PRAGMA user_version = 4")
+        conn.close()
+
+    def test_actualiza_a_v5(self):
+        conn = estadisticas_sqlite.conectar(estadisticas.DB_FILE)
+        try:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], estadisticas_sqlite.VERSION_ESQUEMA)
+            filas = conn.execute(
+                "SELECT id, texto, categoria, origen_archivo, intentos, fallos, tiempo_total, n_tiempos "
+                "FROM preguntas ORDER BY id").fetchall()
+            # Se queda la de menor id, con el texto normalizado y el archivo de la que lo tenía
+            self.assertEqual(filas, [(1, TEXTO, "B1-T1-1", "cuestionarios/B1-T1-1.pdf", 5, 2, 42.0, 5),
+                                     (3, OTRO_TEXTO, "General", None, 1, 0, 8.0, 1)])
+            self.assertEqual(conn.execute("SELECT pregunta_id, COUNT(*) FROM intentos GROUP BY pregunta_id").fetchall(),
+                             [(1, 5), (3, 1)])
+            self.assertEqual(conn.execute("SELECT SUM(total), SUM(correctas) FROM sesiones").fetchone(), (6, 4))
+        finally:
+            conn.close()
+
+    def test_ids_del_backend(self):
+        estadisticas.BACKEND = "sqlite"
+        stats = estadisticas.load_stats()
+        q = estadisticas.id_pregunta(TEXTO)
+        self.assertEqual(set(stats), {q, estadisticas.id_pregunta(OTRO_TEXTO)})
+        self.assertEqual((stats[q]["intentos"], stats[q]["fallos"]), (5, 2))
+        self.assertEqual(len(stats[q]["historial"]), 5)
+        self.assertEqual(estadisticas.get_stats_preguntas([q])[q]["intentos"], 5)
+        # Una respuesta nueva con otros espacios va a la misma fila
+        estadisticas.update_stats(TEXTO_ESPACIOS, True, tiempo=4, sesion_id="20240105100000")
+        self.assertEqual(estadisticas.get_stats_preguntas([q])[q]["intentos"], 6)
+        self.assertEqual(estadisticas.get_resumen()["preguntas"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
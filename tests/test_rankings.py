@@ -0,0 +1,42 @@
+import random
+import unittest
+
+import estadisticas
+from tests.base import EstadisticasTestCase
+
+class Rankings(EstadisticasTestCase):
+    """El ranking que mantiene update_stats coincide con el calculado desde cero."""
+
+    def test_coincide_con_ordenar_todo(self):
+        rng = random.Random(0)
+        preguntas = [f"¿Pregunta número {i}?" for i in range(40)]
+        for ronda in range(5):
+            for _ in range(150):
+                estadisticas.update_stats(rng.choice(preguntas), rng.random() > 0.4, tiempo=rng.choice((2, 5, 9)),
+                                          sesion_id="20240101100000")
+            stats = estadisticas.load_stats()
+            for criterio in estadisticas.CRITERIOS_RANKING:
+                for top_n in (0, 1, 5, None):
+                    esperado = estadisticas.get_ranking(criterio, top_n, stats=dict(stats))
+                    self.assertEqual(estadisticas.get_ranking(criterio, top_n), esperado, (ronda, criterio, top_n))
+        # Las entradas anticuadas no se acumulan sin límite
+        self.assertLessEqual(len(estadisticas._rankings["fallos"]), 2 * len(stats) + 100)
+        estadisticas.flush_stats()
+
+    def test_historial_de_una_pregunta(self):
+        for backend in ("json", "sqlite"):
+            estadisticas.BACKEND = backend
+            # stats.db se crea importando lo que haya en stats.json: cada backend con su pregunta
+            pregunta = f"¿Pregunta con historial ({backend})?"
+            for i in range(7):
+                estadisticas.update_stats(pregunta, i % 2 == 0, tiempo=i + 1, sesion_id="20240101100000")
+            q = estadisticas.id_pregunta(pregunta)
+            historial = estadisticas.get_historial_pregunta(q, 5)
+            self.assertEqual([h["tiempo"] for h in historial], [3, 4, 5, 6, 7], backend)
+            self.assertEqual([h["correcta"] for h in historial], [True, False, True, False, True], backend)
+            self.assertEqual(len(estadisticas.get_historial_pregunta(q)), 7, backend)
+            self.assertEqual(estadisticas.get_historial_pregunta(estadisticas.id_pregunta("¿Otra?"), 5), [])
+            estadisticas.flush_stats()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import glob
+import os
+import unittest
+from unittest import mock
+
+import estadisticas
+from tests.base import EstadisticasTestCase
+
+PREGUNTAS = ("¿Cuál es la capital de Francia?", "¿Cuál es la capital de Italia?")
+SESIONES = ("20240101100000", "20240102100000", "20240103100000")
+
+class Retencion(EstadisticasTestCase):
+    """La retención resume el historial antiguo sin cambiar lo que muestra la ventana de estadísticas."""
+
+    def setUp(self):
+        super().setUp()
+        for s, sesion in enumerate(SESIONES):
+            for p, pregunta in enumerate(PREGUNTAS):
+                self.responder(pregunta=pregunta, correcta=(s + p) % 2 == 0, tiempo=3.0 + s * 2 + p,
+                               sesion_id=sesion)
+
+    def vista(self):
+        # Lo que se ve en la ventana de estadísticas
+        stats = estadisticas.load_stats()
+        tiempos = estadisticas.get_tiempos_respuesta()
+        return {
+            "resumen": estadisticas.get_resumen(),
+            "tendencia": estadisticas.get_trend_data(0),
+            "preguntas": estadisticas.get_preguntas_dificiles(),
+            "medias": {q: estadisticas.get_stats_preguntas([q])[q]["tiempo_medio"] for q in stats},
+            "tiempos": (tiempos["global"]["n"], round(tiempos["global"]["media"], 9)),
+        }
+
+    def historial(self, pregunta=PREGUNTAS[0]):
+        return estadisticas.load_stats()[estadisticas.id_pregunta(pregunta)]["historial"]
+
+    def test_compactar_no_cambia_totales_tendencia_ni_medias(self):
+        antes = self.vista()
+        self.assertEqual(estadisticas.compactar_stats(sesiones=1), 4)
+        self.assertEqual([h["sesion_id"] for h in self.historial()], [SESIONES[-1]])
+        self.assertEqual(self.vista(), antes)
+        self.reiniciar()
+        self.assertEqual(self.vista(), antes)
+
+    def test_compactar_por_dias(self):
+        antes = self.vista()
+        # Las respuestas son de hoy: con un día no se archiva ninguna
+        self.assertEqual(estadisticas.compactar_stats(dias=1), 0)
+        self.assertEqual(len(self.historial()), 3)
+        self.reiniciar()
+        self.assertEqual(self.vista(), antes)
+
+    def test_sesion_archivada_en_curso_conserva_sus_intentos_nuevos(self):
+        # Se archiva todo, también la sesión en curso, que sigue recibiendo respuestas
+        estadisticas.compactar_stats(sesiones=0)
+        self.responder(2, sesion_id=SESIONES[-1], tiempo=9.0)
+        antes = self.vista()
+        # Sigue siendo la última sesión: sus intentos nuevos se conservan
+        self.assertEqual(estadisticas.compactar_stats(sesiones=1), 0)
+        self.assertEqual([h["sesion_id"] for h in self.historial()], [SESIONES[-1]] * 2)
+        self.assertEqual(self.vista(), antes)
+        self.assertEqual(antes["tendencia"][-1]["total"], 4)
+        # Al dejar de serlo, se suman a su resumen
+        self.responder(sesion_id="20240104100000")
+        antes = self.vista()
+        self.assertEqual(estadisticas.compactar_stats(sesiones=1), 2)
+        self.assertEqual(estadisticas._sesiones_archivadas[SESIONES[-1]]["total"], 4)
+        self.reiniciar()
+        self.assertEqual(self.vista(), antes)
+
+    def test_escritura_fallida_no_cambia_memoria_ni_disco(self):
+        estadisticas.compactar_stats()
+        historiales = set(glob.glob(self.ruta("stats.hist.*.bin")))
+        antes = self.vista()
+        fechas = [h["fecha"] for h in self.historial()]
+        with mock.patch.object(estadisticas.os, "replace", side_effect=OSError("disco lleno")):
+            with self.assertRaises(OSError):
+                estadisticas.compactar_stats(sesiones=1)
+        # Nada se ha archivado en memoria ni ha quedado a medias en disco
+        self.assertEqual([h["fecha"] for h in self.historial()], fechas)
+        self.assertEqual(estadisticas._sesiones_archivadas, {})
+        self.assertEqual(self.vista(), antes)
+        self.assertEqual(set(glob.glob(self.ruta("stats.hist.*.bin"))), historiales)
+        self.assertFalse(os.path.exists(estadisticas.STATS_FILE + ".tmp"))
+        self.reiniciar()
+        self.assertEqual(self.vista(), antes)
+        self.assertEqual(len(self.historial()), 3)
+
+if __name__ == "__main__":
+    unittest.main()
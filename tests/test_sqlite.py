@@ -0,0 +1,73 @@
+import unittest
+
+import estadisticas
+import estadisticas_sqlite
+import estimador_tiempos
+from tests.base import EstadisticasTestCase
+
+PREGUNTAS = ("¿Cuál es la capital de Francia?", "¿Cuál es la capital de Italia?", "¿Cuál es la capital de Grecia?")
+
+def _recorriendo_intentos(conn):
+    # Los estimadores como se calculaban antes: recorriendo todos los intentos
+    total = estimador_tiempos.nuevo()
+    por_categoria = {}
+    for categoria, tiempo in conn.execute(
+            "SELECT p.categoria, i.tiempo FROM intentos i JOIN preguntas p ON p.id = i.pregunta_id"):
+        estimador_tiempos.anadir(total, tiempo)
+        estimador_tiempos.anadir(por_categoria.setdefault(categoria, estimador_tiempos.nuevo()), tiempo)
+    return total, por_categoria
+
+class EstimadoresSQLite(EstadisticasTestCase):
+    """Los estimadores de tiempos que mantiene registrar coinciden con los intentos guardados."""
+
+    def setUp(self):
+        super().setUp()
+        estadisticas.BACKEND = "sqlite"
+        # La última pregunta se responde primero sin archivo y luego pasa a su cuestionario
+        estadisticas.update_stats(PREGUNTAS[2], False, tiempo=30.0, sesion_id="20240101100000")
+        estadisticas.update_stats(PREGUNTAS[2], True, tiempo=12.5, sesion_id="20240101100000")
+        for i in range(20):
+            for p, pregunta in enumerate(PREGUNTAS):
+                estadisticas.update_stats(pregunta, i % 3 != p, tiempo=2.0 + i * (p + 1), sesion_id="20240102100000",
+                                          archivo=f"cuestionarios/B1-T{p + 1}-1.pdf")
+        estadisticas.flush_stats()
+
+    def comprobar(self, conn):
+        total, por_categoria = estadisticas_sqlite.get_estimadores_tiempo(conn)
+        esperado, esperado_categorias = _recorriendo_intentos(conn)
+        self.assertEqual(set(por_categoria), {"B1-T1-1", "B1-T2-1", "B1-T3-1"})
+        for est, otro in [(total, esperado)] + [(por_categoria[c], esperado_categorias[c]) for c in por_categoria]:
+            self.assertEqual((est["n"], est["cubetas"]), (otro["n"], otro["cubetas"]))
+            self.assertAlmostEqual(est["media"], otro["media"])
+            self.assertAlmostEqual(est["m2"], otro["m2"], places=6)
+
+    def test_estimadores_al_registrar(self):
+        self.comprobar(estadisticas._conexion())
+        est = estadisticas.get_tiempos_pregunta(PREGUNTAS[2])
+        self.assertEqual(est["n"], 22)
+        self.assertIsNone(estadisticas.get_tiempos_pregunta("¿Cuál es la capital de Chipre?"))
+
+    def test_migracion_desde_v5(self):
+        conn = estadisticas._conexion()
+        with conn:
+            conn.execute("DELETE FROM estimadores_pregunta")
+            conn.execute("DELETE FROM estimadores_categoria")
+            conn.execute("PRAGMA user_version = 5")
+        self.reiniciar()
+        self.comprobar(estadisticas._conexion())
+
+    def test_importar_conserva_los_tiempos_archivados(self):
+        estadisticas.BACKEND = "json"
+        for i in range(10):
+            self.responder(tiempo=1.0 + i, sesion_id=f"2024010{i % 3 + 1}100000")
+        estadisticas.compactar_stats(sesiones=1)
+        esperado = estadisticas.get_tiempos_respuesta()
+        self.reiniciar()
+        estadisticas.BACKEND = "sqlite"
+        estadisticas.save_stats(estadisticas._cargar_json())
+        obtenido = estadisticas.get_tiempos_respuesta()
+        self.assertEqual(obtenido["global"]["n"], 10)
+        self.assertAlmostEqual(obtenido["global"]["media"], esperado["global"]["media"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,76 @@
 #!/usr/bin/env python3
+import os
+import sys
 import tkinter as tk
-from tkinter import messagebox, filedialog
+from tkinter import messagebox, filedialog, simpledialog, ttk
 import estadisticas
+import pdf_parser
+import precarga
 from pdf_parser import leer_pdf
-from gui.ventana_examen import iniciar_examen
+from gui.ventana_examen import iniciar_examen, guardar_respuestas
+
+# Lo que puede costar importar la aplicación por encima de un tkinter pelado
+# antes de que aparezca el menú principal (en milisegundos)
+PRESUPUESTO_ARRANQUE_MS = 50
+# Módulos que sólo se cargan al abrir las estadísticas o leer un PDF
+IMPORTS_DIFERIDOS = ("matplotlib", "numpy", "pandas", "PyPDF2")
+# Cada cuánto se mira el progreso de la carga en segundo plano y cuánto se
+# espera tras abrir el menú para empezar a precargar PDF (en milisegundos)
+INTERVALO_PROGRESO_MS = 50
+ESPERA_PRECARGA_MS = 500
+# Preguntas de un examen sacado de un solo PDF
+N_PREGUNTAS = 10
+
+def _tiempos_importacion(codigo):
+    # Ejecuta codigo en un intérprete nuevo con -X importtime y devuelve
+    # (propio_us, acumulado_us, profundidad, modulo) por cada import
+    import subprocess
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                         capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr.strip().splitlines()[-1])
+    filas = []
+    for linea in res.stderr.splitlines():
+        if not linea.startswith("import time:"):
+            continue
+        propio, acumulado, modulo = linea[len("import time:"):].split("|")
+        if not propio.strip().isdigit():
+            continue  # Cabecera
+        nombre = modulo.rstrip()
+        profundidad = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        filas.append((int(propio), int(acumulado), profundidad, nombre.strip()))
+    return filas
+
+def perfil_arranque(top=15):
+    """
+    Muestra cuánto tarda en importarse todo lo que se carga antes del menú.
+
+    Compara "import testsGPDS" con un "import tkinter" a secas, lista los
+    módulos más caros y avisa si se ha colado alguno de IMPORTS_DIFERIDOS.
+
+    Args:
+        top: Número de módulos a listar
+
+    Returns:
+        0 si el arranque cabe en PRESUPUESTO_ARRANQUE_MS y no carga módulos
+        diferidos, 1 en otro caso.
+    """
+    base = sum(f[1] for f in _tiempos_importacion("import tkinter") if f[2] == 0)
+    filas = _tiempos_importacion("import testsGPDS")
+    total = sum(f[1] for f in filas if f[2] == 0)
+    extra_ms = (total - base) / 1000
+
+    print(f"{'acumulado':>10} {'propio':>9}  módulo")
+    for propio, acumulado, profundidad, modulo in sorted(filas, key=lambda f: f[1], reverse=True)[:top]:
+        print(f"{acumulado / 1000:>8.1f}ms {propio / 1000:>7.1f}ms  {'  ' * profundidad}{modulo}")
+    print(f"\nimport tkinter: {base / 1000:.1f}ms  import testsGPDS: {total / 1000:.1f}ms  "
+          f"extra: {extra_ms:.1f}ms (presupuesto {PRESUPUESTO_ARRANQUE_MS}ms)")
+
+    cargados = sorted({f[3] for f in filas if f[3].split(".")[0] in IMPORTS_DIFERIDOS})
+    if cargados:
+        print("Se importan antes del menú: " + ", ".join(cargados))
+    return 0 if extra_ms <= PRESUPUESTO_ARRANQUE_MS and not cargados else 1
 
 def menu_principal():
     root_menu = tk.Tk()
@@ -23,21 +90,128 @@ def menu_principal():
     lbl_title = tk.Label(root_menu, text="Simulacro Examen GPDS", bg="#f0f0f0", font=font_title)
     lbl_title.pack(pady=80)
 
+    # Progreso de la lectura del PDF (sólo se muestra mientras se está leyendo)
+    frame_carga = tk.Frame(root_menu, bg="#f0f0f0")
+    lbl_carga = tk.Label(frame_carga, text="", bg="#f0f0f0", font=("Helvetica", 14))
+    lbl_carga.pack()
+    barra_carga = ttk.Progressbar(frame_carga, length=400, mode="determinate")
+    barra_carga.pack(pady=5)
+    btn_cancelar = tk.Button(frame_carga, text="Cancelar", bg="#9E9E9E", fg="white", font=("Helvetica", 12))
+    btn_cancelar.pack()
+
+    def empezar_examen(filename):
+        if adaptativo.get():
+            import planificador  # Sólo hace falta en modo adaptativo
+            banco = pdf_parser.cargar_banco(filename)  # Ya está en memoria
+            if banco:
+                root_menu.withdraw()
+                iniciar_examen([], root_menu, root_menu, planificador.Planificador(banco, N_PREGUNTAS))
+                return
+            messagebox.showerror("Error", "No se encontraron preguntas válidas en el archivo.")
+            return
+        preguntas = leer_pdf(filename, N_PREGUNTAS)
+        if preguntas:
+            root_menu.withdraw()
+            iniciar_examen(preguntas, root_menu, root_menu)
+        else:
+            messagebox.showerror("Error", "No se encontraron preguntas válidas en el archivo.")
+
+    def mostrar_carga(tarea, texto):
+        # Se trabaja en segundo plano para que el menú siga respondiendo
+        btn_select.configure(state="disabled")
+        btn_mixto.configure(state="disabled")
+        btn_cancelar.configure(command=lambda: precarga.cancelar(tarea))
+        barra_carga.configure(value=0)
+        lbl_carga.configure(text=f"{texto}…")
+        frame_carga.pack(after=btn_select)
+
+    def seguir_carga(tarea, texto, unidad, al_terminar):
+        if tarea["estado"] in ("pendiente", "cargando"):
+            if tarea["total"]:
+                barra_carga.configure(maximum=tarea["total"], value=tarea["leidas"])
+                lbl_carga.configure(text=f"{texto}… {tarea['leidas']}/{tarea['total']} {unidad}")
+            root_menu.after(INTERVALO_PROGRESO_MS, seguir_carga, tarea, texto, unidad, al_terminar)
+            return
+        frame_carga.pack_forget()
+        btn_select.configure(state="normal")
+        btn_mixto.configure(state="normal")
+        al_terminar(tarea)
+
     def seleccionar_pdf():
         filename = filedialog.askopenfilename(
             title="Selecciona el archivo PDF de preguntas",
             filetypes=[("Archivos PDF", "*.pdf")])
         if filename:
-            preguntas = leer_pdf(filename)
-            if preguntas:
-                root_menu.withdraw()
-                iniciar_examen(preguntas, root_menu, root_menu)
-            else:
-                messagebox.showerror("Error", "No se encontraron preguntas válidas en el archivo.")
+            pdf_parser.anadir_reciente(filename)
+            tarea = precarga.pedir(filename)
+            if tarea["estado"] == "lista":
+                empezar_examen(filename)
+                return
+
+            def al_terminar(tarea):
+                if tarea["estado"] == "lista":
+                    empezar_examen(filename)
+                elif tarea["estado"] == "error":
+                    messagebox.showerror("Error", f"No se pudo leer el PDF:\n{tarea['error']}")
+
+            mostrar_carga(tarea, "Leyendo PDF")
+            seguir_carga(tarea, "Leyendo PDF", "páginas", al_terminar)
+
+    def examen_mixto():
+        texto = simpledialog.askstring(
+            "Examen mixto",
+            "Preguntas por tema o bloque (p. ej. B3-T1=5, B4=10),\n"
+            "o un número para repartirlo entre todos los cuestionarios:",
+            initialvalue="40", parent=root_menu)
+        if not texto:
+            return
+        import banco_preguntas  # Sólo hace falta para este examen
+        try:
+            tamanos = None if texto.strip().isdigit() else banco_preguntas.parsear_tamanos(texto)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        def componer(progreso, cancelar):
+            # La primera vez hay que leer todos los PDF de cuestionarios/: se
+            # hace en el hilo de precarga.ejecutar, no en el de Tk
+            nonlocal tamanos
+            if tamanos is None:
+                estratos = banco_preguntas.indice_estratos(progreso=progreso, cancelar=cancelar)
+                tamanos = banco_preguntas.reparto(int(texto), {e: len(p) for e, p in estratos.items()})
+            return banco_preguntas.componer_examen(tamanos, progreso=progreso, cancelar=cancelar)
+
+        def al_terminar(tarea):
+            if tarea["estado"] == "error":
+                error = tarea["excepcion"]
+                messagebox.showerror("Error", str(error) if isinstance(error, ValueError) else tarea["error"])
+            elif tarea["estado"] == "lista":
+                if tarea["resultado"]:
+                    root_menu.withdraw()
+                    iniciar_examen(tarea["resultado"], root_menu, root_menu)
+                else:
+                    messagebox.showerror("Error", "No se encontraron preguntas válidas en los cuestionarios.")
+
+        tarea = precarga.ejecutar(componer, "examen-mixto")
+        mostrar_carga(tarea, "Leyendo cuestionarios")
+        seguir_carga(tarea, "Leyendo cuestionarios", "PDF", al_terminar)
 
     btn_select = tk.Button(root_menu, text="Seleccionar PDF", width=30, height=3, bg="#2196F3", fg="white", font=font_button, command=seleccionar_pdf)
     btn_select.pack(pady=40)
 
+    adaptativo = tk.BooleanVar(value=False)
+    chk_adaptativo = tk.Checkbutton(
+        root_menu,
+        text="Modo adaptativo (salen antes las preguntas más falladas, olvidadas o lentas)",
+        variable=adaptativo,
+        bg="#f0f0f0",
+        font=("Helvetica", 12)
+    )
+    chk_adaptativo.pack(after=btn_select)
+
+    btn_mixto = tk.Button(root_menu, text="Examen mixto", width=30, height=3, bg="#009688", fg="white", font=font_button, command=examen_mixto)
+    btn_mixto.pack(pady=10)
+
     btn_stats = tk.Button(
         root_menu,
         text="Ver estadísticas",
@@ -59,7 +233,7 @@ def menu_principal():
             root_menu.destroy()
         except Exception:
             pass
-        import os
+        guardar_respuestas()
         os._exit(0)
 
     btn_exit = tk.Button(root_menu, text="Salir", width=20, height=2, bg="#f44336", fg="white", font=font_button, command=cerrar_todo_menu)
@@ -72,7 +246,11 @@ def menu_principal():
         cerrar_todo_menu()
     signal.signal(signal.SIGINT, signal_handler_menu)
 
+    # Con el menú ya en pantalla, se precargan los PDF que probablemente se abran
+    root_menu.after(ESPERA_PRECARGA_MS, precarga.precargar)
     root_menu.mainloop()
 
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv[1:]:
+        sys.exit(perfil_arranque())
     menu_principal()
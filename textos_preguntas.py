@@ -0,0 +1,37 @@
+import hashlib
+import re
+import unicodedata
+
+# Identificador estable de cada pregunta y tabla única con su texto. Las
+# estadísticas se guardan por id (16 caracteres hexadecimales) y el texto sólo
+# aparece una vez, en TEXTOS. El id sale del texto normalizado, así que dos
+# extracciones del mismo PDF que sólo difieren en espacios o saltos de línea
+# dan la misma pregunta.
+
+_ESPACIOS = re.compile(r"\s+")
+_PATRON_ID = re.compile(r"[0-9a-f]{16}")
+
+# {id: texto normalizado} de todas las preguntas conocidas en este proceso
+TEXTOS = {}
+
+def normalizar(texto):
+    """Forma canónica del texto de una pregunta: Unicode NFC y los espacios en blanco reducidos a uno."""
+    return _ESPACIOS.sub(" ", unicodedata.normalize("NFC", texto)).strip()
+
+def id_pregunta(texto):
+    """Identificador estable y de tamaño fijo de una pregunta a partir de su texto."""
+    return hashlib.sha1(normalizar(texto).encode('utf-8')).hexdigest()[:16]
+
+def es_id(clave):
+    return _PATRON_ID.fullmatch(clave) is not None
+
+def internar(texto):
+    """Añade el texto a TEXTOS (si no estaba) y devuelve su id."""
+    normal = normalizar(texto)
+    q = hashlib.sha1(normal.encode('utf-8')).hexdigest()[:16]
+    TEXTOS.setdefault(q, normal)
+    return q
+
+def texto(q):
+    """Texto de la pregunta con ese id (o la propia clave si no es un id conocido)."""
+    return TEXTOS.get(q, q)